@@ -0,0 +1,351 @@
+"""
+MRR・チャーン・リテンション・LTVの分析API
+
+MRRの増減は contracts / contract_history からSQLで顧客・月単位に集計し、画面には
+月ごとの小さな結果だけを返す（顧客の稼働MRR = active な契約のMRRの合計）。
+
+- 新規MRR: 稼働MRRが0から増えた顧客のMRR
+- 解約MRR: 稼働MRRが0になった顧客の直前のMRR
+- 拡大／縮小MRR: それ以外の顧客の稼働MRRの増減（契約の追加・変更を含む）
+- 月初MRR: 期間開始時点の稼働MRRから、月ごとの増減を積み上げる
+- コホート: cohort_monthly_summary（書き込み時に増分更新）を累積して算出
+- MRR予測: mrr_forecast（締め済みの月にトレンド・コホートモデルを当てはめ）
+- 売上推移: revenue_series（カレンダー表と顧客を期間ごとに1回のクエリで集計）
+"""
+from datetime import date, datetime, timedelta
+from flask import Blueprint, jsonify, request
+from sqlalchemy import Date, Integer, and_, case, cast, func
+from models import db, Contract, ContractHistory, ContractStatus, Customer
+from response_cache import cached_response
+from table_versions import conditional_get
+import cohort_summary
+import mrr_forecast
+import revenue_series
+from date_utils import parse_date
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
+
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 36
+# LTVの算出に使う平均チャーン率の期間（月）
+DEFAULT_LTV_MONTHS = 6
+
+def get_months_param(default=DEFAULT_MONTHS):
+    """?months= を取得（1〜MAX_MONTHS）"""
+    months = request.args.get('months', default, type=int)
+    if months is None or months < 1:
+        raise ValueError('months must be positive')
+    return min(months, MAX_MONTHS)
+
+def add_months(day, months):
+    """月初日に月数を加算"""
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def month_starts(months, today=None):
+    """当月を含む直近months か月の月初日（古い順）"""
+    current = (today or utc_today()).replace(day=1)
+    return [add_months(current, -offset) for offset in range(months - 1, -1, -1)]
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+def days_between(end, start):
+    """2つの日付の差（日数）の式"""
+    if dialect_name() == 'mysql':
+        return func.datediff(end, start)
+    return func.julianday(end) - func.julianday(start)
+
+def utc_today():
+    """contract_history.created_at（UTC）と同じ時計での本日"""
+    return datetime.utcnow().date()
+
+def json_value(column, key):
+    """JSON列の値を取り出す式（MySQLでは文字列の引用符を外す）"""
+    value = func.json_extract(column, f'$.{key}')
+    if dialect_name() == 'mysql':
+        value = func.json_unquote(value)
+    return value
+
+def month_key(day):
+    """日付の年月（YYYY-MM）の式"""
+    if dialect_name() == 'mysql':
+        return func.date_format(day, '%Y-%m')
+    return func.strftime('%Y-%m', day)
+
+def active_mrr(values):
+    """履歴の値（mrr・status）から稼働MRRを求める式（active 以外は0）"""
+    return case(
+        (json_value(values, 'status') == ContractStatus.ACTIVE.value,
+         func.coalesce(cast(json_value(values, 'mrr'), Integer), 0)),
+        else_=0
+    )
+
+def customer_daily_changes(until):
+    """顧客・日ごとの稼働MRRの増減（until より前）を集計するCTE
+
+    契約の変更（action='modified'）は履歴の作成日（UTC）に変更前後の稼働MRRの
+    差だけ増減させ、開始日以前の変更は開始日にまとめる。契約の開始日には、
+    現在の稼働MRRから変更による増減を差し引いた値を計上する
+    （契約ごとの増減の合計は必ず現在の稼働MRRに一致する）。
+    """
+    changed_on = func.date(ContractHistory.created_at, type_=Date)
+    changes = db.session.query(
+        Contract.id.label('contract_id'),
+        Contract.customer_id.label('customer_id'),
+        case((changed_on < Contract.start_date, Contract.start_date), else_=changed_on).label('day'),
+        (active_mrr(ContractHistory.new_values) - active_mrr(ContractHistory.old_values)).label('delta')
+    ).join(ContractHistory, ContractHistory.contract_id == Contract.id).filter(
+        ContractHistory.action == 'modified'
+    ).cte('contract_changes')
+
+    changed = db.session.query(
+        changes.c.contract_id, func.sum(changes.c.delta).label('delta')
+    ).group_by(changes.c.contract_id).subquery()
+    current = case((Contract.status == ContractStatus.ACTIVE, Contract.mrr), else_=0)
+    starts = db.session.query(
+        Contract.customer_id.label('customer_id'),
+        Contract.start_date.label('day'),
+        (current - func.coalesce(changed.c.delta, 0)).label('delta')
+    ).outerjoin(changed, changed.c.contract_id == Contract.id)
+
+    events = starts.union_all(
+        db.session.query(changes.c.customer_id, changes.c.day, changes.c.delta)
+    ).subquery()
+    return db.session.query(
+        events.c.customer_id, events.c.day, func.sum(events.c.delta).label('delta')
+    ).filter(events.c.day < until).group_by(events.c.customer_id, events.c.day).cte('customer_daily')
+
+def compute_mrr_movements(months, today=None):
+    """月ごとのMRRの内訳（新規・拡大・縮小・解約）と顧客数の推移
+
+    すべての増減を契約（contracts / contract_history）からSQLで月ごとに集計する。
+    顧客ごとの稼働MRRの累計（ウィンドウ関数）で、0から増えた日を新規、
+    0になった日を解約、それ以外の増減を拡大・縮小とする（同じ日の変更は
+    まとめて判定）。月の区切りと本日は created_at と同じUTCで判定し、
+    本日より後の変化は含めない。
+    """
+    today = today or utc_today()
+    starts = month_starts(months, today)
+    window_start = starts[0]
+    until = min(add_months(starts[-1], 1), today + timedelta(days=1))
+
+    daily = customer_daily_changes(until)
+    before = db.session.query(
+        daily.c.customer_id, func.sum(daily.c.delta).label('total')
+    ).filter(daily.c.day < window_start).group_by(daily.c.customer_id).subquery()
+    starting_mrr, starting_customers = db.session.query(
+        func.coalesce(func.sum(before.c.total), 0), func.count()
+    ).filter(before.c.total > 0).one()
+
+    running = db.session.query(
+        daily.c.day,
+        daily.c.delta,
+        func.sum(daily.c.delta).over(
+            partition_by=daily.c.customer_id, order_by=daily.c.day
+        ).label('total')
+    ).subquery()
+    old, new = running.c.total - running.c.delta, running.c.total
+    month_of = month_key(running.c.day)
+    rows = db.session.query(
+        month_of,
+        func.sum(case((and_(old <= 0, new > 0), new), else_=0)),
+        func.sum(case((and_(old > 0, new > old), new - old), else_=0)),
+        func.sum(case((and_(new > 0, old > new), old - new), else_=0)),
+        func.sum(case((and_(old > 0, new <= 0), old), else_=0)),
+        func.sum(case((and_(old <= 0, new > 0), 1), else_=0)),
+        func.sum(case((and_(old > 0, new <= 0), 1), else_=0))
+    ).filter(running.c.day >= window_start).group_by(month_of).all()
+    columns = ('new_mrr', 'expansion_mrr', 'contraction_mrr', 'churned_mrr', 'new_customers', 'churned_customers')
+    totals = {row[0]: dict(zip(columns, (int(value or 0) for value in row[1:]))) for row in rows}
+
+    results = []
+    mrr, customers = int(starting_mrr), starting_customers
+    for start in starts:
+        key = start.strftime('%Y-%m')
+        month = totals.get(key) or dict.fromkeys(columns, 0)
+        net_new = month['new_mrr'] + month['expansion_mrr'] - month['contraction_mrr'] - month['churned_mrr']
+        results.append({
+            'month': key,
+            'starting_mrr': mrr,
+            'new_mrr': month['new_mrr'],
+            'expansion_mrr': month['expansion_mrr'],
+            'contraction_mrr': month['contraction_mrr'],
+            'churned_mrr': month['churned_mrr'],
+            'net_new_mrr': net_new,
+            'ending_mrr': mrr + net_new,
+            'starting_customers': customers,
+            'new_customers': month['new_customers'],
+            'churned_customers': month['churned_customers']
+        })
+        mrr += net_new
+        customers += month['new_customers'] - month['churned_customers']
+    return results
+
+def rate(numerator, denominator):
+    return round(numerator / denominator * 100, 2) if denominator else 0.0
+
+def compute_churn(movements):
+    """月ごとの顧客チャーン率・収益チャーン率"""
+    return [{
+        'month': m['month'],
+        'starting_customers': m['starting_customers'],
+        'churned_customers': m['churned_customers'],
+        'customer_churn_rate': rate(m['churned_customers'], m['starting_customers']),
+        'revenue_churn_rate': rate(m['churned_mrr'], m['starting_mrr'])
+    } for m in movements]
+
+def compute_retention(movements):
+    """月ごとの売上継続率（NRR・GRR）と期間通算値"""
+    monthly = []
+    cumulative_nrr = 1.0
+    cumulative_grr = 1.0
+    for m in movements:
+        base = m['starting_mrr']
+        retained = base + m['expansion_mrr'] - m['contraction_mrr'] - m['churned_mrr']
+        gross = base - m['contraction_mrr'] - m['churned_mrr']
+        if base:
+            cumulative_nrr *= retained / base
+            cumulative_grr *= gross / base
+        monthly.append({
+            'month': m['month'],
+            'net_revenue_retention': rate(retained, base),
+            'gross_revenue_retention': rate(gross, base)
+        })
+    return {
+        'monthly': monthly,
+        'period_net_revenue_retention': round(cumulative_nrr * 100, 2),
+        'period_gross_revenue_retention': round(cumulative_grr * 100, 2)
+    }
+
+def compute_ltv(months, today=None):
+    """ARPA と平均月次チャーン率から算出したLTV、実績の平均継続月数"""
+    today = today or utc_today()
+    movements = compute_mrr_movements(months, today)
+    starting = sum(m['starting_customers'] for m in movements)
+    churned = sum(m['churned_customers'] for m in movements)
+    monthly_churn_rate = churned / starting if starting else 0.0
+
+    # ARPA も同じ推移（本日時点の稼働MRR・稼働顧客数）から算出
+    last = movements[-1]
+    active_customers = last['starting_customers'] + last['new_customers'] - last['churned_customers']
+    arpa = last['ending_mrr'] / active_customers if active_customers else 0.0
+
+    lifetime_days = db.session.query(
+        func.avg(days_between(func.coalesce(Customer.churn_date, today), Customer.contract_date))
+    ).filter(Customer.contract_date.isnot(None)).scalar()
+
+    return {
+        'period_months': months,
+        'active_customers': active_customers,
+        'arpa': round(arpa, 2),
+        'monthly_churn_rate': round(monthly_churn_rate * 100, 2),
+        'expected_lifetime_months': round(1 / monthly_churn_rate, 1) if monthly_churn_rate else None,
+        'ltv': round(arpa / monthly_churn_rate) if monthly_churn_rate else None,
+        'observed_lifetime_months': round(float(lifetime_days) / 30.4375, 1) if lifetime_days is not None else None
+    }
+
+@analytics_bp.route('/mrr-movements', methods=['GET'])
+@conditional_get('customers', 'contracts')
+@cached_response('customers', 'contracts')
+def get_mrr_movements():
+    """月ごとのMRRの内訳を取得（?months=、既定12）"""
+    try:
+        return jsonify({'months': compute_mrr_movements(get_months_param())})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/churn', methods=['GET'])
+@conditional_get('customers', 'contracts')
+@cached_response('customers', 'contracts')
+def get_churn():
+    """月ごとのチャーン率を取得（?months=、既定12）"""
+    try:
+        return jsonify({'months': compute_churn(compute_mrr_movements(get_months_param()))})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/retention', methods=['GET'])
+@conditional_get('customers', 'contracts')
+@cached_response('customers', 'contracts')
+def get_retention():
+    """月ごとのNRR・GRRと期間通算値を取得（?months=、既定12）"""
+    try:
+        return jsonify(compute_retention(compute_mrr_movements(get_months_param())))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/ltv', methods=['GET'])
+@conditional_get('customers', 'contracts')
+@cached_response('customers', 'contracts')
+def get_ltv():
+    """LTV・ARPA・平均継続月数を取得（?months= はチャーン率の集計期間、既定6）"""
+    try:
+        return jsonify(compute_ltv(get_months_param(DEFAULT_LTV_MONTHS)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/cohorts', methods=['GET'])
+@conditional_get('customers', 'contracts')
+@cached_response('customers', 'contracts')
+def get_cohorts():
+    """契約開始月ごとの顧客・売上継続率の表を取得（?months= は対象のコホート数、既定12）"""
+    try:
+        return jsonify({'cohorts': cohort_summary.get_matrix(get_months_param())})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/mrr-forecast', methods=['GET'])
+@conditional_get('customers', 'contracts')
+@cached_response('customers', 'contracts')
+def get_mrr_forecast():
+    """MRRの実績と予測を取得（?horizon= は予測する月数、既定6）"""
+    try:
+        horizon = request.args.get('horizon', mrr_forecast.DEFAULT_HORIZON, type=int)
+        if horizon is None or horizon < 1:
+            raise ValueError('horizon must be positive')
+        return jsonify(mrr_forecast.forecast(min(horizon, mrr_forecast.MAX_HORIZON)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@analytics_bp.route('/revenue-series', methods=['GET'])
+@conditional_get('customers')
+@cached_response('customers')
+def get_revenue_series():
+    """期間ごとの稼働MRR・顧客数・新規／解約数を取得
+
+    クエリパラメータ:
+        from / to: 期間（YYYY-MM-DD、既定は当月を含む直近12か月）
+        granularity: day / week / month（既定） / quarter
+    期間の数が revenue_series.MAX_PERIODS を超える指定や範囲外の日付は400を返す。
+    """
+    try:
+        granularity = request.args.get('granularity', revenue_series.DEFAULT_GRANULARITY)
+        if granularity not in revenue_series.GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(revenue_series.GRANULARITIES)}")
+        today = date.today()
+        end = parse_date(request.args.get('to')) or today
+        start = parse_date(request.args.get('from')) or month_starts(revenue_series.DEFAULT_MONTHS, end)[0]
+        revenue_series.validate_range(granularity, start, end, today)
+        return jsonify({
+            'granularity': granularity,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'periods': revenue_series.compute_series(granularity, start, end, today)
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -16,7 +16,10 @@ cgitb.enable()
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import the main application
-from main_xserver import app, SessionLocal, Customer
+from main_xserver import app, Customer
+
+# 旧方式ルートと同じ、アプリのエンジンにバインドしたセッションファクトリ
+SessionLocal = app.extensions['legacy_session']
 
 def handle_save():
     """Handle save customer request"""
@@ -3,39 +3,91 @@ SaaS販売管理システムの拡張APIエンドポイント
 """
 from flask import Blueprint, jsonify, request
 from datetime import datetime, timedelta, date
-from models import db, Contract, Invoice, InvoiceItem, Payment, RecurringBilling, ContractHistory
-from models import ContractStatus, InvoiceStatus, PaymentStatus, BillingCycle
-import random
-import string
+from sqlalchemy import and_, or_, func
+from models import db, Customer, Contract, Invoice, InvoiceItem, Payment, RecurringBilling, ContractHistory
+from models import ContractStatus, InvoiceStatus, PaymentStatus, PaymentMethod, BillingCycle
+from billing_engine import run_recurring_billing, DEFAULT_CHUNK_SIZE
+import billing_summary
+import cohort_summary
+import sequences
+import response_cache
+import table_versions
+from response_cache import cached_response
+from table_versions import conditional_get
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 1000
+
+def get_page_params():
+    """after_id / limit パラメータを取得（どちらも未指定ならページングしない）"""
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit <= 0:
+        raise ValueError('limit must be positive')
+    if after_id is None and limit is None:
+        return None, None
+    return after_id, min(limit or PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT)
+
+def fetch_page(query, limit):
+    """limitが指定されていれば1件多く取得して次ページの有無を判定"""
+    if limit is None:
+        return query.all(), False
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def page_response(key, items, limit, has_more):
+    """一覧レスポンスを作成（ページング時は次ページ情報を付与）"""
+    response = {key: items}
+    if limit is not None:
+        response['next_after_id'] = items[-1]['id'] if has_more else None
+        response['has_more'] = has_more
+    return response
+
 def generate_contract_number():
-    """契約番号を生成"""
-    prefix = "CTR"
-    timestamp = datetime.now().strftime("%Y%m")
-    random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-    return f"{prefix}-{timestamp}-{random_suffix}"
+    """契約番号を採番（CTR-YYYYMM-0001 形式の月ごとの連番）"""
+    return sequences.next_number('contract')
 
 def generate_invoice_number():
-    """請求書番号を生成"""
-    prefix = "INV"
-    timestamp = datetime.now().strftime("%Y%m")
-    random_suffix = ''.join(random.choices(string.digits, k=6))
-    return f"{prefix}-{timestamp}-{random_suffix}"
+    """請求書番号を採番（INV-YYYYMM-000001 形式の月ごとの連番）"""
+    return sequences.next_number('invoice')
 
 # 契約管理エンドポイント
 @api_bp.route('/contracts', methods=['GET'])
+@conditional_get('contracts', 'customers')
+@cached_response('contracts', 'customers')
 def get_contracts():
     """契約一覧を取得"""
     try:
-        contracts = Contract.query.all()
+        after_id, limit = get_page_params()
+        
+        # 顧客名はJOINで同時に取得し、必要なカラムのみを射影する
+        query = db.session.query(
+            Contract.id,
+            Contract.customer_id,
+            Customer.name.label('customer_name'),
+            Contract.contract_number,
+            Contract.plan,
+            Contract.start_date,
+            Contract.end_date,
+            Contract.auto_renewal,
+            Contract.mrr,
+            Contract.status,
+            Contract.notes,
+            Contract.created_at
+        ).join(Customer, Contract.customer_id == Customer.id).order_by(Contract.id)
+        
+        if after_id is not None:
+            query = query.filter(Contract.id > after_id)
+        
+        contracts, has_more = fetch_page(query, limit)
         result = []
         for contract in contracts:
             result.append({
                 'id': contract.id,
                 'customer_id': contract.customer_id,
-                'customer_name': contract.customer.name,
+                'customer_name': contract.customer_name,
                 'contract_number': contract.contract_number,
                 'plan': contract.plan,
                 'start_date': contract.start_date.isoformat(),
@@ -46,7 +98,9 @@ def get_contracts():
                 'notes': contract.notes,
                 'created_at': contract.created_at.isoformat()
             })
-        return jsonify({'contracts': result})
+        return jsonify(page_response('contracts', result, limit, has_more))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -103,7 +157,9 @@ def create_contract():
         )
         db.session.add(history)
         
+        table_versions.bump(db.session, 'contracts')
         db.session.commit()
+        response_cache.invalidate('contracts')
         
         return jsonify({
             'message': 'Contract created successfully',
@@ -156,8 +212,14 @@ def update_contract(contract_id):
             changed_by=data.get('modified_by', 'system')
         )
         db.session.add(history)
+        if contract.customer is not None:
+            cohort_summary.record_mrr_change(
+                db.session, contract.customer.contract_date, date.today(), old_values['mrr'], contract.mrr
+            )
         
+        table_versions.bump(db.session, 'contracts')
         db.session.commit()
+        response_cache.invalidate('contracts')
         
         return jsonify({'message': 'Contract updated successfully'})
         
@@ -167,20 +229,38 @@ def update_contract(contract_id):
 
 # 請求書管理エンドポイント
 @api_bp.route('/invoices', methods=['GET'])
+@conditional_get('invoices', 'customers')
 def get_invoices():
     """請求書一覧を取得"""
     try:
         status = request.args.get('status')
         customer_id = request.args.get('customer_id')
-        
-        query = Invoice.query
+        after_id, limit = get_page_params()
+        
+        # 顧客名はJOINで同時に取得し、必要なカラムのみを射影する
+        query = db.session.query(
+            Invoice.id,
+            Invoice.invoice_number,
+            Invoice.customer_id,
+            Customer.name.label('customer_name'),
+            Invoice.issue_date,
+            Invoice.due_date,
+            Invoice.amount,
+            Invoice.tax_amount,
+            Invoice.total_amount,
+            Invoice.status,
+            Invoice.paid_date,
+            Invoice.created_at
+        ).join(Customer, Invoice.customer_id == Customer.id).order_by(Invoice.id)
         
         if status:
-            query = query.filter_by(status=InvoiceStatus(status))
+            query = query.filter(Invoice.status == InvoiceStatus(status))
         if customer_id:
-            query = query.filter_by(customer_id=customer_id)
+            query = query.filter(Invoice.customer_id == customer_id)
+        if after_id is not None:
+            query = query.filter(Invoice.id > after_id)
         
-        invoices = query.all()
+        invoices, has_more = fetch_page(query, limit)
         result = []
         
         for invoice in invoices:
@@ -188,7 +268,7 @@ def get_invoices():
                 'id': invoice.id,
                 'invoice_number': invoice.invoice_number,
                 'customer_id': invoice.customer_id,
-                'customer_name': invoice.customer.name,
+                'customer_name': invoice.customer_name,
                 'issue_date': invoice.issue_date.isoformat(),
                 'due_date': invoice.due_date.isoformat(),
                 'amount': float(invoice.amount),
@@ -199,8 +279,10 @@ def get_invoices():
                 'created_at': invoice.created_at.isoformat()
             })
         
-        return jsonify({'invoices': result})
+        return jsonify(page_response('invoices', result, limit, has_more))
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -241,7 +323,12 @@ def create_invoice():
             )
             db.session.add(item)
         
+        # 日次サマリーに反映
+        billing_summary.record_invoice_created(invoice.issue_date, invoice.total_amount, invoice.status)
+        
+        table_versions.bump(db.session, 'invoices')
         db.session.commit()
+        response_cache.invalidate('invoices')
         
         return jsonify({
             'message': 'Invoice created successfully',
@@ -260,12 +347,18 @@ def send_invoice(invoice_id):
         invoice = Invoice.query.get_or_404(invoice_id)
         
         # ステータスを送信済みに更新
+        old_status = invoice.status
         invoice.status = InvoiceStatus.SENT
+        billing_summary.record_invoice_status_change(
+            invoice.issue_date, invoice.total_amount, old_status, invoice.status
+        )
         
         # TODO: 実際のメール送信処理を実装
         # send_invoice_email(invoice)
         
+        table_versions.bump(db.session, 'invoices')
         db.session.commit()
+        response_cache.invalidate('invoices')
         
         return jsonify({'message': 'Invoice sent successfully'})
         
@@ -275,25 +368,54 @@ def send_invoice(invoice_id):
 
 # 支払い管理エンドポイント
 @api_bp.route('/payments', methods=['GET'])
+@conditional_get('payments', 'invoices', 'customers')
 def get_payments():
     """支払い履歴を取得"""
     try:
         customer_id = request.args.get('customer_id')
+        after_id, limit = get_page_params()
+        
+        # 顧客名と請求書番号はJOINで同時に取得し、必要なカラムのみを射影する
+        query = db.session.query(
+            Payment.id,
+            Payment.customer_id,
+            Customer.name.label('customer_name'),
+            Payment.invoice_id,
+            Invoice.invoice_number,
+            Payment.payment_date,
+            Payment.amount,
+            Payment.payment_method,
+            Payment.transaction_id,
+            Payment.status,
+            Payment.created_at
+        ).join(
+            Customer, Payment.customer_id == Customer.id
+        ).outerjoin(
+            Invoice, Payment.invoice_id == Invoice.id
+        ).order_by(Payment.payment_date.desc(), Payment.id.desc())
         
-        query = Payment.query
         if customer_id:
-            query = query.filter_by(customer_id=customer_id)
-        
-        payments = query.order_by(Payment.payment_date.desc()).all()
+            query = query.filter(Payment.customer_id == customer_id)
+        if after_id is not None:
+            # (payment_date, id) の降順でカーソル位置より後ろを取得
+            cursor_date = db.session.query(Payment.payment_date).filter(
+                Payment.id == after_id
+            ).scalar_subquery()
+            query = query.filter(or_(
+                Payment.payment_date < cursor_date,
+                and_(Payment.payment_date == cursor_date, Payment.id < after_id)
+            ))
+        
+        payments, has_more = fetch_page(query, limit)
         result = []
         
         for payment in payments:
             result.append({
                 'id': payment.id,
                 'customer_id': payment.customer_id,
-                'customer_name': payment.customer.name,
+                'customer_name': payment.customer_name,
                 'invoice_id': payment.invoice_id,
-                'invoice_number': payment.invoice.invoice_number if payment.invoice else None,
+                'invoice_number': payment.invoice_number,
                 'payment_date': payment.payment_date.isoformat(),
                 'amount': float(payment.amount),
                 'payment_method': payment.payment_method.value,
@@ -302,8 +424,10 @@ def get_payments():
                 'created_at': payment.created_at.isoformat()
             })
         
-        return jsonify({'payments': result})
+        return jsonify(page_response('payments', result, limit, has_more))
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -326,16 +450,22 @@ def record_payment():
         )
         
         db.session.add(payment)
+        billing_summary.record_payment(payment.payment_date, payment.amount, payment.status)
         
         # 請求書のステータスを更新
         if payment.invoice_id:
             invoice = Invoice.query.get(payment.invoice_id)
             if invoice:
+                billing_summary.record_invoice_status_change(
+                    invoice.issue_date, invoice.total_amount, invoice.status, InvoiceStatus.PAID
+                )
                 invoice.status = InvoiceStatus.PAID
                 invoice.paid_date = payment.payment_date
                 invoice.payment_method = data['payment_method']
         
+        table_versions.bump(db.session, 'payments', 'invoices')
         db.session.commit()
+        response_cache.invalidate('payments', 'invoices')
         
         return jsonify({
             'message': 'Payment recorded successfully',
@@ -349,61 +479,18 @@ def record_payment():
 # 定期請求処理
 @api_bp.route('/billing/process-recurring', methods=['POST'])
 def process_recurring_billing():
-    """定期請求を処理"""
+    """定期請求を処理（チャンクの行をロックして請求し、チャンク単位でコミット）"""
     try:
-        # 本日が請求日の定期請求を取得
-        today = date.today()
-        recurring_billings = RecurringBilling.query.filter(
-            RecurringBilling.next_billing_date <= today,
-            RecurringBilling.is_active == True
-        ).all()
-        
-        processed = 0
-        for billing in recurring_billings:
-            contract = billing.contract
-            
-            # 請求書を作成
-            invoice_number = generate_invoice_number()
-            invoice = Invoice(
-                invoice_number=invoice_number,
-                customer_id=contract.customer_id,
-                contract_id=contract.id,
-                issue_date=today,
-                due_date=today + timedelta(days=30),
-                amount=contract.mrr,
-                tax_amount=contract.mrr * 0.1,  # 10%の税金
-                total_amount=contract.mrr * 1.1,
-                status=InvoiceStatus.SENT,
-                notes=f"定期請求 - {contract.plan}プラン"
-            )
-            db.session.add(invoice)
-            db.session.flush()
-            
-            # 請求明細を追加
-            item = InvoiceItem(
-                invoice_id=invoice.id,
-                description=f"{contract.plan}プラン - 月額料金",
-                quantity=1,
-                unit_price=contract.mrr,
-                amount=contract.mrr
-            )
-            db.session.add(item)
-            
-            # 次回請求日を更新
-            if billing.billing_cycle == BillingCycle.MONTHLY:
-                billing.next_billing_date = today + timedelta(days=30)
-            elif billing.billing_cycle == BillingCycle.QUARTERLY:
-                billing.next_billing_date = today + timedelta(days=90)
-            elif billing.billing_cycle == BillingCycle.ANNUALLY:
-                billing.next_billing_date = today + timedelta(days=365)
-            
-            processed += 1
+        chunk_size = request.args.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int)
+        if chunk_size <= 0:
+            return jsonify({'error': 'chunk_size must be positive'}), 400
         
-        db.session.commit()
+        summary = run_recurring_billing(chunk_size=chunk_size)
+        response_cache.invalidate('invoices')
         
         return jsonify({
-            'message': f'Processed {processed} recurring billings',
-            'processed': processed
+            'message': f"Processed {summary['processed']} recurring billings",
+            **summary
         })
         
     except Exception as e:
@@ -411,44 +498,77 @@ def process_recurring_billing():
         return jsonify({'error': str(e)}), 500
 
 # ダッシュボード用統計情報
+def compute_live_billing_stats(start_of_month, today):
+    """invoices / payments を直接集計して統計値を取得"""
+    # 今月の請求額
+    monthly_revenue = db.session.query(
+        func.coalesce(func.sum(Invoice.total_amount), 0)
+    ).filter(
+        Invoice.issue_date >= start_of_month,
+        Invoice.issue_date <= today
+    ).scalar()
+    monthly_revenue = float(monthly_revenue)
+    
+    # 未払い請求書
+    unpaid_amount, unpaid_count = db.session.query(
+        func.coalesce(func.sum(Invoice.total_amount), 0),
+        func.count(Invoice.id)
+    ).filter(
+        Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.OVERDUE])
+    ).one()
+    unpaid_amount = float(unpaid_amount)
+    
+    # 今月の回収額
+    collected_amount = db.session.query(
+        func.coalesce(func.sum(Payment.amount), 0)
+    ).filter(
+        Payment.payment_date >= start_of_month,
+        Payment.payment_date <= today,
+        Payment.status == PaymentStatus.COMPLETED
+    ).scalar()
+    collected_amount = float(collected_amount)
+    
+    return {
+        'monthly_revenue': monthly_revenue,
+        'unpaid_amount': unpaid_amount,
+        'unpaid_count': unpaid_count,
+        'collected_amount': collected_amount
+    }
+
 @api_bp.route('/stats/billing', methods=['GET'])
+@cached_response('invoices', 'payments', 'contracts')
 def get_billing_stats():
-    """請求関連の統計情報を取得"""
+    """請求関連の統計情報を取得
+
+    通常は日次サマリーから集計し、?source=live の場合は元テーブルを直接集計する
+    """
     try:
-        # 今月の請求額
         today = date.today()
         start_of_month = date(today.year, today.month, 1)
         
-        monthly_invoices = Invoice.query.filter(
-            Invoice.issue_date >= start_of_month,
-            Invoice.issue_date <= today
-        ).all()
-        
-        monthly_revenue = sum(float(inv.total_amount) for inv in monthly_invoices)
-        
-        # 未払い請求書
-        unpaid_invoices = Invoice.query.filter(
-            Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.OVERDUE])
-        ).all()
-        
-        unpaid_amount = sum(float(inv.total_amount) for inv in unpaid_invoices)
+        if request.args.get('source') == 'live':
+            stats = compute_live_billing_stats(start_of_month, today)
+        else:
+            summary = billing_summary.summarize(start_of_month, today)
+            stats = {
+                'monthly_revenue': summary['invoiced_amount'],
+                'unpaid_amount': summary['unpaid_amount'],
+                'unpaid_count': summary['unpaid_count'],
+                'collected_amount': summary['collected_amount']
+            }
         
         # アクティブな契約数
-        active_contracts = Contract.query.filter_by(status=ContractStatus.ACTIVE).count()
-        
-        # 今月の回収額
-        monthly_payments = Payment.query.filter(
-            Payment.payment_date >= start_of_month,
-            Payment.payment_date <= today,
-            Payment.status == PaymentStatus.COMPLETED
-        ).all()
+        active_contracts = db.session.query(func.count(Contract.id)).filter(
+            Contract.status == ContractStatus.ACTIVE
+        ).scalar()
         
-        collected_amount = sum(float(p.amount) for p in monthly_payments)
+        monthly_revenue = stats['monthly_revenue']
+        collected_amount = stats['collected_amount']
         
         return jsonify({
             'monthly_revenue': monthly_revenue,
-            'unpaid_amount': unpaid_amount,
-            'unpaid_count': len(unpaid_invoices),
+            'unpaid_amount': stats['unpaid_amount'],
+            'unpaid_count': stats['unpaid_count'],
             'active_contracts': active_contracts,
             'collected_amount': collected_amount,
             'collection_rate': (collected_amount / monthly_revenue * 100) if monthly_revenue > 0 else 0
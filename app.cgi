@@ -3,6 +3,10 @@
 
 """
 XServer CGIモード用エントリーポイント
+
+リクエストごとにプロセスが起動するため、通常は xserver_start.sh で起動する
+常駐FastCGIサーバー（run_xserver.py --fcgi）を使用する。
+常駐サーバーを起動できない場合のフォールバックとして残している。
 """
 
 import sys
@@ -12,18 +16,12 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # 環境変数の読み込み
-from pathlib import Path
-env_file = Path(__file__).parent / '.env.xserver'
-if env_file.exists():
-    with open(env_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                key, value = line.split('=', 1)
-                os.environ[key] = value
-
-# Flaskアプリケーションのインポート
-from main import app
+from xserver_env import load_env_file
+load_env_file()
+
+# Flaskアプリケーションの作成
+from main import create_app
+app = create_app()
 
 # CGIハンドラーの設定
 from wsgiref.handlers import CGIHandler
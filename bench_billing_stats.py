@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+請求統計（/api/stats/billing）のベンチマーク
+
+一時ディレクトリのSQLiteデータベースに請求書・支払いを作成し、統計値の算出時間を
+方式ごとに計測する。
+
+rows:    変更前の方式（該当する請求書・支払いをすべて読み込み、Pythonで合計）
+live:    SQLの集計関数で合計（?source=live）
+summary: 日次サマリーの行を合計（既定）
+
+使い方:
+    python bench_billing_stats.py [--invoices 100000] [--runs 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+DB_DIR = tempfile.mkdtemp(prefix='saas-bench-')
+# main の import 前に一時データベースを指定する
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(DB_DIR, 'bench.db')}"
+os.environ.pop('ENVIRONMENT', None)
+os.environ.pop('GAE_ENV', None)
+
+from main import create_app  # noqa: E402
+from models import db, Customer, Invoice, Payment  # noqa: E402
+from models import InvoiceStatus, PaymentMethod, PaymentStatus  # noqa: E402
+from api_extensions import compute_live_billing_stats  # noqa: E402
+import billing_summary  # noqa: E402
+import response_cache  # noqa: E402
+
+def seed(invoices, today):
+    """直近1年に分散した請求書と、その半数分の支払いを作成"""
+    random.seed(0)
+    customer = Customer(name='ベンチマーク顧客', plan='Basic', mrr=10000)
+    db.session.add(customer)
+    db.session.flush()
+    statuses = list(InvoiceStatus)
+    db.session.bulk_insert_mappings(Invoice, [{
+        'invoice_number': f"INV-BENCH-{i:08d}",
+        'customer_id': customer.id,
+        'issue_date': today - timedelta(days=random.randrange(365)),
+        'due_date': today,
+        'amount': 10000,
+        'tax_amount': 1000,
+        'total_amount': 11000,
+        'status': random.choice(statuses)
+    } for i in range(invoices)])
+    db.session.bulk_insert_mappings(Payment, [{
+        'customer_id': customer.id,
+        'payment_date': today - timedelta(days=random.randrange(365)),
+        'amount': 11000,
+        'payment_method': PaymentMethod.BANK_TRANSFER,
+        'status': PaymentStatus.COMPLETED
+    } for _ in range(invoices // 2)])
+    db.session.commit()
+    billing_summary.rebuild()
+
+def load_rows_stats(start_of_month, today):
+    """変更前の方式: 行を読み込んでPythonで合計"""
+    monthly_invoices = Invoice.query.filter(
+        Invoice.issue_date >= start_of_month,
+        Invoice.issue_date <= today
+    ).all()
+    unpaid_invoices = Invoice.query.filter(
+        Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.OVERDUE])
+    ).all()
+    monthly_payments = Payment.query.filter(
+        Payment.payment_date >= start_of_month,
+        Payment.payment_date <= today,
+        Payment.status == PaymentStatus.COMPLETED
+    ).all()
+    return {
+        'monthly_revenue': sum(float(inv.total_amount) for inv in monthly_invoices),
+        'unpaid_amount': sum(float(inv.total_amount) for inv in unpaid_invoices),
+        'unpaid_count': len(unpaid_invoices),
+        'collected_amount': sum(float(p.amount) for p in monthly_payments)
+    }
+
+def summary_stats(start_of_month, today):
+    summary = billing_summary.summarize(start_of_month, today)
+    return {
+        'monthly_revenue': summary['invoiced_amount'],
+        'unpaid_amount': summary['unpaid_amount'],
+        'unpaid_count': summary['unpaid_count'],
+        'collected_amount': summary['collected_amount']
+    }
+
+def measure(func, runs, *args):
+    """runs 回実行し、各回の所要時間（ミリ秒）と最後の結果を返す"""
+    samples = []
+    result = None
+    for _ in range(runs):
+        # 前回読み込んだORMオブジェクトを持ち越さない
+        db.session.expunge_all()
+        started = time.perf_counter()
+        result = func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples, result
+
+def report(label, samples):
+    print(f"{label:<9} median={statistics.median(samples):8.2f} ms  "
+          f"min={min(samples):8.2f}  max={max(samples):8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='請求統計の算出時間を方式ごとに比較します')
+    parser.add_argument('--invoices', type=int, default=100000, help='作成する請求書の件数')
+    parser.add_argument('--runs', type=int, default=20, help='計測回数')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        today = date.today()
+        start_of_month = today.replace(day=1)
+        seed(args.invoices, today)
+        print(f"invoices={args.invoices}  payments={args.invoices // 2}  runs={args.runs}")
+
+        results = {}
+        for label, func in (('rows', load_rows_stats), ('live', compute_live_billing_stats),
+                            ('summary', summary_stats)):
+            samples, results[label] = measure(func, args.runs, start_of_month, today)
+            report(label, samples)
+
+        # エンドポイント全体（レスポンスキャッシュは毎回無効化する）
+        client = app.test_client()
+        for label, path in (('GET live', '/api/stats/billing?source=live'), ('GET', '/api/stats/billing')):
+            samples = []
+            for _ in range(args.runs):
+                response_cache.invalidate('invoices')
+                started = time.perf_counter()
+                response = client.get(path)
+                samples.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.get_data(as_text=True)
+            report(label, samples)
+
+    if len({tuple(sorted(r.items())) for r in results.values()}) != 1:
+        print(f"⚠️ 方式ごとの結果が一致しません: {results}")
+
+if __name__ == '__main__':
+    main()
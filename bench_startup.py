@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+起動時間のベンチマーク
+
+新しいPythonプロセスで main.py をインポートしてアプリを作成し、最初のレスポンスを返すまでの
+時間を計測する（CGIのように毎回プロセスが起動する環境のコールドスタートを再現）。
+
+使い方:
+    python bench_startup.py [--runs 10] [--path /metrics/cache]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 子プロセスで実行する計測コード
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+response = main.create_app().test_client().get(sys.argv[1])
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (finished - started) * 1000,
+    'status': response.status_code
+}))
+"""
+
+def run_once(path):
+    """1回分の起動時間を計測"""
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, path],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='インポートから最初のレスポンスまでの時間を計測します')
+    parser.add_argument('--runs', type=int, default=10, help='計測回数')
+    parser.add_argument('--path', default='/metrics/cache', help='最初にリクエストするパス')
+    args = parser.parse_args()
+
+    samples = [run_once(args.path) for _ in range(args.runs)]
+    for key in ('import_ms', 'first_response_ms'):
+        values = [s[key] for s in samples]
+        print(f"{key:<20} median={statistics.median(values):8.1f}  min={min(values):8.1f}  max={max(values):8.1f}")
+    print(f"status codes: {sorted(set(s['status'] for s in samples))}")
+
+if __name__ == '__main__':
+    main()
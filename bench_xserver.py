@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+XServer実行方式のベンチマーク（CGI と 常駐FastCGI のリクエスト/秒を比較）
+
+CGI: リクエストごとに app.cgi を新しいPythonプロセスで実行する（Apacheと同じ方式）
+FastCGI: run_xserver.py --fcgi で常駐サーバーを起動し、unixソケット経由でリクエストする
+
+使い方:
+    python bench_xserver.py [--requests 50] [--concurrency 4] [--path /customers]
+
+FastCGIサーバーの起動には flup が必要（requirements_xserver.txt）。
+"""
+import argparse
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent
+
+def cgi_environ(path):
+    """GETリクエスト用のCGI環境変数"""
+    path_info, _, query = path.partition('?')
+    return {
+        'GATEWAY_INTERFACE': 'CGI/1.1',
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path_info,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+    }
+
+def parse_status(output):
+    """CGIレスポンスのStatusヘッダーからステータスコードを取得"""
+    status = output.split(b'\r\n', 1)[0]
+    return int(status.split()[1]) if status.startswith(b'Status:') else 200
+
+def cgi_request(path):
+    """app.cgi をCGIとして1回実行し、ステータスコードを返す"""
+    result = subprocess.run(
+        [sys.executable, str(project_root / 'app.cgi')],
+        env=dict(os.environ, **cgi_environ(path)), capture_output=True, check=True
+    )
+    return parse_status(result.stdout)
+
+def fcgi_record(record_type, content=b''):
+    """FastCGIレコード（リクエストID 1）を作成"""
+    return struct.pack('!BBHHBx', 1, record_type, 1, len(content), 0) + content
+
+def fcgi_params(params):
+    """FastCGIのPARAMSレコード本体（名前・値のペア）を作成"""
+    body = b''
+    for name, value in params.items():
+        name, value = name.encode('utf-8'), value.encode('utf-8')
+        for item in (name, value):
+            body += struct.pack('!B', len(item)) if len(item) < 128 else struct.pack('!I', len(item) | 0x80000000)
+        body += name + value
+    return body
+
+def fcgi_request(socket_path, path):
+    """unixソケット経由でFastCGIサーバーに1回リクエストし、ステータスコードを返す"""
+    FCGI_BEGIN_REQUEST, FCGI_END_REQUEST, FCGI_PARAMS, FCGI_STDIN, FCGI_STDOUT = 1, 3, 4, 5, 6
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(
+            fcgi_record(FCGI_BEGIN_REQUEST, struct.pack('!HB5x', 1, 0))  # RESPONDER
+            + fcgi_record(FCGI_PARAMS, fcgi_params(cgi_environ(path)))
+            + fcgi_record(FCGI_PARAMS)
+            + fcgi_record(FCGI_STDIN)
+        )
+        stream = sock.makefile('rb')
+        stdout = b''
+        while True:
+            header = stream.read(8)
+            if len(header) < 8:
+                raise RuntimeError("FastCGI connection closed unexpectedly")
+            _, record_type, _, length, padding = struct.unpack('!BBHHBx', header)
+            content = stream.read(length)
+            stream.read(padding)
+            if record_type == FCGI_STDOUT:
+                stdout += content
+            elif record_type == FCGI_END_REQUEST:
+                return parse_status(stdout)
+
+def run_requests(func, total, concurrency):
+    """func を total 回実行し、経過時間とステータスコードの一覧を返す"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(lambda _: func(), range(total)))
+    return time.perf_counter() - started, statuses
+
+def bench_cgi(path, total, concurrency):
+    return run_requests(lambda: cgi_request(path), total, concurrency)
+
+def bench_fcgi(path, total, concurrency, workers):
+    """常駐FastCGIサーバーを起動して計測"""
+    socket_path = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+    server = subprocess.Popen(
+        [sys.executable, str(project_root / 'run_xserver.py'),
+         '--fcgi', '--socket', socket_path, '--workers', str(workers)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(socket_path):
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("FastCGI server did not start")
+            time.sleep(0.1)
+
+        # ウォームアップ（各ワーカーのDB接続を作成）
+        run_requests(lambda: fcgi_request(socket_path, path), workers * 2, workers)
+        return run_requests(lambda: fcgi_request(socket_path, path), total, concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+
+def report(label, elapsed, statuses):
+    print(f"{label:<8} {len(statuses) / elapsed:8.1f} req/s  "
+          f"({len(statuses)} requests in {elapsed:.2f}s, status {sorted(set(statuses))})")
+
+def main():
+    parser = argparse.ArgumentParser(description='CGIと常駐FastCGIのリクエスト/秒を比較します')
+    parser.add_argument('--requests', type=int, default=50, help='リクエスト数')
+    parser.add_argument('--concurrency', type=int, default=4, help='同時リクエスト数')
+    parser.add_argument('--workers', type=int, default=4, help='FastCGIのワーカー数')
+    parser.add_argument('--path', default='/customers', help='リクエストするパス')
+    args = parser.parse_args()
+
+    cgi_elapsed, cgi_statuses = bench_cgi(args.path, args.requests, args.concurrency)
+    report('CGI', cgi_elapsed, cgi_statuses)
+
+    fcgi_elapsed, fcgi_statuses = bench_fcgi(args.path, args.requests, args.concurrency, args.workers)
+    report('FastCGI', fcgi_elapsed, fcgi_statuses)
+
+    print(f"speedup  {cgi_elapsed / fcgi_elapsed:8.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+定期請求のバッチ処理エンジン
+
+請求対象の定期請求をid順に一定件数ずつ取得し、チャンク単位で
+請求書・請求明細を一括INSERTしてコミットする。
+次回請求日の更新も同じトランザクションで行うため、途中で異常終了しても
+再実行すれば未処理の定期請求から続きが処理される。
+チャンクの行は SELECT ... FOR UPDATE SKIP LOCKED でロックしてから請求するため、
+API・ワーカーが同時に実行されても同じ定期請求を二重に請求しない。
+請求書番号はチャンクごとに sequences から連番のブロックを1回で確保する。
+"""
+import logging
+import time
+from datetime import date, timedelta
+from models import db, Contract, Invoice, InvoiceItem, RecurringBilling
+from models import InvoiceStatus, BillingCycle
+import billing_summary
+import sequences
+import table_versions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+TAX_RATE = 0.1
+
+# 請求サイクルごとの次回請求日までの日数
+BILLING_CYCLE_DAYS = {
+    BillingCycle.MONTHLY: 30,
+    BillingCycle.QUARTERLY: 90,
+    BillingCycle.ANNUALLY: 365,
+}
+
+def due_billings_query(today):
+    """請求対象の定期請求と契約情報をカラム単位で取得するクエリ"""
+    return db.session.query(
+        RecurringBilling.id,
+        RecurringBilling.billing_cycle,
+        Contract.id.label('contract_id'),
+        Contract.customer_id,
+        Contract.mrr,
+        Contract.plan
+    ).join(
+        Contract, RecurringBilling.contract_id == Contract.id
+    ).filter(
+        RecurringBilling.next_billing_date <= today,
+        RecurringBilling.is_active == True
+    ).order_by(RecurringBilling.id)
+
+def lock_due(query):
+    """定期請求の行ロックを取得し、他の実行で処理中の行は読み飛ばす（MySQL 8.0以降）"""
+    return query.with_for_update(skip_locked=True, of=RecurringBilling)
+
+def fetch_due_chunk(today, after_id, chunk_size, customer_range=None):
+    """after_idより後ろの請求対象をchunk_size件、行ロックを取得して取得
+
+    customer_range: (最小customer_id, 最大customer_id) で対象を絞り込む
+    """
+    query = due_billings_query(today)
+    if after_id is not None:
+        query = query.filter(RecurringBilling.id > after_id)
+    if customer_range is not None:
+        query = query.filter(RecurringBilling.customer_id.between(*customer_range))
+    return lock_due(query).limit(chunk_size).all()
+
+def next_billing_date(billing_cycle, today):
+    """次回請求日を計算"""
+    return today + timedelta(days=BILLING_CYCLE_DAYS.get(billing_cycle, 30))
+
+def bill_chunk(rows, today):
+    """1チャンク分の請求書・明細を一括作成し、次回請求日を更新してコミット"""
+    invoice_rows = []
+    numbers = sequences.allocate_numbers('invoice', len(rows), today)
+    for row, invoice_number in zip(rows, numbers):
+        invoice_rows.append({
+            'invoice_number': invoice_number,
+            'customer_id': row.customer_id,
+            'contract_id': row.contract_id,
+            'issue_date': today,
+            'due_date': today + timedelta(days=30),
+            'amount': row.mrr,
+            'tax_amount': row.mrr * TAX_RATE,
+            'total_amount': row.mrr * (1 + TAX_RATE),
+            'status': InvoiceStatus.SENT,
+            'notes': f"定期請求 - {row.plan}プラン"
+        })
+
+    try:
+        db.session.bulk_insert_mappings(Invoice, invoice_rows)
+
+        # 採番されたidを請求書番号から引き当てて明細を作成
+        invoice_ids = dict(db.session.query(Invoice.invoice_number, Invoice.id).filter(
+            Invoice.invoice_number.in_(numbers)
+        ).all())
+        db.session.bulk_insert_mappings(InvoiceItem, [
+            {
+                'invoice_id': invoice_ids[invoice['invoice_number']],
+                'description': f"{row.plan}プラン - 月額料金",
+                'quantity': 1,
+                'unit_price': row.mrr,
+                'amount': row.mrr
+            }
+            for row, invoice in zip(rows, invoice_rows)
+        ])
+
+        db.session.bulk_update_mappings(RecurringBilling, [
+            {'id': row.id, 'next_billing_date': next_billing_date(row.billing_cycle, today)}
+            for row in rows
+        ])
+        billing_summary.record_invoices_created(invoice_rows)
+        table_versions.bump(db.session, 'invoices')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def process_chunk(rows, today, summary):
+    """チャンクを処理し、失敗した場合は1件ずつ再試行して不正な行を切り分ける"""
+    try:
+        bill_chunk(rows, today)
+        summary['processed'] += len(rows)
+    except Exception as e:
+        if len(rows) == 1:
+            logger.error(f"Recurring billing {rows[0].id} failed: {e}")
+            summary['failed'] += 1
+            summary['failed_billing_ids'].append(rows[0].id)
+            return
+        logger.warning(f"Chunk of {len(rows)} billings failed, retrying row by row: {e}")
+        for row in rows:
+            # ロールバックでロックが外れているため取り直す（他の実行で処理済みなら対象外）
+            locked = lock_due(due_billings_query(today).filter(RecurringBilling.id == row.id)).all()
+            if not locked:
+                db.session.rollback()
+                continue
+            process_chunk(locked, today, summary)
+
+def run_recurring_billing(today=None, chunk_size=DEFAULT_CHUNK_SIZE, customer_range=None):
+    """請求対象の定期請求をチャンク単位で処理し、実行サマリーを返す
+
+    customer_range: fetch_due_chunk を参照
+    """
+    today = today or date.today()
+    summary = {
+        'processed': 0,
+        'failed': 0,
+        'chunks': 0,
+        'failed_billing_ids': [],
+    }
+    started = time.monotonic()
+
+    after_id = None
+    while True:
+        rows = fetch_due_chunk(today, after_id, chunk_size, customer_range)
+        if not rows:
+            db.session.rollback()
+            break
+        process_chunk(rows, today, summary)
+        summary['chunks'] += 1
+        after_id = rows[-1].id
+        logger.info(f"Billing chunk {summary['chunks']} done: processed={summary['processed']}, failed={summary['failed']}")
+
+    elapsed = time.monotonic() - started
+    summary['elapsed_seconds'] = round(elapsed, 3)
+    summary['rows_per_second'] = round(summary['processed'] / elapsed, 1) if elapsed > 0 else 0
+    logger.info(f"Recurring billing run finished: {summary}")
+    return summary
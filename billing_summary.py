@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+日次請求サマリー（billing_daily_summary）の増分更新と再構築
+
+請求書・支払いの作成やステータス変更、顧客の削除（請求書・支払いの連鎖削除）時に、
+同じトランザクション内で該当日の集計行へ差分を加算する。
+ダッシュボードの統計はこの集計行のみを読む。
+
+再構築:
+    python billing_summary.py [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import case, func
+from models import db, BillingDailySummary, Invoice, Payment
+from models import InvoiceStatus, PaymentStatus
+import response_cache
+from upsert import upsert_increment
+
+logger = logging.getLogger(__name__)
+
+# 未払いとして集計する請求書ステータス
+UNPAID_STATUSES = (InvoiceStatus.SENT, InvoiceStatus.OVERDUE)
+
+SUMMARY_COLUMNS = (
+    'invoiced_amount', 'invoice_count', 'unpaid_amount', 'unpaid_count',
+    'collected_amount', 'payment_count'
+)
+
+def apply_delta(summary_date, session=None, **deltas):
+    """指定日の集計行に差分を加算（行がなければ作成）
+
+    session: 実行するセッション（省略時は db.session）
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    upsert_increment(session or db.session, BillingDailySummary.__table__, {'summary_date': summary_date}, deltas)
+
+def unpaid_delta(status, total_amount, sign=1):
+    """ステータスに応じた未払い額・件数の差分"""
+    if status in UNPAID_STATUSES:
+        return {'unpaid_amount': sign * total_amount, 'unpaid_count': sign}
+    return {}
+
+def record_invoice_created(issue_date, total_amount, status):
+    """請求書作成を集計に反映"""
+    apply_delta(
+        issue_date,
+        invoiced_amount=total_amount,
+        invoice_count=1,
+        **unpaid_delta(status, total_amount)
+    )
+
+def record_invoices_created(invoices):
+    """一括作成した請求書（辞書のリスト）を日付ごとにまとめて集計に反映"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for invoice in invoices:
+        day = deltas[invoice['issue_date']]
+        day['invoiced_amount'] += invoice['total_amount']
+        day['invoice_count'] += 1
+        for column, value in unpaid_delta(invoice['status'], invoice['total_amount']).items():
+            day[column] += value
+    for issue_date, day in deltas.items():
+        apply_delta(issue_date, **day)
+
+def record_invoice_status_change(issue_date, total_amount, old_status, new_status):
+    """請求書ステータスの変更による未払い額の増減を集計に反映"""
+    if old_status == new_status:
+        return
+    deltas = defaultdict(int)
+    for column, value in unpaid_delta(old_status, total_amount, sign=-1).items():
+        deltas[column] += value
+    for column, value in unpaid_delta(new_status, total_amount).items():
+        deltas[column] += value
+    apply_delta(issue_date, **deltas)
+
+def record_payment(payment_date, amount, status):
+    """支払いを集計に反映（完了した支払いのみ）"""
+    if status == PaymentStatus.COMPLETED:
+        apply_delta(payment_date, collected_amount=amount, payment_count=1)
+
+def record_customer_removed(session, customer_id):
+    """顧客の削除で連鎖削除される請求書・支払いを集計から差し引く
+
+    削除前に同じセッション（トランザクション）内で呼び出す。
+    """
+    unpaid = Invoice.status.in_(UNPAID_STATUSES)
+    invoice_rows = session.query(
+        Invoice.issue_date,
+        func.sum(Invoice.total_amount),
+        func.count(Invoice.id),
+        func.sum(case((unpaid, Invoice.total_amount), else_=0)),
+        func.sum(case((unpaid, 1), else_=0))
+    ).filter(Invoice.customer_id == customer_id).group_by(Invoice.issue_date).all()
+    for issue_date, invoiced, count, unpaid_amount, unpaid_count in invoice_rows:
+        apply_delta(
+            issue_date, session,
+            invoiced_amount=-invoiced,
+            invoice_count=-count,
+            unpaid_amount=-(unpaid_amount or 0),
+            unpaid_count=-(unpaid_count or 0)
+        )
+
+    payment_rows = session.query(
+        Payment.payment_date,
+        func.sum(Payment.amount),
+        func.count(Payment.id)
+    ).filter(
+        Payment.customer_id == customer_id,
+        Payment.status == PaymentStatus.COMPLETED
+    ).group_by(Payment.payment_date).all()
+    for payment_date, collected, count in payment_rows:
+        apply_delta(payment_date, session, collected_amount=-collected, payment_count=-count)
+
+def summarize(start_date, end_date):
+    """期間内の集計行を合計"""
+    invoiced, collected = db.session.query(
+        func.coalesce(func.sum(BillingDailySummary.invoiced_amount), 0),
+        func.coalesce(func.sum(BillingDailySummary.collected_amount), 0)
+    ).filter(
+        BillingDailySummary.summary_date >= start_date,
+        BillingDailySummary.summary_date <= end_date
+    ).one()
+    unpaid_amount, unpaid_count = db.session.query(
+        func.coalesce(func.sum(BillingDailySummary.unpaid_amount), 0),
+        func.coalesce(func.sum(BillingDailySummary.unpaid_count), 0)
+    ).one()
+    return {
+        'invoiced_amount': float(invoiced),
+        'collected_amount': float(collected),
+        'unpaid_amount': float(unpaid_amount),
+        'unpaid_count': int(unpaid_count)
+    }
+
+def rebuild(start_date=None, end_date=None):
+    """invoices / payments から集計行を再構築（期間指定がなければ全期間）"""
+    def in_range(column, query):
+        if start_date:
+            query = query.filter(column >= start_date)
+        if end_date:
+            query = query.filter(column <= end_date)
+        return query
+
+    unpaid = Invoice.status.in_(UNPAID_STATUSES)
+    invoice_rows = in_range(Invoice.issue_date, db.session.query(
+        Invoice.issue_date,
+        func.sum(Invoice.total_amount),
+        func.count(Invoice.id),
+        func.sum(case((unpaid, Invoice.total_amount), else_=0)),
+        func.sum(case((unpaid, 1), else_=0))
+    )).group_by(Invoice.issue_date).all()
+
+    payment_rows = in_range(Payment.payment_date, db.session.query(
+        Payment.payment_date,
+        func.sum(Payment.amount),
+        func.count(Payment.id)
+    ).filter(Payment.status == PaymentStatus.COMPLETED)).group_by(Payment.payment_date).all()
+
+    summaries = defaultdict(lambda: dict.fromkeys(SUMMARY_COLUMNS, 0))
+    for issue_date, invoiced, count, unpaid_amount, unpaid_count in invoice_rows:
+        summaries[issue_date].update({
+            'invoiced_amount': invoiced,
+            'invoice_count': count,
+            'unpaid_amount': unpaid_amount or 0,
+            'unpaid_count': unpaid_count or 0
+        })
+    for payment_date, collected, count in payment_rows:
+        summaries[payment_date].update({'collected_amount': collected, 'payment_count': count})
+
+    try:
+        in_range(BillingDailySummary.summary_date, BillingDailySummary.query).delete(
+            synchronize_session=False
+        )
+        db.session.bulk_insert_mappings(BillingDailySummary, [
+            {'summary_date': summary_date, **values}
+            for summary_date, values in summaries.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Rebuilt billing_daily_summary: {len(summaries)} days")
+    return len(summaries)
+
+if __name__ == '__main__':
+    from billing_worker import create_worker_app
+
+    parser = argparse.ArgumentParser(description='日次請求サマリーを再構築します')
+    parser.add_argument('--from', dest='start_date', help='開始日（YYYY-MM-DD）')
+    parser.add_argument('--to', dest='end_date', help='終了日（YYYY-MM-DD）')
+    args = parser.parse_args()
+
+    start_date = datetime.strptime(args.start_date, '%Y-%m-%d').date() if args.start_date else None
+    end_date = datetime.strptime(args.end_date, '%Y-%m-%d').date() if args.end_date else None
+
+    app = create_worker_app()
+    with app.app_context():
+        db.create_all()
+        days = rebuild(start_date, end_date)
+    response_cache.invalidate('invoices', 'payments')
+    print(f"✅ {days}日分のサマリーを再構築しました")
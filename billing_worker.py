@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+定期請求を複数プロセスで並列実行するワーカー
+
+請求対象の定期請求を customer_id の範囲で分割し、プロセスプールで
+パーティションごとに billing_engine を実行する。
+各プロセスは独自のDB接続を持ち、SELECT ... FOR UPDATE SKIP LOCKED で
+行ロックを取得するため、同じ契約が二重に請求されることはない。
+
+使い方:
+    python billing_worker.py --workers 8 --chunk-size 500
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from sqlalchemy import func
+from models import db, RecurringBilling
+from billing_engine import run_recurring_billing, DEFAULT_CHUNK_SIZE
+import response_cache
+from main import create_app
+
+# ロギング設定
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def create_worker_app():
+    """ワーカー用のアプリを作成（プロセスごとに接続2本の独自プールを持つ）
+
+    チャンクの行ロックを保持したまま、請求書番号の確保（sequences.reserve）を
+    別の短いトランザクションで行うため、接続を2本使用する。
+    """
+    return create_app({
+        'SQLALCHEMY_ENGINE_OPTIONS': {
+            'pool_size': 2,
+            'max_overflow': 0
+        }
+    })
+
+def plan_partitions(today, partitions):
+    """請求対象のcustomer_idの範囲を均等に分割"""
+    app = create_worker_app()
+    with app.app_context():
+        low, high = db.session.query(
+            func.min(RecurringBilling.customer_id),
+            func.max(RecurringBilling.customer_id)
+        ).filter(
+            RecurringBilling.next_billing_date <= today,
+            RecurringBilling.is_active == True
+        ).one()
+        # 子プロセスに接続を引き継がないよう破棄しておく
+        db.engine.dispose()
+
+    if low is None:
+        return []
+
+    step = max(1, -(-(high - low + 1) // partitions))
+    return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+def run_partition(customer_range, today, chunk_size):
+    """1パーティション分の定期請求を処理（子プロセスで実行）"""
+    app = create_worker_app()
+    with app.app_context():
+        try:
+            summary = run_recurring_billing(
+                today=today,
+                chunk_size=chunk_size,
+                customer_range=customer_range
+            )
+        finally:
+            db.session.remove()
+            db.engine.dispose()
+    summary['customer_range'] = list(customer_range)
+    return summary
+
+def run_parallel(workers, chunk_size=DEFAULT_CHUNK_SIZE, partitions=None, today=None):
+    """パーティションを並列に処理し、全体のサマリーを返す"""
+    today = today or date.today()
+    partitions = partitions or workers * 4
+    started = time.monotonic()
+
+    ranges = plan_partitions(today, partitions)
+    logger.info(f"Billing {len(ranges)} partitions with {workers} workers (date={today})")
+
+    total = {
+        'processed': 0,
+        'failed': 0,
+        'chunks': 0,
+        'failed_billing_ids': [],
+        'partitions': len(ranges),
+        'failed_partitions': []
+    }
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_partition, customer_range, today, chunk_size): customer_range
+            for customer_range in ranges
+        }
+        for future in as_completed(futures):
+            customer_range = futures[future]
+            try:
+                summary = future.result()
+            except Exception as e:
+                logger.error(f"Partition {customer_range} failed: {e}")
+                total['failed_partitions'].append(list(customer_range))
+                continue
+            for key in ('processed', 'failed', 'chunks'):
+                total[key] += summary[key]
+            total['failed_billing_ids'].extend(summary['failed_billing_ids'])
+            logger.info(f"Partition {customer_range} done: processed={summary['processed']}, failed={summary['failed']}")
+
+    elapsed = time.monotonic() - started
+    total['elapsed_seconds'] = round(elapsed, 3)
+    total['rows_per_second'] = round(total['processed'] / elapsed, 1) if elapsed > 0 else 0
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description='定期請求を並列処理します')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='ワーカープロセス数（既定: CPUコア数）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='1トランザクションで処理する件数')
+    parser.add_argument('--partitions', type=int,
+                        help='customer_idの分割数（既定: ワーカー数×4）')
+    parser.add_argument('--date', help='請求基準日（YYYY-MM-DD、既定: 本日）')
+    args = parser.parse_args()
+
+    today = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+    summary = run_parallel(args.workers, args.chunk_size, args.partitions, today)
+    # redisバックエンド使用時はWebプロセスのキャッシュも無効化される
+    response_cache.invalidate('invoices')
+    logger.info(f"Recurring billing finished: {summary}")
+
+    if summary['failed'] or summary['failed_partitions']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
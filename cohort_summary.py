@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+コホート別月次サマリー（cohort_monthly_summary）の増分更新と再構築
+
+契約開始月（コホート）× 経過月数ごとに、獲得・解約した顧客数とMRR、
+契約変更による拡大／縮小MRRを保持する。顧客の登録・削除や契約変更時に
+同じトランザクション内で該当セルへ差分を加算し、リテンション表は
+この集計行を累積するだけで算出する。
+
+再構築:
+    python cohort_summary.py
+"""
+import logging
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import Integer, cast, func
+from models import db, CohortMonthlySummary, Contract, ContractHistory, Customer
+from upsert import upsert_increment
+import response_cache
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COLUMNS = (
+    'customers_added', 'mrr_added', 'customers_churned', 'mrr_churned',
+    'mrr_expansion', 'mrr_contraction'
+)
+
+def cohort_month(day):
+    """日付の月初日"""
+    return day.replace(day=1)
+
+def months_between(start, end):
+    """start の月から end の月までの経過月数（負になる場合は0）"""
+    return max((end.year - start.year) * 12 + end.month - start.month, 0)
+
+def add_months(month, months):
+    """月初日に月数を加算"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def apply_cell_delta(session, month, offset, **deltas):
+    """コホート月・経過月数のセルに差分を加算（行がなければ作成）"""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    keys = {'cohort_month': month, 'months_since': offset}
+    upsert_increment(session, CohortMonthlySummary.__table__, keys, deltas)
+
+def apply_delta(session, contract_date, event_date, **deltas):
+    """契約開始日・発生日に対応するセルに差分を加算"""
+    if not contract_date:
+        return
+    apply_cell_delta(
+        session, cohort_month(contract_date),
+        months_between(contract_date, event_date or contract_date), **deltas
+    )
+
+def record_customer_added(session, contract_date, mrr, churn_date=None):
+    """顧客の登録をコホートに反映（登録時点で解約日があれば解約も反映）"""
+    apply_delta(session, contract_date, contract_date, customers_added=1, mrr_added=mrr or 0)
+    if churn_date:
+        record_customer_churned(session, contract_date, churn_date, mrr)
+
+def record_customers_added(session, customers):
+    """一括登録した顧客（辞書のリスト）をセルごとにまとめてコホートに反映"""
+    cells = defaultdict(lambda: defaultdict(int))
+    for customer in customers:
+        contract_date = customer.get('contract_date')
+        if not contract_date:
+            continue
+        mrr = customer.get('mrr') or 0
+        added = cells[(cohort_month(contract_date), 0)]
+        added['customers_added'] += 1
+        added['mrr_added'] += mrr
+        churn_date = customer.get('churn_date')
+        if churn_date:
+            churned = cells[(cohort_month(contract_date), months_between(contract_date, churn_date))]
+            churned['customers_churned'] += 1
+            churned['mrr_churned'] += mrr
+    for (month, offset), values in cells.items():
+        apply_cell_delta(session, month, offset, **values)
+
+def record_customer_churned(session, contract_date, churn_date, mrr):
+    """顧客の解約をコホートに反映"""
+    apply_delta(session, contract_date, churn_date, customers_churned=1, mrr_churned=mrr or 0)
+
+def record_mrr_change(session, contract_date, change_date, old_mrr, new_mrr):
+    """契約変更によるMRRの増減をコホートに反映"""
+    delta = (new_mrr or 0) - (old_mrr or 0)
+    if delta > 0:
+        apply_delta(session, contract_date, change_date, mrr_expansion=delta)
+    elif delta < 0:
+        apply_delta(session, contract_date, change_date, mrr_contraction=-delta)
+
+def record_customer_removed(session, customer_id, contract_date, churn_date, mrr):
+    """顧客の削除をコホートから取り消す（契約変更の履歴分も含む）
+
+    顧客と一緒に削除される契約履歴を参照するため、削除前に呼び出す
+    """
+    if not contract_date:
+        return
+    apply_delta(session, contract_date, contract_date, customers_added=-1, mrr_added=-(mrr or 0))
+    if churn_date:
+        apply_delta(session, contract_date, churn_date, customers_churned=-1, mrr_churned=-(mrr or 0))
+
+    changes = session.query(
+        ContractHistory.created_at, ContractHistory.old_values, ContractHistory.new_values
+    ).join(Contract, Contract.id == ContractHistory.contract_id).filter(
+        Contract.customer_id == customer_id,
+        ContractHistory.action == 'modified'
+    ).all()
+    for created_at, old_values, new_values in changes:
+        # 加算時と逆向きの変更として取り消す
+        record_mrr_change(
+            session, contract_date, created_at.date() if created_at else contract_date,
+            (new_values or {}).get('mrr'), (old_values or {}).get('mrr')
+        )
+
+def get_matrix(months, today=None):
+    """直近months か月のコホートについて、経過月ごとの顧客・売上継続率を算出"""
+    current = cohort_month(today or date.today())
+    first = add_months(current, -(months - 1))
+    rows = CohortMonthlySummary.query.filter(
+        CohortMonthlySummary.cohort_month >= first
+    ).order_by(CohortMonthlySummary.cohort_month, CohortMonthlySummary.months_since).all()
+
+    cells = defaultdict(dict)
+    for row in rows:
+        cells[row.cohort_month][row.months_since] = row
+
+    cohorts = []
+    for month, offsets in sorted(cells.items()):
+        size = sum(row.customers_added for row in offsets.values())
+        starting_mrr = sum(row.mrr_added for row in offsets.values())
+        if size <= 0:
+            continue
+
+        retained = size
+        revenue = starting_mrr
+        customer_retention = []
+        revenue_retention = []
+        # 当月（経過0か月）から今月までの各月末時点の継続率
+        for offset in range(months_between(month, current) + 1):
+            row = offsets.get(offset)
+            if row is not None:
+                retained -= row.customers_churned
+                revenue += row.mrr_expansion - row.mrr_contraction - row.mrr_churned
+            customer_retention.append(round(retained / size * 100, 1))
+            revenue_retention.append(round(revenue / starting_mrr * 100, 1) if starting_mrr else None)
+
+        cohorts.append({
+            'cohort': month.strftime('%Y-%m'),
+            'customers': size,
+            'starting_mrr': int(starting_mrr),
+            'customer_retention': customer_retention,
+            'revenue_retention': revenue_retention
+        })
+    return cohorts
+
+def rebuild():
+    """customers / contract_history からコホートサマリーを再構築"""
+    cells = defaultdict(lambda: dict.fromkeys(SUMMARY_COLUMNS, 0))
+
+    def add(contract_date, event_date, **values):
+        key = (cohort_month(contract_date), months_between(contract_date, event_date))
+        for column, value in values.items():
+            cells[key][column] += int(value or 0)
+
+    customers = db.session.query(
+        Customer.contract_date, Customer.churn_date, Customer.mrr
+    ).filter(Customer.contract_date.isnot(None)).yield_per(1000)
+    for contract_date, churn_date, mrr in customers:
+        add(contract_date, contract_date, customers_added=1, mrr_added=mrr)
+        if churn_date:
+            add(contract_date, churn_date, customers_churned=1, mrr_churned=mrr)
+
+    old_mrr = cast(func.json_extract(ContractHistory.old_values, '$.mrr'), Integer)
+    new_mrr = cast(func.json_extract(ContractHistory.new_values, '$.mrr'), Integer)
+    changes = db.session.query(
+        Customer.contract_date, ContractHistory.created_at, new_mrr - old_mrr
+    ).join(Contract, Contract.id == ContractHistory.contract_id).join(
+        Customer, Customer.id == Contract.customer_id
+    ).filter(
+        ContractHistory.action == 'modified',
+        Customer.contract_date.isnot(None)
+    ).yield_per(1000)
+    for contract_date, created_at, delta in changes:
+        if not delta:
+            continue
+        event_date = created_at.date() if created_at else contract_date
+        if delta > 0:
+            add(contract_date, event_date, mrr_expansion=delta)
+        else:
+            add(contract_date, event_date, mrr_contraction=-delta)
+
+    try:
+        CohortMonthlySummary.query.delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(CohortMonthlySummary, [
+            {'cohort_month': month, 'months_since': offset, **values}
+            for (month, offset), values in cells.items()
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Rebuilt cohort_monthly_summary: {len(cells)} cells")
+    return len(cells)
+
+if __name__ == '__main__':
+    from main import create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        count = rebuild()
+    response_cache.invalidate('customers', 'contracts')
+    print(f"✅ {count}件のコホート集計を再構築しました")
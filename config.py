@@ -30,11 +30,9 @@ class Config:
         f"?charset={DB_CHARSET}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 接続プールのサイズ等は main.get_engine_options() の環境別設定
+    # （DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT / DB_POOL_RECYCLE）を使用する
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 3600,
-        'pool_size': 10,
-        'max_overflow': 20,
         'echo': DEBUG
     }
     
@@ -0,0 +1,46 @@
+"""
+日付文字列の解析
+
+画面・CSV・旧データで使われている YYYY-MM-DD / YYYY/MM/DD 形式
+（日時の場合は時刻付き、ISO 8601の T 区切りを含む）を date / datetime に変換する。
+"""
+from datetime import date, datetime
+
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d')
+DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M',
+)
+
+def parse_datetime(value):
+    """日時を datetime に変換（空ならNone、解析できなければ ValueError）"""
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text).replace(tzinfo=None)
+    except ValueError:
+        pass
+    # 秒の小数部・タイムゾーンは無視する
+    text = text.split('.')[0].rstrip('Z')
+    for fmt in DATETIME_FORMATS + DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {value}")
+
+def parse_date(value):
+    """日付を date に変換（空ならNone、解析できなければ ValueError）"""
+    if isinstance(value, datetime):
+        return value.date()
+    if value is None or isinstance(value, date):
+        return value
+    parsed = parse_datetime(value)
+    return parsed.date() if parsed else None
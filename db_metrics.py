@@ -0,0 +1,247 @@
+"""
+DBクエリ・接続プールの計測
+
+SQLAlchemyのイベントフックでクエリ数・DB時間・接続取得待ち時間・低速クエリを
+リクエスト単位（flask.g）とプロセス全体で集計する。
+
+- リクエストごとの値は Server-Timing ヘッダーで返す
+- プロセス全体の値は render_prometheus() でPrometheusのテキスト形式に出力する
+- エンドポイントごとのレイテンシはヒストグラムと直近の標本（p50/p95/p99）で保持する
+
+環境変数:
+    SLOW_QUERY_MS: 低速クエリとして記録するしきい値（ミリ秒、既定200）
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+SLOW_QUERY_HISTORY = 50
+
+# レイテンシヒストグラムの境界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# パーセンタイル算出に使う直近の標本数（エンドポイントごと）
+LATENCY_SAMPLES = 1000
+
+_lock = threading.Lock()
+_requests = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'queries': 0, 'db_seconds': 0.0})
+_statuses = defaultdict(int)
+_latency_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+_latency_samples = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+_pool = {'checkouts': 0, 'wait_seconds': 0.0, 'hold_seconds': 0.0}
+_slow_queries = deque(maxlen=SLOW_QUERY_HISTORY)
+_slow_query_total = 0
+
+class TimedPoolMixin:
+    """接続の取得（空き待ち・新規接続を含む）にかかった時間を記録する"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _record_pool_wait(time.perf_counter() - started)
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+class TimedNullPool(TimedPoolMixin, NullPool):
+    pass
+
+def _request_stats():
+    """リクエスト中であれば flask.g の集計値を返す"""
+    if not has_request_context():
+        return None
+    if 'db_stats' not in g:
+        g.db_stats = {'queries': 0, 'db_seconds': 0.0, 'pool_wait_seconds': 0.0}
+    return g.db_stats
+
+def _record_pool_wait(seconds):
+    with _lock:
+        _pool['wait_seconds'] += seconds
+    stats = _request_stats()
+    if stats is not None:
+        stats['pool_wait_seconds'] += seconds
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    global _slow_query_total
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = _request_stats()
+    if stats is not None:
+        stats['queries'] += 1
+        stats['db_seconds'] += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        endpoint = request.endpoint if has_request_context() else None
+        logger.warning(f"Slow query ({elapsed * 1000:.1f}ms, endpoint={endpoint}): {statement[:500]}")
+        with _lock:
+            _slow_query_total += 1
+            _slow_queries.append({
+                'timestamp': datetime.now().isoformat(),
+                'endpoint': endpoint,
+                'duration_ms': round(elapsed * 1000, 1),
+                'statement': statement[:2000]
+            })
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info['checked_out_at'] = time.perf_counter()
+    with _lock:
+        _pool['checkouts'] += 1
+
+def _on_checkin(dbapi_connection, connection_record):
+    checked_out_at = connection_record.info.pop('checked_out_at', None)
+    if checked_out_at is not None:
+        with _lock:
+            _pool['hold_seconds'] += time.perf_counter() - checked_out_at
+
+def instrument_engine(engine):
+    """エンジンと接続プールにイベントフックを登録"""
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'checkout', _on_checkout)
+    event.listen(engine, 'checkin', _on_checkin)
+
+def _start_request():
+    g.request_started = time.perf_counter()
+
+def _finish_request(response):
+    """リクエストの集計を反映し、Server-Timing ヘッダーを付与"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    stats = _request_stats()
+    endpoint = request.endpoint or 'unknown'
+
+    with _lock:
+        totals = _requests[endpoint]
+        totals['count'] += 1
+        totals['seconds'] += elapsed
+        totals['queries'] += stats['queries']
+        totals['db_seconds'] += stats['db_seconds']
+        _statuses[(endpoint, request.method, response.status_code)] += 1
+        _latency_samples[endpoint].append(elapsed)
+        buckets = _latency_buckets[endpoint]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                buckets[i] += 1
+
+    response.headers.add('Server-Timing', ', '.join([
+        f"db;dur={stats['db_seconds'] * 1000:.1f};desc=\"{stats['queries']} queries\"",
+        f"pool;dur={stats['pool_wait_seconds'] * 1000:.1f}",
+        f"app;dur={elapsed * 1000:.1f}"
+    ]))
+    return response
+
+def init_app(app):
+    """アプリのエンジンとリクエスト処理に計測を組み込む"""
+    from models import db
+
+    with app.app_context():
+        instrument_engine(db.engine)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+def get_slow_queries():
+    """直近の低速クエリ（新しい順）"""
+    with _lock:
+        return list(reversed(_slow_queries))
+
+def _percentile(sorted_values, ratio):
+    index = min(len(sorted_values) - 1, int(round(ratio * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def get_latency_summary():
+    """エンドポイントごとの直近の標本から p50/p95/p99（ミリ秒）を算出"""
+    with _lock:
+        samples = {endpoint: sorted(values) for endpoint, values in _latency_samples.items() if values}
+        counts = {endpoint: values['count'] for endpoint, values in _requests.items()}
+
+    return {
+        endpoint: {
+            'count': counts.get(endpoint, len(values)),
+            'samples': len(values),
+            'p50_ms': round(_percentile(values, 0.50) * 1000, 1),
+            'p95_ms': round(_percentile(values, 0.95) * 1000, 1),
+            'p99_ms': round(_percentile(values, 0.99) * 1000, 1),
+            'max_ms': round(values[-1] * 1000, 1)
+        }
+        for endpoint, values in sorted(samples.items())
+    }
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def render_prometheus(pool_stats=None):
+    """集計値をPrometheusのテキスト形式で出力"""
+    with _lock:
+        requests_snapshot = {name: dict(values) for name, values in _requests.items()}
+        latency_buckets = {name: list(values) for name, values in _latency_buckets.items()}
+        statuses = dict(_statuses)
+        pool = dict(_pool)
+        slow_total = _slow_query_total
+
+    lines = [
+        '# HELP http_requests_total Total HTTP requests.',
+        '# TYPE http_requests_total counter'
+    ]
+    for (endpoint, method, status), count in sorted(statuses.items()):
+        lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {count}')
+
+    lines += [
+        '# HELP http_request_duration_seconds Request latency by endpoint.',
+        '# TYPE http_request_duration_seconds histogram'
+    ]
+    for endpoint, buckets in sorted(latency_buckets.items()):
+        label = _label(endpoint)
+        for bound, count in zip(LATENCY_BUCKETS, buckets):
+            lines.append(f'http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+        totals = requests_snapshot[endpoint]
+        lines.append(f'http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {totals["count"]}')
+        lines.append(f'http_request_duration_seconds_sum{{endpoint="{label}"}} {totals["seconds"]}')
+        lines.append(f'http_request_duration_seconds_count{{endpoint="{label}"}} {totals["count"]}')
+
+    series = [
+        ('db_queries_total', 'counter', 'Total SQL statements executed by requests.', 'queries'),
+        ('db_query_duration_seconds_total', 'counter', 'Total time spent in SQL statements by requests.', 'db_seconds'),
+    ]
+    for name, metric_type, description, key in series:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for endpoint, values in sorted(requests_snapshot.items()):
+            lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {values[key]}')
+
+    lines += [
+        '# HELP db_pool_checkouts_total Total connection checkouts from the pool.',
+        '# TYPE db_pool_checkouts_total counter',
+        f"db_pool_checkouts_total {pool['checkouts']}",
+        '# HELP db_pool_wait_seconds_total Total time spent acquiring connections.',
+        '# TYPE db_pool_wait_seconds_total counter',
+        f"db_pool_wait_seconds_total {pool['wait_seconds']}",
+        '# HELP db_pool_hold_seconds_total Total time connections were checked out.',
+        '# TYPE db_pool_hold_seconds_total counter',
+        f"db_pool_hold_seconds_total {pool['hold_seconds']}",
+        '# HELP db_slow_queries_total SQL statements slower than SLOW_QUERY_MS.',
+        '# TYPE db_slow_queries_total counter',
+        f"db_slow_queries_total {slow_total}"
+    ]
+
+    if pool_stats and 'size' in pool_stats:
+        for key in ('size', 'checked_in', 'checked_out', 'overflow'):
+            lines.append(f'# TYPE db_pool_{key} gauge')
+            lines.append(f'db_pool_{key} {pool_stats[key]}')
+
+    return '\n'.join(lines) + '\n'
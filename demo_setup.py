@@ -123,21 +123,24 @@ def setup_demo_data():
     print(f"URL: {DEMO_URL}")
     print("")
     
-    # 顧客データの投入
+    # 顧客データの投入（一括登録）
     print("顧客データを作成中...")
-    for i, customer in enumerate(DEMO_CUSTOMERS, 1):
-        try:
-            response = requests.post(
-                f"{DEMO_URL}/save",
-                json=customer,
-                headers={"Content-Type": "application/json"}
-            )
-            if response.status_code == 200:
-                print(f"  ✓ {customer['name']} を追加しました")
-            else:
-                print(f"  ✗ {customer['name']} の追加に失敗: {response.text}")
-        except Exception as e:
-            print(f"  ✗ エラー: {e}")
+    try:
+        response = requests.post(
+            f"{DEMO_URL}/customers/bulk",
+            json=DEMO_CUSTOMERS,
+            headers={"Content-Type": "application/json"}
+        )
+        if response.status_code == 200:
+            result = response.json()
+            print(f"  ✓ {result['inserted']}件の顧客を追加しました")
+            for error in result['errors']:
+                customer = DEMO_CUSTOMERS[error['row'] - 1]
+                print(f"  ✗ {customer['name']} の追加に失敗: {error['error']}")
+        else:
+            print(f"  ✗ 顧客データの追加に失敗: {response.text}")
+    except Exception as e:
+        print(f"  ✗ エラー: {e}")
     
     print("")
     print("経費データを作成中...")
@@ -137,7 +137,7 @@ init_database() {
     print_info "データベースの初期化をスキップします（手動で実行してください）"
     print_warning "以下のコマンドをSSH接続後に実行してください："
     echo "cd ~/public_html/cgi-bin"
-    echo "python3 -c \"from main_xserver import Base, engine; Base.metadata.create_all(bind=engine)\""
+    echo "python3 -c \"from main_xserver import init_schema; init_schema()\""
 }
 
 # クリーンアップ
@@ -0,0 +1,132 @@
+"""
+顧客・請求書・支払いデータのストリーミングエクスポート
+
+サーバーサイドカーソルから一定件数ずつ行を読み出し、CSV / NDJSON に
+変換しながらジェネレータで返す。クライアントが gzip を受け付ける場合は
+逐次圧縮するため、行数に関係なくワーカーのメモリ使用量は一定になる。
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from models import db, Customer, Invoice, Payment
+
+export_bp = Blueprint('export', __name__, url_prefix='/export')
+
+EXPORT_CHUNK_SIZE = 1000
+
+# エクスポート対象ごとの (モデル, 出力カラム)
+EXPORT_TARGETS = {
+    'customers': (Customer, [
+        'id', 'company_id', 'name', 'plan', 'mrr', 'initial_fee', 'operation_fee',
+        'assignee', 'hours', 'region', 'industry', 'channel', 'status', 'contract_date',
+        'health_score', 'last_login', 'support_tickets', 'nps_score', 'usage_rate', 'churn_date'
+    ]),
+    'invoices': (Invoice, [
+        'id', 'invoice_number', 'customer_id', 'contract_id', 'issue_date', 'due_date',
+        'amount', 'tax_amount', 'total_amount', 'status', 'payment_method', 'paid_date',
+        'created_at'
+    ]),
+    'payments': (Payment, [
+        'id', 'customer_id', 'invoice_id', 'payment_date', 'amount', 'payment_method',
+        'transaction_id', 'status', 'created_at'
+    ]),
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+def to_plain(value):
+    """Enum / 日付 / Decimal をJSON・CSVに出力できる値に変換"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def iter_rows(model, columns):
+    """サーバーサイドカーソルで行を逐次取得"""
+    query = db.session.query(*[getattr(model, c) for c in columns]).order_by(model.id)
+    return query.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_SIZE)
+
+def iter_csv(rows, columns):
+    """行をCSVのチャンクに変換（Excel用にBOMを付与）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([to_plain(v) for v in row])
+        count += 1
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_ndjson(rows, columns):
+    """行をNDJSONのチャンクに変換"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, (to_plain(v) for v in row))), ensure_ascii=False))
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def gzip_stream(chunks):
+    """文字列チャンクを逐次gzip圧縮"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+@export_bp.route('/<entity>', methods=['GET'])
+def export_data(entity):
+    """データをCSV / NDJSONでストリーミング出力
+
+    クエリパラメータ:
+        format: csv（既定） / ndjson
+    """
+    if entity not in EXPORT_TARGETS:
+        return jsonify({
+            'error': 'Unknown export target',
+            'valid_targets': list(EXPORT_TARGETS)
+        }), 404
+
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'error': 'Invalid format',
+            'valid_formats': list(EXPORT_FORMATS)
+        }), 400
+
+    model, columns = EXPORT_TARGETS[entity]
+    rows = iter_rows(model, columns)
+    chunks = iter_csv(rows, columns) if export_format == 'csv' else iter_ndjson(rows, columns)
+
+    headers = {
+        'Content-Disposition': f"attachment; filename={entity}_{date.today().strftime('%Y%m%d')}.{export_format}"
+    }
+    if 'gzip' in request.accept_encodings:
+        chunks = gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers=headers
+    )
@@ -0,0 +1,75 @@
+"""
+レディネス判定用のDB疎通確認（バックグラウンドで定期実行してキャッシュ）
+
+/readyz は get_status() のキャッシュ済み結果を返すだけで、リクエストごとに
+DBへ問い合わせない。プローブのスレッドはプロセスごとに最初の呼び出し時に
+起動する（プリフォーク環境でもワーカーごとに動作する）。
+
+環境変数:
+    HEALTH_PROBE_INTERVAL: プローブの実行間隔（秒、既定10）
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PROBE_INTERVAL = float(os.environ.get('HEALTH_PROBE_INTERVAL', 10))
+# この回数分の間隔を超えて更新されていない結果は古いとみなす
+STALE_AFTER_INTERVALS = 3
+
+_status = None
+_lock = threading.Lock()
+_thread = None
+
+def probe(engine):
+    """SELECT 1 を実行して結果を記録"""
+    global _status
+    started = time.perf_counter()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        status = {'ready': True, 'error': None}
+    except Exception as e:
+        logger.error(f"Readiness probe failed: {e}")
+        status = {'ready': False, 'error': f"{type(e).__name__}: {e}"}
+    status.update({
+        'checked_at': datetime.now().isoformat(),
+        'checked_monotonic': time.monotonic(),
+        'latency_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+    with _lock:
+        _status = status
+    return status
+
+def _run(engine):
+    while True:
+        time.sleep(PROBE_INTERVAL)
+        probe(engine)
+
+def _ensure_started(engine):
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_run, args=(engine,), name='health-probe', daemon=True)
+        _thread.start()
+
+def get_status(engine):
+    """キャッシュ済みのプローブ結果を取得（初回のみ同期的に実行）"""
+    _ensure_started(engine)
+    with _lock:
+        status = _status
+    if status is None:
+        status = probe(engine)
+
+    result = {k: v for k, v in status.items() if k != 'checked_monotonic'}
+    age = time.monotonic() - status['checked_monotonic']
+    result['age_seconds'] = round(age, 1)
+    if age > PROBE_INTERVAL * STALE_AFTER_INTERVALS:
+        result['ready'] = False
+        result['error'] = 'probe result is stale'
+    return result
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+顧客ヘルススコアの一括再計算
+
+customers を id 順に一定件数ずつ取得し、利用率・NPS・最終ログインからの日数・
+サポート問い合わせ数と、請求書の延滞件数・失敗した支払い件数から
+ヘルススコア（0〜100）を算出する。スコアはチャンク単位でまとめて計算し、
+値が変わった行だけを一括UPDATEしてコミットする。
+解約済みの顧客は対象外。
+
+使い方:
+    python health_score_job.py [--chunk-size 5000] [--date YYYY-MM-DD]
+"""
+import argparse
+import logging
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, func, or_
+from models import db, Customer, Invoice, Payment, InvoiceStatus, PaymentStatus
+import response_cache
+import table_versions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+# 失敗した支払いを数える期間（日）
+FAILED_PAYMENT_DAYS = 90
+
+# 各シグナルの重み（合計1）
+WEIGHTS = {
+    'usage': 0.35,
+    'nps': 0.20,
+    'login': 0.20,
+    'support': 0.10,
+    'payment': 0.15,
+}
+# 最終ログインがこの日数以内なら満点、LOGIN_ZERO_DAYS で0点
+LOGIN_FULL_DAYS = 7
+LOGIN_ZERO_DAYS = 60
+# サポート問い合わせ1件・延滞1件・支払い失敗1件あたりの減点
+SUPPORT_TICKET_PENALTY = 10
+# NPS（0〜10）の上限と、0〜100点に換算する倍率
+NPS_MAX = 10
+NPS_SCALE = 10
+OVERDUE_INVOICE_PENALTY = 35
+FAILED_PAYMENT_PENALTY = 20
+
+def clip(value, low, high):
+    return min(max(value, low), high)
+
+def score_formula(usage, nps, idle_days, tickets, overdue, failed):
+    """各シグナルからスコアを算出"""
+    login = clip((LOGIN_ZERO_DAYS - idle_days) / (LOGIN_ZERO_DAYS - LOGIN_FULL_DAYS), 0, 1) * 100
+    support = clip(100 - tickets * SUPPORT_TICKET_PENALTY, 0, 100)
+    payment = clip(100 - overdue * OVERDUE_INVOICE_PENALTY - failed * FAILED_PAYMENT_PENALTY, 0, 100)
+    score = (
+        clip(usage, 0, 100) * WEIGHTS['usage']
+        + clip(nps, 0, NPS_MAX) * NPS_SCALE * WEIGHTS['nps']
+        + login * WEIGHTS['login']
+        + support * WEIGHTS['support']
+        + payment * WEIGHTS['payment']
+    )
+    return clip(score, 0, 100)
+
+def compute_scores(signals):
+    """シグナルの列（カラム名 → 値のリスト）からスコアのリストを算出"""
+    columns = ('usage', 'nps', 'idle_days', 'tickets', 'overdue', 'failed')
+    return [
+        int(round(score_formula(*values)))
+        for values in zip(*(signals[column] for column in columns))
+    ]
+
+def count_by_customer(query, low, high, column):
+    """id範囲内の顧客ごとの件数"""
+    return dict(query.filter(column.between(low, high)).group_by(column).all())
+
+def fetch_chunk(after_id, chunk_size, today):
+    """after_id より後ろの対象顧客をカラム単位で取得"""
+    return db.session.query(
+        Customer.id, Customer.usage_rate, Customer.nps_score, Customer.support_tickets,
+        Customer.last_login, Customer.health_score
+    ).filter(
+        Customer.id > after_id,
+        or_(Customer.churn_date.is_(None), Customer.churn_date > today)
+    ).order_by(Customer.id).limit(chunk_size).all()
+
+def score_chunk(rows, today):
+    """1チャンク分のスコアを算出し、変化した行の {'id', 'health_score'} を返す"""
+    low, high = rows[0].id, rows[-1].id
+    overdue = count_by_customer(
+        db.session.query(Invoice.customer_id, func.count(Invoice.id)).filter(or_(
+            Invoice.status == InvoiceStatus.OVERDUE,
+            and_(Invoice.status == InvoiceStatus.SENT, Invoice.due_date < today)
+        )),
+        low, high, Invoice.customer_id
+    )
+    failed = count_by_customer(
+        db.session.query(Payment.customer_id, func.count(Payment.id)).filter(
+            Payment.status == PaymentStatus.FAILED,
+            Payment.payment_date >= today - timedelta(days=FAILED_PAYMENT_DAYS)
+        ),
+        low, high, Payment.customer_id
+    )
+
+    signals = {
+        'usage': [row.usage_rate or 0 for row in rows],
+        'nps': [row.nps_score or 0 for row in rows],
+        # ログイン記録がなければ0点になる日数として扱う
+        'idle_days': [
+            (today - row.last_login.date()).days if row.last_login else LOGIN_ZERO_DAYS
+            for row in rows
+        ],
+        'tickets': [row.support_tickets or 0 for row in rows],
+        'overdue': [overdue.get(row.id, 0) for row in rows],
+        'failed': [failed.get(row.id, 0) for row in rows],
+    }
+    return [
+        {'id': row.id, 'health_score': score}
+        for row, score in zip(rows, compute_scores(signals))
+        if score != row.health_score
+    ]
+
+def run(chunk_size=DEFAULT_CHUNK_SIZE, today=None):
+    """全顧客のスコアを再計算し、サマリーを返す"""
+    today = today or date.today()
+    started = time.monotonic()
+    summary = {'scored': 0, 'updated': 0, 'chunks': 0}
+
+    after_id = 0
+    while True:
+        rows = fetch_chunk(after_id, chunk_size, today)
+        if not rows:
+            break
+
+        changes = score_chunk(rows, today)
+        try:
+            if changes:
+                db.session.bulk_update_mappings(Customer, changes)
+                table_versions.bump(db.session, 'customers')
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        summary['scored'] += len(rows)
+        summary['updated'] += len(changes)
+        summary['chunks'] += 1
+        after_id = rows[-1].id
+        logger.info(f"Scored customers up to id={after_id} ({summary['updated']} updated)")
+
+    elapsed = time.monotonic() - started
+    summary['elapsed_seconds'] = round(elapsed, 3)
+    summary['rows_per_second'] = round(summary['scored'] / elapsed, 1) if elapsed > 0 else 0
+    return summary
+
+if __name__ == '__main__':
+    from billing_worker import create_worker_app
+
+    parser = argparse.ArgumentParser(description='顧客ヘルススコアを再計算します')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='1トランザクションで処理する件数')
+    parser.add_argument('--date', help='基準日（YYYY-MM-DD、既定: 本日）')
+    args = parser.parse_args()
+
+    today = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+    app = create_worker_app()
+    with app.app_context():
+        summary = run(args.chunk_size, today)
+    response_cache.invalidate('customers')
+    logger.info(f"Health score recomputation finished: {summary}")
+    print(f"✅ {summary['scored']}件を再計算し、{summary['updated']}件を更新しました（{summary['elapsed_seconds']}秒）")
@@ -224,6 +224,13 @@ function switchTab(targetTabName: string, triggerElement?: HTMLElement) {
 
 
 // --- Dashboard Updates ---
+// Current month's MRR movement computed by the server (null until loaded)
+let currentMRRMovement: {
+    expansion_mrr: number;
+    contraction_mrr: number;
+    churned_mrr: number;
+} | null = null;
+
 function updateDashboard() {
     const activeCustomers = dataStore.customers.filter(c => c.status === 'active');
     const totalMRR = activeCustomers.reduce((sum, c) => sum + c.mrr, 0);
@@ -246,10 +253,10 @@ function updateDashboard() {
         }
     });
 
-    // Simplified expansion/contraction/churn for demo
-    const expansionMRR = Math.round(totalMRR * 0.05); // 5% of MRR as expansion
-    const contractionMRR = -Math.round(totalMRR * 0.01); // 1% as contraction
-    const churnMRR = -Math.round(totalMRR * 0.02); // 2% as churn
+    // Expansion/contraction/churn come from /api/analytics/mrr-movements
+    const expansionMRR = currentMRRMovement ? currentMRRMovement.expansion_mrr : 0;
+    const contractionMRR = currentMRRMovement ? -currentMRRMovement.contraction_mrr : 0;
+    const churnMRR = currentMRRMovement ? -currentMRRMovement.churned_mrr : 0;
     const netMRRChange = newBusinessMRR + expansionMRR + contractionMRR + churnMRR;
 
     (document.getElementById('newBusinessMRR') as HTMLElement).textContent = `¥${newBusinessMRR.toLocaleString()}`;
@@ -316,6 +323,30 @@ function updateTopWins() {
 }
 
 // --- Sales Tab Functions ---
+// Customer ids matched by the server-side /search (null = filter by name locally)
+let customerSearchIds: Set<number> | null = null;
+let customerSearchTimer: number | undefined;
+
+function onCustomerSearchInput() {
+    window.clearTimeout(customerSearchTimer);
+    customerSearchTimer = window.setTimeout(async () => {
+        const query = (document.getElementById('customerSearch') as HTMLInputElement).value.trim();
+        customerSearchIds = null;
+        if (query) {
+            try {
+                const response = await fetch(`${API_URL}/search?type=customers&limit=100&q=${encodeURIComponent(query)}`);
+                if (response.ok) {
+                    const data = await response.json();
+                    customerSearchIds = new Set((data.customers || []).map((customer: { id: number }) => customer.id));
+                }
+            } catch (error) {
+                console.error('Customer search failed:', error);
+            }
+        }
+        renderCustomersTable();
+    }, 300);
+}
+
 function renderCustomersTable() {
     const tbody = document.getElementById('customerTableBody') as HTMLTableSectionElement;
     const searchTerm = (document.getElementById('customerSearch') as HTMLInputElement).value.toLowerCase();
@@ -323,7 +354,7 @@ function renderCustomersTable() {
     const planFilter = (document.getElementById('planFilterSales') as HTMLSelectElement).value;
 
     const filteredCustomers = dataStore.customers.filter(customer => {
-        const nameMatch = customer.name.toLowerCase().includes(searchTerm);
+        const nameMatch = customerSearchIds ? customerSearchIds.has(customer.id) : customer.name.toLowerCase().includes(searchTerm);
         const statusMatch = !statusFilter || customer.status === statusFilter;
         const planMatch = !planFilter || customer.plan === planFilter;
         return nameMatch && statusMatch && planMatch;
@@ -550,63 +581,37 @@ function showImportModal() {
     }
 }
 
-function handleFileUpload(event: Event) {
+async function handleFileUpload(event: Event) {
     const file = (event.target as HTMLInputElement).files?.[0];
-    if (file && file.type === 'text/csv') {
-        const reader = new FileReader();
-        reader.onload = (e) => {
-            const text = e.target?.result as string;
-            const lines = text.split('\n').map(line => line.trim()).filter(line => line); // Trim and remove empty lines
-            
-            if (lines.length <= 1) { // Only header or empty file
-                showNotification('CSVファイルにデータがありません。', 'error');
-                return;
-            }
+    if (!file || file.type !== 'text/csv') {
+        showNotification('CSVファイルを選択してください', 'error');
+        return;
+    }
 
-            let importedCount = 0;
-            for (let i = 1; i < lines.length; i++) { 
-                const values = lines[i].split(',');
-                if (values.length < 12) {
-                    console.warn(`Skipping row ${i+1} due to insufficient columns: ${lines[i]}`);
-                    continue; 
-                }
+    // CSVはブラウザで解析せず、ファイルのままサーバーの一括登録APIに送る
+    try {
+        const response = await fetch(`${API_URL}/customers/bulk`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'text/csv' },
+            body: file
+        });
+        const result = await response.json();
+        if (!response.ok) {
+            showNotification(`インポートに失敗しました: ${result.details || result.error}`, 'error');
+            return;
+        }
 
-                const newCustomer: Customer = {
-                    id: getNextCustomerId(),
-                    name: values[0]?.trim() || '',
-                    plan: values[1]?.trim() || 'starter',
-                    mrr: parseInt(values[2]?.trim()) || 0,
-                    initialFee: parseInt(values[3]?.trim()) || 0,
-                    operationFee: parseInt(values[4]?.trim()) || 0,
-                    assignee: values[5]?.trim() || '',
-                    hours: parseInt(values[6]?.trim()) || 0,
-                    region: values[7]?.trim() || '',
-                    industry: values[8]?.trim() || '',
-                    channel: values[9]?.trim() || '',
-                    status: values[10]?.trim() || 'trial',
-                    startDate: values[11]?.trim() || new Date().toLocaleDateString('ja-JP').replace(/-/g, '/'),
-                    healthScore: 70, lastLogin: new Date().toLocaleDateString('ja-JP').replace(/-/g, '/'),
-                    supportTickets: 0, npsScore: 7, usageRate: 50
-                };
-                if (newCustomer.name) { 
-                   dataStore.customers.push(newCustomer);
-                   importedCount++;
-                } else {
-                    console.warn(`Skipping row ${i+1} due to missing name: ${lines[i]}`);
-                }
-            }
-            closeModal('importModal');
-            renderCustomersTable();
-            updateDashboard();
-            updateFinanceMetrics(); 
-            showNotification(`${importedCount}件のデータをインポートしました`, 'success');
-        };
-        reader.onerror = () => {
-            showNotification('ファイル読み込みエラー', 'error');
-        };
-        reader.readAsText(file, 'UTF-8'); 
-    } else {
-        showNotification('CSVファイルを選択してください', 'error');
+        result.errors?.forEach((error: { row: number; error: string }) => {
+            console.warn(`Skipping row ${error.row + 1}: ${error.error}`);
+        });
+        closeModal('importModal');
+        // 登録結果はサーバーから読み直して表示する
+        await loadCustomersFromDatabase();
+        const failedMessage = result.failed ? `（${result.failed}件はエラーのためスキップ）` : '';
+        showNotification(`${result.inserted}件のデータをインポートしました${failedMessage}`, 'success');
+    } catch (error) {
+        console.error('Failed to import customers:', error);
+        showNotification('ファイルのアップロードに失敗しました', 'error');
     }
 }
 
@@ -1281,7 +1286,7 @@ function initializeFinanceCharts() {
     }
 }
 
-function updateMonthlyBalanceChart() {
+async function updateMonthlyBalanceChart() {
     if (!charts.monthlyBalance) initializeFinanceCharts();
     if (!charts.monthlyBalance) return; 
 
@@ -1290,35 +1295,34 @@ function updateMonthlyBalanceChart() {
     const expenseData: number[] = [];
     const balanceData: number[] = [];
     const now = new Date();
+    const from = new Date(now.getFullYear(), now.getMonth() - 5, 1);
+    const fromParam = `${from.getFullYear()}-${String(from.getMonth() + 1).padStart(2, '0')}-01`;
 
-    for (let i = 5; i >= 0; i--) { 
-        const d = new Date(now.getFullYear(), now.getMonth() - i, 1);
-        labels.push(`${d.getFullYear()}/${d.getMonth() + 1}月`);
-        let monthlyInitialFees = 0, monthlyOperationFees = 0, monthlyMRR = 0;
-        dataStore.customers.forEach(customer => {
-            const startDate = new Date(customer.startDate.replace(/\//g, '-'));
-            if (startDate.getMonth() === d.getMonth() && startDate.getFullYear() === d.getFullYear()) {
-                monthlyInitialFees += customer.initialFee;
-            }
-            const isActiveInSelectedMonth = (customer.status === 'active' || 
-                (customer.status === 'churned' && customer.churnDate && new Date(customer.churnDate.replace(/\//g, '-')) > new Date(d.getFullYear(), d.getMonth(), 1))) &&
-                startDate <= new Date(d.getFullYear(), d.getMonth() + 1, 0);
-            if (isActiveInSelectedMonth) {
-                monthlyMRR += customer.mrr;
-                monthlyOperationFees += customer.operationFee;
-            }
-        });
-        const totalIncomeForMonth = monthlyMRR + monthlyInitialFees + monthlyOperationFees;
+    // Monthly income (active MRR + operation fees + new initial fees) is aggregated by the server
+    let periods: { start: string; active_mrr: number; operation_fees: number; initial_fees: number }[] = [];
+    try {
+        const response = await fetch(`${API_URL}/api/analytics/revenue-series?granularity=month&from=${fromParam}`);
+        if (response.ok) {
+            periods = (await response.json()).periods || [];
+        }
+    } catch (error) {
+        console.error('Failed to load revenue series:', error);
+    }
+
+    periods.forEach(period => {
+        const [year, month] = period.start.split('-').map(Number);
+        labels.push(`${year}/${month}月`);
+        const totalIncomeForMonth = period.active_mrr + period.initial_fees + period.operation_fees;
         const expensesForMonth = dataStore.expenses.filter(exp => {
             const expDate = new Date(exp.date.replace(/\//g, '-'));
-            return expDate.getMonth() === d.getMonth() && expDate.getFullYear() === d.getFullYear() && exp.status === 'approved';
+            return expDate.getMonth() === month - 1 && expDate.getFullYear() === year && exp.status === 'approved';
         });
         const totalExpenseForMonth = expensesForMonth.reduce((sum, exp) => sum + exp.amount, 0);
 
         incomeData.push(totalIncomeForMonth);
         expenseData.push(totalExpenseForMonth);
         balanceData.push(totalIncomeForMonth - totalExpenseForMonth);
-    }
+    });
     charts.monthlyBalance.data.labels = labels;
     charts.monthlyBalance.data.datasets[0].data = incomeData;
     charts.monthlyBalance.data.datasets[1].data = expenseData;
@@ -1361,41 +1365,49 @@ function initializeSubscriptionCharts() {
     }
 }
 
-function updateCohortChart() { 
+async function updateCohortChart() { 
     if(!charts.cohortChart) initializeSubscriptionCharts();
     if(!charts.cohortChart) return;
-    charts.cohortChart.data.datasets[0].data = [100, 95, 92, 90, 88, 87];
-    charts.cohortChart.data.datasets[1].data = [100, 96, 93, 91, 90]; 
-    charts.cohortChart.update();
+    try {
+        const response = await fetch(`${API_URL}/api/analytics/cohorts?months=6`);
+        if (!response.ok) return;
+        const data = await response.json();
+        // Show the two oldest cohorts in the window (they have the longest curves)
+        const cohorts = (data.cohorts || []).slice(0, charts.cohortChart.data.datasets.length);
+        cohorts.forEach((cohort: any, i: number) => {
+            const [year, month] = cohort.cohort.split('-');
+            charts.cohortChart.data.datasets[i].label = `${year}年${Number(month)}月コホート`;
+            charts.cohortChart.data.datasets[i].data = cohort.customer_retention;
+        });
+        charts.cohortChart.update();
+    } catch (error) {
+        console.error('Failed to load cohorts:', error);
+    }
 }
-function updateMRRForecastChart() { 
+async function updateMRRForecastChart() { 
     if(!charts.mrrForecastChart) initializeSubscriptionCharts();
     if(!charts.mrrForecastChart) return;
 
-    const labels = ['1月', '2月', '3月', '4月', '5月', '6月', '7月', '8月', '9月', '10月', '11月', '12月'];
-    const actualMRR = [80000, 90000, 115000, 140000, 215000]; 
-    const forecastMRR : (number | null)[] = actualMRR.map(val => val as number | null); 
-
-    const actualMRRForChart = [...actualMRR];
-    for(let i=actualMRRForChart.length; i<labels.length; i++) {
-        (actualMRRForChart as (number|null)[]).push(null);
-    }
-    
-    let lastActual = forecastMRR[forecastMRR.length-1] || 215000;
-
-    for(let i = actualMRR.length; i<labels.length; i++) {
-        lastActual = lastActual * (1 + (0.02 + Math.random()*0.03)); 
-        forecastMRR.push(Math.round(lastActual));
-    }
-    if (forecastMRR.length > actualMRR.length && actualMRR.length > 0) {
-       forecastMRR[actualMRR.length -1] = actualMRR[actualMRR.length-1];
+    try {
+        const response = await fetch(`${API_URL}/api/analytics/mrr-forecast?horizon=6`);
+        if (!response.ok) return;
+        const data = await response.json();
+        const history: { month: string; mrr: number }[] = (data.history || []).slice(-6);
+        const forecast: { month: string; trend_mrr: number; cohort_mrr: number }[] = data.forecast || [];
+
+        const labels = [...history, ...forecast].map(point => `${Number(point.month.split('-')[1])}月`);
+        const actualMRRForChart: (number | null)[] = [...history.map(point => point.mrr), ...forecast.map(() => null)];
+        // The forecast line starts from the last actual value so the two lines connect
+        const forecastMRR: (number | null)[] = history.map((point, i) => i === history.length - 1 ? point.mrr : null);
+        forecast.forEach(point => forecastMRR.push(point.cohort_mrr));
+
+        charts.mrrForecastChart.data.labels = labels;
+        charts.mrrForecastChart.data.datasets[0].data = actualMRRForChart;
+        charts.mrrForecastChart.data.datasets[1].data = forecastMRR;
+        charts.mrrForecastChart.update();
+    } catch (error) {
+        console.error('Failed to load MRR forecast:', error);
     }
-
-
-    charts.mrrForecastChart.data.labels = labels;
-    charts.mrrForecastChart.data.datasets[0].data = actualMRRForChart;
-    charts.mrrForecastChart.data.datasets[1].data = forecastMRR;
-    charts.mrrForecastChart.update();
 }
 
 
@@ -1455,7 +1467,7 @@ function setupEventListeners() {
     });
     
     // Sales Tab Filters
-    document.getElementById('customerSearch')?.addEventListener('input', renderCustomersTable);
+    document.getElementById('customerSearch')?.addEventListener('input', onCustomerSearchInput);
     document.getElementById('statusFilter')?.addEventListener('change', renderCustomersTable);
     document.getElementById('planFilterSales')?.addEventListener('change', renderCustomersTable);
 
@@ -1646,12 +1658,29 @@ async function loadCustomersFromDatabase() {
     }
 }
 
+// Function to load this month's MRR movement from the analytics API
+async function loadMRRMovements() {
+    try {
+        const response = await fetch(`${API_URL}/api/analytics/mrr-movements?months=1`);
+        if (response.ok) {
+            const data = await response.json();
+            if (data.months && data.months.length > 0) {
+                currentMRRMovement = data.months[data.months.length - 1];
+                updateDashboard();
+            }
+        }
+    } catch (error) {
+        console.error('Failed to load MRR movements:', error);
+    }
+}
+
 window.addEventListener('DOMContentLoaded', async () => {
     initializeSampleData();
     setupEventListeners();
     
     // Load customers from database
     await loadCustomersFromDatabase();
+    await loadMRRMovements();
     
     const initialTab = document.querySelector('.nav-tab.active')?.getAttribute('data-tab-target') || 'home';
     switchTab(initialTab);
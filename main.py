@@ -1,15 +1,36 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-from sqlalchemy import create_engine, Column, Integer, String, text
+from sqlalchemy import inspect, Column, Date, DateTime, Integer, String, text, func
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
 import os
+import hmac
 import socket
 import logging
 import traceback
-from datetime import datetime
+import json
+import csv
+import io
+from datetime import date, datetime
 from models import db, Company, CompanyStatus, CompanyType
+from models import Customer as CustomerModel
 from api_extensions import api_bp
+from exports import export_bp
+from analytics import analytics_bp
+from search import search_bp
+import response_cache
+import db_metrics
+import request_profiler
+import health_probe
+import table_versions
+import billing_summary
+import cohort_summary
+import search
+import revenue_series
+from response_cache import cached_response
+from table_versions import conditional_get
+from db_metrics import TimedNullPool, TimedQueuePool
+from date_utils import parse_date
 
 # ロギング設定（より詳細なフォーマット）
 logging.basicConfig(
@@ -18,11 +39,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, static_folder='dist')
-CORS(app)  # Enable CORS for all routes
-
-# Flask-SQLAlchemy設定
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 画面・旧方式APIのルート（create_app で登録する）
+main_bp = Blueprint('main', __name__)
 
 # Google Cloud SQL設定
 def get_database_uri():
@@ -59,45 +77,70 @@ def get_database_uri():
     
     return database_uri
 
-# データベース接続設定
-DATABASE_URI = get_database_uri()
-logger.info(f"DATABASE_URI configured for environment: {os.environ.get('GAE_ENV', 'local')}")
+# 環境ごとの接続プール既定値
+# DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT / DB_POOL_RECYCLE で上書きできる
+POOL_DEFAULTS = {
+    # 常駐FastCGIプロセス内で再利用（MySQLのwait_timeoutより短い間隔でリサイクル）
+    'xserver': {'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10, 'pool_recycle': 280},
+    'local': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30, 'pool_recycle': 3600},
+}
 
-# Flask-SQLAlchemyにデータベースURIを設定
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+def get_environment():
+    """実行環境を判定（appengine / xserver / local）"""
+    if os.environ.get('GAE_ENV') == 'standard':
+        return 'appengine'
+    if os.environ.get('ENVIRONMENT') == 'xserver':
+        return 'xserver'
+    return 'local'
 
-# データベースを初期化
-db.init_app(app)
+def get_engine_options():
+    """環境に応じたエンジン（接続プール）設定を取得"""
+    # 接続取得の待ち時間を計測するプールを使用
+    options = {'pool_pre_ping': True, 'poolclass': TimedQueuePool}
+    environment = get_environment()
+    if environment == 'appengine':
+        # App Engine環境では接続プールを無効化
+        options['poolclass'] = TimedNullPool
+        return options
+    
+    for key, default in POOL_DEFAULTS[environment].items():
+        options[key] = int(os.environ.get(f"DB_{key.upper()}", default))
+    return options
 
-# APIブループリントを登録
-app.register_blueprint(api_bp)
+Base = declarative_base()
 
-# エンジン作成（App Engine用の設定）
-engine_config = {
-    'pool_pre_ping': True,
-    'pool_recycle': 3600,  # 1時間でコネクションをリサイクル
-    'echo': False,  # SQLクエリをログに出力（デバッグ用）
-}
+def new_session():
+    """旧方式ルート用のセッションを作成
 
-# App Engine環境では接続プールを無効化
-if os.environ.get('GAE_ENV') == 'standard':
-    engine_config['poolclass'] = NullPool
-    logger.info("Using NullPool for App Engine Standard environment")
-
-try:
-    engine = create_engine(DATABASE_URI, **engine_config)
-    # 接続テスト
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-    SessionLocal = sessionmaker(bind=engine)
-    Base = declarative_base()
-    logger.info("Database engine created and tested successfully")
-except Exception as e:
-    logger.error(f"Database connection error: {e}")
-    logger.error(f"Stack trace: {traceback.format_exc()}")
-    engine = None
-    SessionLocal = None
-    Base = declarative_base()
+    セッションファクトリは create_app でアプリごとに作成し（app.extensions）、
+    Flask-SQLAlchemy と同じエンジン（接続プール）を使用する。
+    """
+    return current_app.extensions['legacy_session']()
+
+def get_engine():
+    """Flask-SQLAlchemy と共有しているエンジンを取得（利用できない場合はNone）"""
+    try:
+        return db.engine
+    except Exception as e:
+        logger.error(f"Database engine unavailable: {e}")
+        return None
+
+def get_pool_stats(engine):
+    """接続プールの利用状況を取得"""
+    pool = engine.pool
+    stats = {
+        'pool_class': type(pool).__name__,
+        'status': pool.status()
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'timeout': pool.timeout()
+        })
+    return stats
 
 # テーブル定義
 class Customer(Base):
@@ -114,48 +157,47 @@ class Customer(Base):
     industry = Column(String(255))
     channel = Column(String(255))
     status = Column(String(255), default='active')
-    contract_date = Column(String(255))
+    contract_date = Column(Date)
     health_score = Column(Integer, default=70)
-    last_login = Column(String(255))
+    last_login = Column(DateTime)
     support_tickets = Column(Integer, default=0)
     nps_score = Column(Integer, default=7)
     usage_rate = Column(Integer, default=50)
-    churn_date = Column(String(255))
+    churn_date = Column(Date)
 
-# テーブル作成
-if engine:
-    try:
+# テーブル作成・確認（python main.py migrate で明示的に実行する）
+def init_schema(app):
+    """テーブルを作成し、主要テーブルの存在を確認"""
+    with app.app_context():
+        engine = get_engine()
+        if engine is None:
+            raise RuntimeError("Database engine is not available")
+        
         # Flask-SQLAlchemyのテーブル作成
-        with app.app_context():
-            db.create_all()
+        db.create_all()
         
         # 旧方式のテーブルも作成（Customer用）
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created/verified successfully")
         
+        # 売上推移の集計用カレンダー（APIでは参照のみ）
+        revenue_series.seed_calendar()
+        
         # テーブル確認
-        with engine.connect() as conn:
-            result = conn.execute(text("SHOW TABLES LIKE 'customers'"))
-            if result.fetchone():
-                logger.info("Customers table exists")
-            else:
-                logger.warning("Customers table was not created")
-                
-            result = conn.execute(text("SHOW TABLES LIKE 'companies'"))
-            if result.fetchone():
-                logger.info("Companies table exists")
-            else:
-                logger.warning("Companies table was not created")
-    except Exception as e:
-        logger.error(f"Error creating tables: {e}")
-        logger.error(f"Stack trace: {traceback.format_exc()}")
+        tables = inspect(engine).get_table_names()
+    for table in ('customers', 'companies'):
+        if table in tables:
+            logger.info(f"{table.capitalize()} table exists")
+        else:
+            logger.warning(f"{table.capitalize()} table was not created")
+    return tables
 
 # ========== APIエンドポイント ==========
 
 # データベース接続チェック用デコレータ
 def require_database(f):
     def decorated_function(*args, **kwargs):
-        if not SessionLocal or not engine:
+        if get_engine() is None:
             error_details = {
                 "error": "Database connection not available",
                 "details": "The application could not connect to the database",
@@ -168,10 +210,54 @@ def require_database(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
-# ヘルスチェックエンドポイント
-@app.route('/health', methods=['GET'])
+# 診断用エンドポイントの認証デコレータ（DIAGNOSTICS_TOKEN 未設定時は無効）
+def require_diagnostics_token(f):
+    def decorated_function(*args, **kwargs):
+        expected = os.environ.get('DIAGNOSTICS_TOKEN', '')
+        auth_header = request.headers.get('Authorization', '')
+        token = auth_header[len('Bearer '):] if auth_header.startswith('Bearer ') else request.headers.get('X-Diagnostics-Token', '')
+        if not expected or not hmac.compare_digest(token, expected):
+            return jsonify({"error": "Not found"}), 404
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+# 死活監視エンドポイント（DBに接続しない）
+@main_bp.route('/livez', methods=['GET'])
+def liveness_check():
+    """プロセスが応答できるかのみを返す"""
+    return jsonify({
+        "status": "alive",
+        "timestamp": datetime.now().isoformat()
+    }), 200
+
+# レディネスエンドポイント（バックグラウンドのDBプローブ結果を返す）
+# /api/health は旧Xserver版（index_xserver.tsx）との互換用
+@main_bp.route('/readyz', methods=['GET'])
+@main_bp.route('/health', methods=['GET'])
+@main_bp.route('/api/health', methods=['GET'])
+def readiness_check():
+    """キャッシュ済みのDB疎通確認の結果からリクエストを受け付けられるかを返す"""
+    engine = get_engine()
+    if engine is None:
+        return jsonify({
+            "status": "not ready",
+            "database": "not configured",
+            "database_error": "Engine not initialized"
+        }), 503
+    
+    probe = health_probe.get_status(engine)
+    return jsonify({
+        "status": "ready" if probe['ready'] else "not ready",
+        "database": "connected" if probe['ready'] else "disconnected",
+        "probe": probe
+    }), 200 if probe['ready'] else 503
+
+# 詳細ヘルスチェックエンドポイント（認証が必要）
+@main_bp.route('/health/deep', methods=['GET'])
+@require_diagnostics_token
 def health_check():
-    """アプリケーションとデータベースの健全性をチェック"""
+    """アプリケーションとデータベースの健全性を詳細にチェック"""
     health_info = {
         "status": "running",
         "timestamp": datetime.now().isoformat(),
@@ -185,6 +271,7 @@ def health_check():
         }
     }
     
+    engine = get_engine()
     if engine:
         try:
             with engine.connect() as conn:
@@ -219,7 +306,47 @@ def health_check():
     return jsonify(health_info), status_code
 
 # 顧客データ保存エンドポイント
-@app.route('/save', methods=['POST'])
+def parse_customer_payload(data):
+    """リクエストの顧客データ（複数のフィールド名に対応）をカラム値に変換
+
+    戻り値: (カラム値の辞書, 不足している必須フィールドのリスト)
+    数値に変換できない値がある場合は ValueError を送出する
+    """
+    missing_fields = []
+    
+    # フィールド名の柔軟な対応
+    name = data.get("newCustomerName") or data.get("name")
+    plan = data.get("newCustomerPlan") or data.get("plan")
+    mrr = data.get("newCustomerMrr") or data.get("mrr")
+    
+    if not name:
+        missing_fields.append('name')
+    if not plan:
+        missing_fields.append('plan')
+    if mrr is None:
+        missing_fields.append('mrr')
+        
+    if missing_fields:
+        return None, missing_fields
+    
+    values = dict(
+        name=name,
+        plan=plan,
+        mrr=int(mrr or 0),
+        initial_fee=int(data.get("newCustomerInitialFee", 0) or data.get("initialFee", 0) or data.get("initial_fee", 0)),
+        operation_fee=int(data.get("newCustomerOperationFee", 0) or data.get("operationFee", 0) or data.get("operation_fee", 0)),
+        assignee=data.get("newCustomerAssignee") or data.get("assignee"),
+        hours=int(data.get("newCustomerHours", 0) or data.get("hours", 0)),
+        region=data.get("newCustomerRegion") or data.get("region"),
+        industry=data.get("newCustomerIndustry") or data.get("industry"),
+        channel=data.get("newCustomerChannel") or data.get("channel"),
+        status=data.get("newCustomerStatus", "active") or data.get("status", "active"),
+        contract_date=parse_date(data.get("newCustomerContractDate") or data.get("contract_date") or data.get("startDate")) or date.today()
+    )
+    return values, []
+
+@main_bp.route('/save', methods=['POST'])
+@main_bp.route('/api/save', methods=['POST'])
 @require_database
 def save_data():
     """新規顧客データを保存"""
@@ -230,24 +357,10 @@ def save_data():
             
         logger.info(f"Received save request with data keys: {list(data.keys())}")
         
-        session = SessionLocal()
+        session = new_session()
         try:
-            # 必須フィールドのチェック
-            required_fields = ['name', 'plan', 'mrr']
-            missing_fields = []
+            values, missing_fields = parse_customer_payload(data)
             
-            # フィールド名の柔軟な対応
-            name = data.get("newCustomerName") or data.get("name")
-            plan = data.get("newCustomerPlan") or data.get("plan")
-            mrr = data.get("newCustomerMrr") or data.get("mrr")
-            
-            if not name:
-                missing_fields.append('name')
-            if not plan:
-                missing_fields.append('plan')
-            if mrr is None:
-                missing_fields.append('mrr')
-                
             if missing_fields:
                 return jsonify({
                     "error": "Missing required fields",
@@ -255,23 +368,16 @@ def save_data():
                 }), 400
             
             # 顧客データ作成
-            customer = Customer(
-                name=name,
-                plan=plan,
-                mrr=int(mrr or 0),
-                initial_fee=int(data.get("newCustomerInitialFee", 0) or data.get("initialFee", 0) or data.get("initial_fee", 0)),
-                operation_fee=int(data.get("newCustomerOperationFee", 0) or data.get("operationFee", 0) or data.get("operation_fee", 0)),
-                assignee=data.get("newCustomerAssignee") or data.get("assignee"),
-                hours=int(data.get("newCustomerHours", 0) or data.get("hours", 0)),
-                region=data.get("newCustomerRegion") or data.get("region"),
-                industry=data.get("newCustomerIndustry") or data.get("industry"),
-                channel=data.get("newCustomerChannel") or data.get("channel"),
-                status=data.get("newCustomerStatus", "active") or data.get("status", "active"),
-                contract_date=data.get("newCustomerContractDate") or data.get("contract_date") or data.get("startDate") or datetime.now().strftime('%Y-%m-%d')
-            )
+            customer = Customer(**values)
             
             session.add(customer)
+            session.flush()
+            cohort_summary.record_customer_added(session, customer.contract_date, customer.mrr)
+            search.index_customers(session, [customer])
+            revenue_series.record_customer_dates(session, customer.contract_date)
+            table_versions.bump(session, 'customers')
             session.commit()
+            response_cache.invalidate('customers')
             
             logger.info(f"Customer saved successfully: ID={customer.id}, Name={customer.name}, Plan={customer.plan}, MRR={customer.mrr}")
             
@@ -303,39 +409,326 @@ def save_data():
             "type": type(e).__name__
         }), 500
 
+# 顧客一括登録エンドポイント
+BULK_INSERT_BATCH_SIZE = 1000
+BULK_MAX_REPORTED_ERRORS = 1000
+# JSON配列を読み込む単位と、1レコードあたりの最大文字数
+BULK_JSON_READ_SIZE = 64 * 1024
+BULK_MAX_RECORD_CHARS = 1024 * 1024
+
+# エクスポートCSV（index.tsx の exportCustomers）の日本語ヘッダーとの対応
+CSV_HEADER_ALIASES = {
+    '会社名': 'name',
+    'プラン': 'plan',
+    '月額料金': 'mrr',
+    '初期費用': 'initial_fee',
+    '運用代行費': 'operation_fee',
+    '担当者': 'assignee',
+    '工数': 'hours',
+    '地域': 'region',
+    '業界': 'industry',
+    '獲得チャネル': 'channel',
+    'ステータス': 'status',
+    '契約開始日': 'contract_date',
+}
+
+def iter_json_array(stream):
+    """JSON配列の要素をストリームから1件ずつ取り出す（配列全体をメモリに読み込まない）"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = stream.read(BULK_JSON_READ_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def next_char():
+        """空白を読み飛ばした次の文字（終端ならNone）"""
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if eof:
+                return None
+            fill()
+
+    if next_char() != '[':
+        raise ValueError("Request body must be a JSON array of customers")
+    position += 1
+    if next_char() == ']':
+        position += 1
+    else:
+        while True:
+            next_char()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    if len(buffer) - position > BULK_MAX_RECORD_CHARS:
+                        raise ValueError(f"Record is too large (max {BULK_MAX_RECORD_CHARS} characters)")
+                    fill()
+                    continue
+                if end == len(buffer) and not eof:
+                    # 数値などが読み込み単位の境目で切れている可能性があるため続きを読む
+                    fill()
+                    continue
+                break
+            position = end
+            yield value
+
+            separator = next_char()
+            position += 1
+            if separator == ']':
+                break
+            if separator != ',':
+                raise ValueError("Invalid JSON array: expected ',' or ']'")
+    if next_char() is not None:
+        raise ValueError("Invalid JSON array: unexpected data after the array")
+
+def iter_bulk_records():
+    """リクエストボディから顧客レコードを1件ずつ取り出す
+
+    text/csv・application/x-ndjson・JSON配列のいずれもストリームから逐次読み込む
+    """
+    content_type = request.mimetype
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig')
+    if content_type in ('text/csv', 'application/x-ndjson'):
+        if content_type == 'text/csv':
+            for row in csv.DictReader(stream):
+                yield {
+                    CSV_HEADER_ALIASES.get(key.strip(), key.strip()): value.strip()
+                    for key, value in row.items()
+                    if key and value not in (None, '')
+                }
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    yield from iter_json_array(stream)
+
+@main_bp.route('/customers/bulk', methods=['POST'])
+@require_database
+def bulk_import_customers():
+    """顧客データを一括登録（JSON配列 / CSV / NDJSON）
+
+    行ごとに検証し、正常な行はバッチ単位でまとめてINSERTする。
+    不正な行は登録せず、行番号とエラー内容を返す。
+    """
+    session = new_session()
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+
+    def report_error(row_number, error, **details):
+        nonlocal failed
+        failed += 1
+        if len(errors) < BULK_MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "error": error, **details})
+
+    def flush():
+        nonlocal inserted
+        if not batch:
+            return
+        # 採番されたidをINSERTの結果から各行（batchの辞書）に受け取る
+        session.bulk_insert_mappings(Customer, batch, return_defaults=True)
+        cohort_summary.record_customers_added(session, batch)
+        revenue_series.record_customer_dates(session, *(row['contract_date'] for row in batch))
+        search.index_customers(session, batch)
+        table_versions.bump(session, 'customers')
+        session.commit()
+        inserted += len(batch)
+        batch.clear()
+
+    try:
+        for row_number, record in enumerate(iter_bulk_records(), 1):
+            if not isinstance(record, dict):
+                report_error(row_number, "Record must be an object")
+                continue
+            try:
+                values, missing_fields = parse_customer_payload(record)
+            except (TypeError, ValueError) as e:
+                report_error(row_number, "Invalid value", details=str(e))
+                continue
+            if missing_fields:
+                report_error(row_number, "Missing required fields", missing_fields=missing_fields)
+                continue
+
+            batch.append(values)
+            if len(batch) >= BULK_INSERT_BATCH_SIZE:
+                flush()
+        flush()
+
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        session.rollback()
+        logger.error(f"Invalid bulk import payload: {e}")
+        return jsonify({
+            "error": "Invalid payload",
+            "details": str(e),
+            "inserted": inserted
+        }), 400
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error in bulk import: {e}")
+        logger.error(f"Stack trace: {traceback.format_exc()}")
+        return jsonify({
+            "error": "Failed to import customers",
+            "details": str(e),
+            "type": type(e).__name__,
+            "inserted": inserted
+        }), 500
+    finally:
+        session.close()
+        if inserted:
+            response_cache.invalidate('customers')
+
+    logger.info(f"Bulk import finished: inserted={inserted}, failed={failed}")
+    return jsonify({
+        "message": "一括登録完了",
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors)
+    }), 200
+
 # 顧客データ取得エンドポイント
-@app.route('/customers', methods=['GET'])
+# レスポンスに含めるフィールドと、NULL時のデフォルト値
+CUSTOMER_FIELD_DEFAULTS = {
+    "id": None,
+    "name": None,
+    "plan": None,
+    "mrr": None,
+    "initial_fee": 0,
+    "operation_fee": 0,
+    "assignee": None,
+    "hours": 0,
+    "region": None,
+    "industry": None,
+    "channel": None,
+    "status": 'active',
+    "contract_date": None,
+    "health_score": 70,
+    "last_login": None,
+    "support_tickets": 0,
+    "nps_score": 7,
+    "usage_rate": 50,
+    "churn_date": None,
+}
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 1000
+CUSTOMER_STREAM_CHUNK_SIZE = 1000
+
+def parse_customer_fields(fields_param):
+    """?fields= を検証してカラム名のリストを返す（idは常に含める）"""
+    if not fields_param:
+        return list(CUSTOMER_FIELD_DEFAULTS.keys())
+    requested = [f.strip() for f in fields_param.split(',') if f.strip()]
+    invalid = [f for f in requested if f not in CUSTOMER_FIELD_DEFAULTS]
+    if invalid:
+        raise ValueError(f"Unknown fields: {', '.join(invalid)}")
+    fields = ['id'] + [f for f in requested if f != 'id']
+    # 重複を除去（順序は維持）
+    return list(dict.fromkeys(fields))
+
+def serialize_customer_row(row, fields):
+    """射影済みの行をレスポンス用の辞書に変換"""
+    result = {}
+    for field, value in zip(fields, row):
+        default = CUSTOMER_FIELD_DEFAULTS[field]
+        if isinstance(value, date):
+            value = value.isoformat()
+        result[field] = value if default is None else (value or default)
+    return result
+
+def build_customer_query(session, fields, after_id=None):
+    """指定カラムのみをid順で取得するクエリを作成"""
+    query = session.query(*[getattr(Customer, f) for f in fields]).order_by(Customer.id)
+    if after_id is not None:
+        query = query.filter(Customer.id > after_id)
+    return query
+
+def stream_customers(fields, after_id=None):
+    """サーバーサイドカーソルから顧客をJSON配列としてチャンク単位で返すジェネレータ"""
+    session = new_session()
+    try:
+        query = build_customer_query(session, fields, after_id).execution_options(
+            stream_results=True, yield_per=CUSTOMER_STREAM_CHUNK_SIZE
+        )
+        yield '['
+        first = True
+        count = 0
+        buffer = []
+        for row in query:
+            buffer.append(json.dumps(serialize_customer_row(row, fields), ensure_ascii=False))
+            if len(buffer) >= CUSTOMER_STREAM_CHUNK_SIZE:
+                yield ('' if first else ',') + ','.join(buffer)
+                first = False
+                count += len(buffer)
+                buffer = []
+        if buffer:
+            yield ('' if first else ',') + ','.join(buffer)
+            count += len(buffer)
+        yield ']'
+        logger.info(f"Streamed {count} customers successfully")
+    finally:
+        session.close()
+
+@main_bp.route('/customers', methods=['GET'])
+@main_bp.route('/api/customers', methods=['GET'])
 @require_database
+@conditional_get('customers')
+@cached_response('customers')
 def get_customers():
-    """全顧客データを取得"""
-    session = SessionLocal()
+    """顧客データを取得
+
+    クエリパラメータ:
+        fields: 取得するカラムをカンマ区切りで指定（省略時は全カラム）
+        after_id / limit: キーセットページネーション（指定時はページ形式で返す）
+        stream: 1 の場合、全件をJSON配列としてストリーミングで返す
+    """
     try:
-        customers = session.query(Customer).all()
-        customer_list = []
-        
-        for customer in customers:
-            customer_list.append({
-                "id": customer.id,
-                "name": customer.name,
-                "plan": customer.plan,
-                "mrr": customer.mrr,
-                "initial_fee": customer.initial_fee or 0,
-                "operation_fee": customer.operation_fee or 0,
-                "assignee": customer.assignee,
-                "hours": customer.hours or 0,
-                "region": customer.region,
-                "industry": customer.industry,
-                "channel": customer.channel,
-                "status": customer.status or 'active',
-                "contract_date": customer.contract_date,
-                "health_score": customer.health_score or 70,
-                "last_login": customer.last_login,
-                "support_tickets": customer.support_tickets or 0,
-                "nps_score": customer.nps_score or 7,
-                "usage_rate": customer.usage_rate or 50,
-                "churn_date": customer.churn_date
-            })
-        
+        fields = parse_customer_fields(request.args.get('fields'))
+        after_id = request.args.get('after_id', type=int)
+        limit = request.args.get('limit', type=int)
+    except ValueError as e:
+        return jsonify({"error": "Invalid query parameter", "details": str(e)}), 400
+
+    if request.args.get('stream') in ('1', 'true'):
+        return Response(stream_with_context(stream_customers(fields, after_id)),
+                        mimetype='application/json')
+
+    paginated = after_id is not None or limit is not None
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "Invalid query parameter", "details": "limit must be positive"}), 400
+    if paginated:
+        limit = min(limit or PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT)
+
+    session = new_session()
+    try:
+        query = build_customer_query(session, fields, after_id)
+        if paginated:
+            # 次ページの有無を判定するため1件多く取得
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            customer_list = [serialize_customer_row(row, fields) for row in rows[:limit]]
+            logger.info(f"Retrieved {len(customer_list)} customers (after_id={after_id}, limit={limit})")
+            return jsonify({
+                "customers": customer_list,
+                "next_after_id": customer_list[-1]["id"] if has_more else None,
+                "has_more": has_more
+            }), 200
+
+        customer_list = [serialize_customer_row(row, fields) for row in query.all()]
         logger.info(f"Retrieved {len(customer_list)} customers successfully")
         return jsonify(customer_list), 200
         
@@ -351,17 +744,27 @@ def get_customers():
         session.close()
 
 # 顧客データ削除エンドポイント
-@app.route('/customers/<int:customer_id>', methods=['DELETE'])
+@main_bp.route('/customers/<int:customer_id>', methods=['DELETE'])
+@main_bp.route('/api/customers/<int:customer_id>', methods=['DELETE'])
 @require_database
 def delete_customer(customer_id):
     """指定された顧客を削除"""
-    session = SessionLocal()
+    session = new_session()
     try:
         customer = session.query(Customer).filter_by(id=customer_id).first()
         if customer:
             customer_name = customer.name
+            cohort_summary.record_customer_removed(
+                session, customer.id, customer.contract_date, customer.churn_date, customer.mrr
+            )
+            search.remove_entity(session, 'customer', customer.id)
+            revenue_series.record_customer_dates(session, customer.contract_date, customer.churn_date)
+            # 契約・請求・支払いも外部キーで連鎖削除されるため、先に集計から差し引く
+            billing_summary.record_customer_removed(session, customer.id)
             session.delete(customer)
+            table_versions.bump(session, 'customers', 'contracts', 'invoices', 'payments')
             session.commit()
+            response_cache.invalidate('customers', 'contracts', 'invoices', 'payments')
             logger.info(f"Customer deleted successfully: ID={customer_id}, Name={customer_name}")
             return jsonify({
                 "message": "削除成功",
@@ -386,7 +789,7 @@ def delete_customer(customer_id):
         session.close()
 
 # 会社登録エンドポイント
-@app.route('/companies', methods=['POST'])
+@main_bp.route('/companies', methods=['POST'])
 @require_database
 def register_company():
     """新規会社を登録"""
@@ -397,7 +800,7 @@ def register_company():
             
         logger.info(f"Received company registration request with data keys: {list(data.keys())}")
         
-        session = SessionLocal()
+        session = new_session()
         try:
             # 必須フィールドのチェック
             required_fields = ['name']
@@ -451,7 +854,11 @@ def register_company():
             )
             
             session.add(company)
+            session.flush()
+            search.index_companies(session, [company])
+            table_versions.bump(session, 'companies')
             session.commit()
+            response_cache.invalidate('companies')
             
             logger.info(f"Company registered successfully: ID={company.id}, Name={company.name}")
             
@@ -485,47 +892,111 @@ def register_company():
         }), 500
 
 # 会社一覧取得エンドポイント
-@app.route('/companies', methods=['GET'])
+def serialize_company(company):
+    """会社モデルをレスポンス用の辞書に変換"""
+    return {
+        "id": company.id,
+        "name": company.name,
+        "legal_name": company.legal_name,
+        "company_type": company.company_type.value if company.company_type else None,
+        "registration_number": company.registration_number,
+        "tax_id": company.tax_id,
+        "founded_date": company.founded_date.isoformat() if company.founded_date else None,
+        "capital": float(company.capital) if company.capital else None,
+        "employees": company.employees,
+        "industry": company.industry,
+        "website": company.website,
+        "email": company.email,
+        "phone": company.phone,
+        "fax": company.fax,
+        "address": company.address,
+        "city": company.city,
+        "state": company.state,
+        "postal_code": company.postal_code,
+        "country": company.country,
+        "representative_name": company.representative_name,
+        "representative_title": company.representative_title,
+        "description": company.description,
+        "status": company.status.value if company.status else None,
+        "notes": company.notes,
+        "created_at": company.created_at.isoformat() if company.created_at else None,
+        "updated_at": company.updated_at.isoformat() if company.updated_at else None
+    }
+
+@main_bp.route('/companies', methods=['GET'])
 @require_database
+@conditional_get('companies', 'customers')
+@cached_response('companies', 'customers')
 def get_companies():
-    """全会社データを取得"""
-    session = SessionLocal()
+    """会社データを取得
+
+    クエリパラメータ:
+        status / industry: 絞り込み条件
+        after_id / limit: キーセットページネーション（指定時はページ形式で返す）
+    """
+    status = request.args.get('status')
+    industry = request.args.get('industry')
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+
+    if status:
+        try:
+            status = CompanyStatus(status)
+        except ValueError:
+            return jsonify({
+                "error": "Invalid status",
+                "valid_statuses": [s.value for s in CompanyStatus]
+            }), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "Invalid query parameter", "details": "limit must be positive"}), 400
+
+    paginated = after_id is not None or limit is not None
+    if paginated:
+        limit = min(limit or PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT)
+
+    session = new_session()
     try:
-        companies = session.query(Company).all()
+        # 会社ごとの顧客数を1回のGROUP BYで集計し、外部結合する
+        customer_counts = session.query(
+            CustomerModel.company_id.label('company_id'),
+            func.count(CustomerModel.id).label('customer_count')
+        ).group_by(CustomerModel.company_id).subquery()
+
+        query = session.query(
+            Company,
+            func.coalesce(customer_counts.c.customer_count, 0)
+        ).outerjoin(
+            customer_counts, customer_counts.c.company_id == Company.id
+        ).order_by(Company.id)
+
+        if status:
+            query = query.filter(Company.status == status)
+        if industry:
+            query = query.filter(Company.industry == industry)
+        if after_id is not None:
+            query = query.filter(Company.id > after_id)
+
+        if paginated:
+            # 次ページの有無を判定するため1件多く取得
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows = query.all()
+
         company_list = []
-        
-        for company in companies:
-            company_list.append({
-                "id": company.id,
-                "name": company.name,
-                "legal_name": company.legal_name,
-                "company_type": company.company_type.value if company.company_type else None,
-                "registration_number": company.registration_number,
-                "tax_id": company.tax_id,
-                "founded_date": company.founded_date.isoformat() if company.founded_date else None,
-                "capital": float(company.capital) if company.capital else None,
-                "employees": company.employees,
-                "industry": company.industry,
-                "website": company.website,
-                "email": company.email,
-                "phone": company.phone,
-                "fax": company.fax,
-                "address": company.address,
-                "city": company.city,
-                "state": company.state,
-                "postal_code": company.postal_code,
-                "country": company.country,
-                "representative_name": company.representative_name,
-                "representative_title": company.representative_title,
-                "description": company.description,
-                "status": company.status.value if company.status else None,
-                "notes": company.notes,
-                "created_at": company.created_at.isoformat() if company.created_at else None,
-                "updated_at": company.updated_at.isoformat() if company.updated_at else None,
-                "customer_count": company.customers.count()
-            })
+        for company, customer_count in rows:
+            company_data = serialize_company(company)
+            company_data["customer_count"] = customer_count
+            company_list.append(company_data)
         
         logger.info(f"Retrieved {len(company_list)} companies successfully")
+        if paginated:
+            return jsonify({
+                "companies": company_list,
+                "next_after_id": company_list[-1]["id"] if has_more else None,
+                "has_more": has_more
+            }), 200
         return jsonify(company_list), 200
         
     except Exception as e:
@@ -540,54 +1011,27 @@ def get_companies():
         session.close()
 
 # 会社詳細取得エンドポイント
-@app.route('/companies/<int:company_id>', methods=['GET'])
+@main_bp.route('/companies/<int:company_id>', methods=['GET'])
 @require_database
 def get_company(company_id):
     """指定された会社の詳細を取得"""
-    session = SessionLocal()
+    session = new_session()
     try:
         company = session.query(Company).filter_by(id=company_id).first()
         if not company:
             return jsonify({"error": "Company not found"}), 404
         
-        company_data = {
-            "id": company.id,
-            "name": company.name,
-            "legal_name": company.legal_name,
-            "company_type": company.company_type.value if company.company_type else None,
-            "registration_number": company.registration_number,
-            "tax_id": company.tax_id,
-            "founded_date": company.founded_date.isoformat() if company.founded_date else None,
-            "capital": float(company.capital) if company.capital else None,
-            "employees": company.employees,
-            "industry": company.industry,
-            "website": company.website,
-            "email": company.email,
-            "phone": company.phone,
-            "fax": company.fax,
-            "address": company.address,
-            "city": company.city,
-            "state": company.state,
-            "postal_code": company.postal_code,
-            "country": company.country,
-            "representative_name": company.representative_name,
-            "representative_title": company.representative_title,
-            "description": company.description,
-            "status": company.status.value if company.status else None,
-            "notes": company.notes,
-            "created_at": company.created_at.isoformat() if company.created_at else None,
-            "updated_at": company.updated_at.isoformat() if company.updated_at else None,
-            "customers": [
-                {
-                    "id": customer.id,
-                    "name": customer.name,
-                    "plan": customer.plan,
-                    "mrr": customer.mrr,
-                    "status": customer.status
-                }
-                for customer in company.customers.all()
-            ]
-        }
+        company_data = serialize_company(company)
+        company_data["customers"] = [
+            {
+                "id": customer.id,
+                "name": customer.name,
+                "plan": customer.plan,
+                "mrr": customer.mrr,
+                "status": customer.status
+            }
+            for customer in company.customers.all()
+        ]
         
         return jsonify(company_data), 200
         
@@ -603,7 +1047,7 @@ def get_company(company_id):
         session.close()
 
 # 会社ステータス更新エンドポイント
-@app.route('/companies/<int:company_id>/status', methods=['PUT'])
+@main_bp.route('/companies/<int:company_id>/status', methods=['PUT'])
 @require_database
 def update_company_status(company_id):
     """会社のステータスを更新"""
@@ -612,7 +1056,7 @@ def update_company_status(company_id):
         if not data or 'status' not in data:
             return jsonify({"error": "Status is required"}), 400
         
-        session = SessionLocal()
+        session = new_session()
         try:
             company = session.query(Company).filter_by(id=company_id).first()
             if not company:
@@ -628,7 +1072,9 @@ def update_company_status(company_id):
                 }), 400
             
             company.status = new_status
+            table_versions.bump(session, 'companies')
             session.commit()
+            response_cache.invalidate('companies')
             
             logger.info(f"Company status updated: ID={company_id}, Status={new_status.value}")
             
@@ -660,8 +1106,53 @@ def update_company_status(company_id):
             "type": type(e).__name__
         }), 500
 
-# デバッグ用：データベース情報エンドポイント
-@app.route('/debug/db-info', methods=['GET'])
+# キャッシュ統計エンドポイント
+@main_bp.route('/metrics/cache', methods=['GET'])
+def cache_metrics():
+    """レスポンスキャッシュのヒット／ミス数を返す"""
+    return jsonify(response_cache.get_stats()), 200
+
+# Prometheus形式のメトリクスエンドポイント
+@main_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """リクエスト数・クエリ数・DB時間・接続プールの統計をPrometheus形式で返す"""
+    engine = get_engine()
+    pool_stats = get_pool_stats(engine) if engine else None
+    return Response(db_metrics.render_prometheus(pool_stats), mimetype='text/plain; version=0.0.4')
+
+# 低速クエリの一覧エンドポイント
+@main_bp.route('/metrics/slow-queries', methods=['GET'])
+def slow_query_metrics():
+    """SLOW_QUERY_MS を超えた直近のクエリを返す"""
+    return jsonify({
+        "threshold_ms": db_metrics.SLOW_QUERY_MS,
+        "queries": db_metrics.get_slow_queries()
+    }), 200
+
+# エンドポイント別レイテンシ
+@main_bp.route('/metrics/latency', methods=['GET'])
+def latency_metrics():
+    """エンドポイントごとの p50/p95/p99 レイテンシ（直近の標本）を返す"""
+    return jsonify({
+        "sample_size": db_metrics.LATENCY_SAMPLES,
+        "endpoints": db_metrics.get_latency_summary()
+    }), 200
+
+# 接続プール統計エンドポイント
+@main_bp.route('/metrics/pool', methods=['GET'])
+@require_database
+def pool_metrics():
+    """接続プールの設定と利用状況を返す"""
+    options = current_app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    return jsonify({
+        "environment": get_environment(),
+        "config": {k: v for k, v in options.items() if k != 'poolclass'},
+        "pool": get_pool_stats(get_engine())
+    }), 200
+
+# デバッグ用：データベース情報エンドポイント（認証が必要）
+@main_bp.route('/debug/db-info', methods=['GET'])
+@require_diagnostics_token
 def debug_db_info():
     """デバッグ用：データベース接続情報を表示"""
     info = {
@@ -675,12 +1166,13 @@ def debug_db_info():
             "DB_PASSWORD": "***" if os.environ.get('DB_PASSWORD') else 'not set'
         },
         "connection_info": {
-            "engine_initialized": engine is not None,
-            "session_factory_initialized": SessionLocal is not None,
+            "engine_initialized": get_engine() is not None,
+            "session_factory_initialized": 'legacy_session' in current_app.extensions,
             "socket_path": f"/cloudsql/{os.environ.get('CLOUD_SQL_CONNECTION_NAME', 'N/A')}" if os.environ.get('GAE_ENV') == 'standard' else "N/A"
         }
     }
     
+    engine = get_engine()
     if engine:
         try:
             with engine.connect() as conn:
@@ -719,7 +1211,7 @@ def debug_db_info():
                                 "plan": row[2],
                                 "mrr": row[3],
                                 "status": row[4],
-                                "contract_date": row[5]
+                                "contract_date": str(row[5]) if row[5] else None
                             })
                         info["recent_customers"] = recent_customers
                         
@@ -738,47 +1230,146 @@ def debug_db_info():
     
     return jsonify(info), 200
 
+# デバッグ用：設定確認エンドポイント（旧Xserver版との互換、認証が必要）
+@main_bp.route('/api/debug/config', methods=['GET'])
+@require_diagnostics_token
+def debug_config():
+    """設定情報の確認（DEBUG 有効時のみ）"""
+    config = current_app.config
+    if not config.get('DEBUG'):
+        return jsonify({"error": "Not available in production"}), 403
+    
+    db_pass = os.environ.get('DB_PASSWORD', '')
+    database_uri = config['SQLALCHEMY_DATABASE_URI']
+    return jsonify({
+        "config": {
+            key: config.get(key)
+            for key in ('ENVIRONMENT', 'DEBUG', 'DB_HOST', 'DB_PORT', 'DB_USER', 'DB_NAME', 'API_BASE_URL')
+        },
+        "database_uri_masked": database_uri.replace(db_pass, '***') if db_pass else database_uri,
+        "timestamp": datetime.now().isoformat()
+    }), 200
+
+# デバッグ用：リクエストプロファイル参照エンドポイント
+@main_bp.route('/debug/profiles', methods=['GET'])
+@main_bp.route('/debug/profiles/<profile_id>', methods=['GET'])
+def debug_profiles(profile_id=None):
+    """保存済みのリクエストプロファイルを返す（PROFILE_SECRET が必要）"""
+    if not request_profiler.is_authorized():
+        return jsonify({"error": "Not found"}), 404
+    
+    if profile_id is None:
+        return jsonify({"profiles": request_profiler.list_profiles()}), 200
+    
+    profile = request_profiler.get_profile(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    
+    if request.args.get('format') == 'text':
+        text_body = f"{profile['method']} {profile['path']} ({profile['duration_ms']}ms)\n\n{profile['cumulative']}\n{profile['tottime']}"
+        return Response(text_body, mimetype='text/plain')
+    return jsonify(profile), 200
+
 # ========== 静的ファイルハンドラー ==========
 
-@app.route('/')
+@main_bp.route('/')
 def serve():
     """ルートパスへのアクセスでindex.htmlを返す"""
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_from_directory(current_app.static_folder, 'index.html')
 
-@app.route('/<path:path>')
+@main_bp.route('/<path:path>')
 def static_proxy(path):
     """静的ファイルまたはSPAのフォールバック処理"""
     # APIエンドポイントは除外
-    if path.startswith('api/') or path in ['health', 'save', 'customers', 'debug/db-info']:
+    if path.startswith(('api/', 'export/', 'debug/', 'health/')) or path in ['health', 'livez', 'readyz', 'save', 'customers', 'search', 'debug/db-info', 'metrics', 'metrics/cache', 'metrics/latency', 'metrics/pool', 'metrics/slow-queries']:
         return jsonify({"error": "Not found"}), 404
         
     # 静的ファイルを返す
-    file_path = os.path.join(app.static_folder, path)
+    file_path = os.path.join(current_app.static_folder, path)
     if os.path.isfile(file_path):
-        return send_from_directory(app.static_folder, path)
+        return send_from_directory(current_app.static_folder, path)
     
     # SPAのため、存在しないパスはindex.htmlを返す
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_from_directory(current_app.static_folder, 'index.html')
 
 # エラーハンドラー
-@app.errorhandler(404)
+@main_bp.app_errorhandler(404)
 def not_found(e):
     """404エラーのカスタムハンドラー"""
     return jsonify({"error": "Not found", "path": request.path}), 404
 
-@app.errorhandler(500)
+@main_bp.app_errorhandler(500)
 def internal_error(e):
     """500エラーのカスタムハンドラー"""
     logger.error(f"Internal server error: {e}")
     return jsonify({
         "error": "Internal server error",
-        "details": str(e) if app.debug else "An error occurred"
+        "details": str(e) if current_app.debug else "An error occurred"
     }), 500
 
+def create_app(config=None):
+    """アプリケーションを作成
+
+    config: 設定クラス（config.Config など）または設定値の辞書
+    旧方式ルートのセッションファクトリもアプリごとに作成し、Flask-SQLAlchemy と
+    同じエンジン（接続プール）を使用する。モジュールのインポート時にはアプリを作成しない
+    （エントリーポイントごとに1つだけ作成する）。
+    """
+    app = Flask(__name__, static_folder='dist')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri()
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    
+    # 環境ごとの既定値に、configで指定されたエンジン設定を上書き
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **get_engine_options(),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    logger.info(f"Engine options for {get_environment()}: "
+                f"{ {k: v for k, v in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items() if k != 'poolclass'} }")
+    
+    CORS(app, origins=app.config.get('CORS_ORIGINS', '*'))  # Enable CORS for all routes
+    
+    # データベースを初期化（エンジンは作成するが、接続は最初の利用時）
+    db.init_app(app)
+    with app.app_context():
+        app.extensions['legacy_session'] = sessionmaker(bind=db.engine)
+    db_metrics.init_app(app)
+    request_profiler.init_app(app)
+    
+    app.register_blueprint(main_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(search_bp)
+    return app
+
 if __name__ == '__main__':
+    import sys
+    
+    app = create_app()
+    
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        # スキーマの作成・確認のみ行って終了
+        try:
+            init_schema(app)
+        except Exception as e:
+            logger.error(f"Migration failed: {e}")
+            sys.exit(1)
+        sys.exit(0)
+    
     # ローカル開発用の設定
     port = int(os.environ.get('PORT', 8080))
     debug = os.environ.get('DEBUG', 'true').lower() == 'true'
     
+    if os.environ.get('DB_AUTO_MIGRATE', 'false').lower() == 'true':
+        try:
+            init_schema(app)
+        except Exception as e:
+            logger.error(f"Error creating tables: {e}")
+    
     logger.info(f"Starting Flask app on port {port} (debug={debug})")
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+customers の日付カラムを DATE / DATETIME に移行し、分析用インデックスを追加する
+
+1. backfill: 既存の文字列（YYYY/MM/DD, YYYY-MM-DD など）を id 順にバッチで
+   YYYY-MM-DD（日時は YYYY-MM-DD HH:MM:SS）に正規化する。バッチごとに
+   コミットするため、長時間のロックは発生しない。解析できない値は NULL にする。
+2. alter: （MySQLのみ）正規化済みのカラムを DATE / DATETIME に変更する
+3. indexes: models.Customer に定義したインデックスを作成する（既存のものはスキップ）
+
+使い方:
+    python migrate_customer_dates.py [all|backfill|alter|indexes] [--batch-size 1000] [--sleep 0.05]
+"""
+import argparse
+import logging
+import sys
+import time
+from sqlalchemy import inspect, text
+from models import db, Customer
+from date_utils import parse_date, parse_datetime
+import response_cache
+import table_versions
+import revenue_series
+
+logger = logging.getLogger(__name__)
+
+# カラム名と移行後の型
+DATE_COLUMNS = {
+    'contract_date': 'DATE',
+    'last_login': 'DATETIME',
+    'churn_date': 'DATE',
+}
+
+def normalize(value, column_type):
+    """値を移行後の型で読める文字列に変換（空・解析できない値はNone）"""
+    if value is None:
+        return None
+    try:
+        if column_type == 'DATE':
+            parsed = parse_date(value)
+            return parsed.isoformat() if parsed else None
+        parsed = parse_datetime(value)
+        return parsed.strftime('%Y-%m-%d %H:%M:%S') if parsed else None
+    except ValueError:
+        return None
+
+def backfill(batch_size=1000, sleep=0.05):
+    """日付文字列をバッチ単位で正規化（戻り値: 更新件数, 解析できずNULLにした件数）"""
+    columns = list(DATE_COLUMNS)
+    select_sql = text(
+        f"SELECT id, {', '.join(columns)} FROM customers "
+        "WHERE id > :after_id ORDER BY id LIMIT :limit"
+    )
+    update_sql = text(
+        f"UPDATE customers SET {', '.join(f'{c} = :{c}' for c in columns)} WHERE id = :id"
+    )
+
+    after_id = 0
+    updated = 0
+    invalid = 0
+    while True:
+        rows = db.session.execute(select_sql, {'after_id': after_id, 'limit': batch_size}).fetchall()
+        if not rows:
+            break
+
+        changes = []
+        for row in rows:
+            values = {'id': row[0]}
+            changed = False
+            for column, raw in zip(columns, row[1:]):
+                normalized = normalize(raw, DATE_COLUMNS[column])
+                values[column] = normalized
+                if raw is not None and normalized is None:
+                    if str(raw).strip():
+                        invalid += 1
+                        logger.warning(f"Customer {row[0]}: unparseable {column}={raw!r}, set to NULL")
+                    changed = True
+                elif normalized is not None and str(raw) != normalized:
+                    changed = True
+            if changed:
+                changes.append(values)
+
+        try:
+            if changes:
+                db.session.execute(update_sql, changes)
+                table_versions.bump(db.session, 'customers', revenue_series.HISTORY_TABLE)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        updated += len(changes)
+        after_id = rows[-1][0]
+        logger.info(f"Backfilled customers up to id={after_id} ({updated} updated)")
+        if sleep:
+            # 他のトランザクションに行ロックを譲る
+            time.sleep(sleep)
+
+    response_cache.invalidate('customers')
+    return updated, invalid
+
+def alter_columns():
+    """（MySQLのみ）日付カラムの型を DATE / DATETIME に変更"""
+    engine = db.engine
+    if engine.dialect.name != 'mysql':
+        logger.info(f"Skipping column type change on {engine.dialect.name}")
+        return []
+
+    current = {c['name']: str(c['type']).upper() for c in inspect(engine).get_columns('customers')}
+    pending = [
+        (column, column_type) for column, column_type in DATE_COLUMNS.items()
+        if not current.get(column, '').startswith(column_type)
+    ]
+    if not pending:
+        logger.info("Date columns are already typed")
+        return []
+
+    # 1回のALTERでまとめて変更（テーブルの再構築は1回のみ）
+    statement = 'ALTER TABLE customers ' + ', '.join(
+        f"MODIFY {column} {column_type} NULL" for column, column_type in pending
+    )
+    logger.info(f"Running: {statement}")
+    with engine.begin() as conn:
+        conn.execute(text(statement))
+    return [column for column, _ in pending]
+
+def create_indexes():
+    """models.Customer のインデックスを作成（同じ先頭カラムのインデックスがあればスキップ）"""
+    engine = db.engine
+    existing = [
+        tuple(index['column_names'])
+        for index in inspect(engine).get_indexes('customers')
+    ]
+    created = []
+    for index in Customer.__table__.indexes:
+        columns = tuple(column.name for column in index.columns)
+        if any(names[:len(columns)] == columns for names in existing):
+            logger.info(f"Index on {columns} already exists")
+            continue
+        logger.info(f"Creating index {index.name} on {columns}")
+        index.create(bind=engine)
+        created.append(index.name)
+    return created
+
+if __name__ == '__main__':
+    from main import create_app
+
+    parser = argparse.ArgumentParser(description='customers の日付カラムを型付きに移行します')
+    parser.add_argument('step', nargs='?', default='all', choices=['all', 'backfill', 'alter', 'indexes'])
+    parser.add_argument('--batch-size', type=int, default=1000, help='1バッチで更新する行数')
+    parser.add_argument('--sleep', type=float, default=0.05, help='バッチ間の待機秒数')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            if args.step in ('all', 'backfill'):
+                updated, invalid = backfill(args.batch_size, args.sleep)
+                print(f"✅ {updated}件の日付を正規化しました（解析できずNULLにした値: {invalid}件）")
+            if args.step in ('all', 'alter'):
+                altered = alter_columns()
+                print(f"✅ 型を変更したカラム: {', '.join(altered) or 'なし'}")
+            if args.step in ('all', 'indexes'):
+                created = create_indexes()
+                print(f"✅ 作成したインデックス: {', '.join(created) or 'なし'}")
+        except Exception as e:
+            logger.error(f"Customer date migration failed: {e}")
+            print(f"❌ 移行に失敗しました: {e}")
+            sys.exit(1)
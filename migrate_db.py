@@ -21,13 +21,13 @@ def migrate_database():
                 ("industry", "VARCHAR(255)"),
                 ("channel", "VARCHAR(255)"),
                 ("status", "VARCHAR(255) DEFAULT 'active'"),
-                ("contract_date", "VARCHAR(255)"),
+                ("contract_date", "DATE"),
                 ("health_score", "INT DEFAULT 70"),
-                ("last_login", "VARCHAR(255)"),
+                ("last_login", "DATETIME"),
                 ("support_tickets", "INT DEFAULT 0"),
                 ("nps_score", "INT DEFAULT 7"),
                 ("usage_rate", "INT DEFAULT 50"),
-                ("churn_date", "VARCHAR(255)")
+                ("churn_date", "DATE")
             ]
             
             # Check existing columns
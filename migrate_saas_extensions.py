@@ -79,7 +79,7 @@ def run_migration():
             logger.info(f"Current tables: {', '.join(tables)}")
             
             # 新しいテーブルの存在確認
-            new_tables = ['contracts', 'invoices', 'invoice_items', 'payments', 'recurring_billing', 'contract_history']
+            new_tables = ['contracts', 'invoices', 'invoice_items', 'payments', 'recurring_billing', 'contract_history', 'billing_daily_summary', 'table_versions']
             for table in new_tables:
                 if table in tables:
                     logger.info(f"✓ Table '{table}' created successfully")
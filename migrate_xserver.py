@@ -32,8 +32,16 @@ print("\n" + "=" * 50)
 print("Starting XServer database migration")
 print("=" * 50)
 
+from main import create_app, init_schema
 from migrate_saas_extensions import run_migration
 
 if __name__ == "__main__":
+    # customers / companies などのテーブルを先に作成・確認する
+    try:
+        init_schema(create_app())
+    except Exception as e:
+        print(f"Schema initialization failed: {e}")
+        sys.exit(1)
+    
     success = run_migration()
     sys.exit(0 if success else 1)
\ No newline at end of file
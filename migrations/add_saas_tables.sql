@@ -41,6 +41,7 @@ CREATE TABLE IF NOT EXISTS invoices (
     FOREIGN KEY (contract_id) REFERENCES contracts(id) ON DELETE SET NULL,
     INDEX idx_customer_id (customer_id),
     INDEX idx_status (status),
+    INDEX idx_issue_date (issue_date),
     INDEX idx_due_date (due_date)
 );
 
@@ -105,4 +106,22 @@ CREATE TABLE IF NOT EXISTS contract_history (
     FOREIGN KEY (contract_id) REFERENCES contracts(id) ON DELETE CASCADE,
     INDEX idx_contract_id (contract_id),
     INDEX idx_created_at (created_at)
+);
+
+-- 日次請求サマリーテーブル（請求額はissue_date、回収額はpayment_dateで集計）
+CREATE TABLE IF NOT EXISTS billing_daily_summary (
+    summary_date DATE PRIMARY KEY,
+    invoiced_amount DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    invoice_count INT NOT NULL DEFAULT 0,
+    unpaid_amount DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    unpaid_count INT NOT NULL DEFAULT 0,
+    collected_amount DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    payment_count INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- テーブル更新世代番号（ETag用）
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
 );
\ No newline at end of file
@@ -4,6 +4,7 @@ SaaS販売管理システムのデータベースモデル
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import Enum
+from sqlalchemy.dialects import mysql
 import enum
 
 db = SQLAlchemy()
@@ -89,27 +90,32 @@ class Company(db.Model):
 class Customer(db.Model):
     """顧客モデル（既存）"""
     __tablename__ = 'customers'
+    __table_args__ = (
+        # 分析画面の絞り込み（ステータス＋契約日、プラン＋ステータス）用
+        db.Index('idx_customers_status_contract_date', 'status', 'contract_date'),
+        db.Index('idx_customers_plan_status', 'plan', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'))
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), index=True)
     name = db.Column(db.String(100), nullable=False)
     plan = db.Column(db.String(50))
     mrr = db.Column(db.Integer, default=0)
     initial_fee = db.Column(db.Integer, default=0)
     operation_fee = db.Column(db.Integer, default=0)
-    assignee = db.Column(db.String(50))
+    assignee = db.Column(db.String(50), index=True)
     hours = db.Column(db.Integer, default=0)
-    region = db.Column(db.String(50))
+    region = db.Column(db.String(50), index=True)
     industry = db.Column(db.String(50))
     channel = db.Column(db.String(50))
     status = db.Column(db.String(50), default='active')
-    contract_date = db.Column(db.String(50))
+    contract_date = db.Column(db.Date)
     health_score = db.Column(db.Integer, default=50)
-    last_login = db.Column(db.String(50))
+    last_login = db.Column(db.DateTime)
     support_tickets = db.Column(db.Integer, default=0)
-    nps_score = db.Column(db.Integer, default=50)
+    nps_score = db.Column(db.Integer, default=7)  # 0〜10
     usage_rate = db.Column(db.Integer, default=50)
-    churn_date = db.Column(db.String(50))
+    churn_date = db.Column(db.Date, index=True)
     
     # リレーションシップ
     contracts = db.relationship('Contract', backref='customer', lazy='dynamic', cascade='all, delete-orphan')
@@ -147,7 +153,7 @@ class Invoice(db.Model):
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
     contract_id = db.Column(db.Integer, db.ForeignKey('contracts.id'))
-    issue_date = db.Column(db.Date, nullable=False)
+    issue_date = db.Column(db.Date, nullable=False, index=True)
     due_date = db.Column(db.Date, nullable=False)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     tax_amount = db.Column(db.Numeric(10, 2), default=0)
@@ -213,4 +219,70 @@ class ContractHistory(db.Model):
     old_values = db.Column(db.JSON)
     new_values = db.Column(db.JSON)
     changed_by = db.Column(db.String(100))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class BillingDailySummary(db.Model):
+    """日次請求サマリーモデル（invoices / payments の集計結果）"""
+    __tablename__ = 'billing_daily_summary'
+    
+    summary_date = db.Column(db.Date, primary_key=True)
+    invoiced_amount = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    unpaid_amount = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    unpaid_count = db.Column(db.Integer, nullable=False, default=0)
+    collected_amount = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CohortMonthlySummary(db.Model):
+    """コホート別月次サマリーモデル（契約開始月 × 経過月数ごとの増減）"""
+    __tablename__ = 'cohort_monthly_summary'
+    
+    cohort_month = db.Column(db.Date, primary_key=True)
+    months_since = db.Column(db.Integer, primary_key=True)
+    customers_added = db.Column(db.Integer, nullable=False, default=0)
+    mrr_added = db.Column(db.BigInteger, nullable=False, default=0)
+    customers_churned = db.Column(db.Integer, nullable=False, default=0)
+    mrr_churned = db.Column(db.BigInteger, nullable=False, default=0)
+    mrr_expansion = db.Column(db.BigInteger, nullable=False, default=0)
+    mrr_contraction = db.Column(db.BigInteger, nullable=False, default=0)
+
+class SearchTerm(db.Model):
+    """検索用のn-gram索引（正規化した名称の2文字ずつの語と、その語を含むレコード）"""
+    __tablename__ = 'search_terms'
+    __table_args__ = (
+        # レコード単位の索引の削除・更新用
+        db.Index('idx_search_terms_entity', 'entity_type', 'entity_id'),
+    )
+    
+    # ひらがな・カタカナなどを同一視する照合順序では別の語が重複するため、MySQLではバイナリ照合
+    term = db.Column(
+        db.String(4).with_variant(mysql.VARCHAR(4, charset='utf8mb4', collation='utf8mb4_bin'), 'mysql'),
+        primary_key=True
+    )
+    entity_type = db.Column(db.String(20), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    weight = db.Column(db.Integer, nullable=False, default=1)
+
+class CalendarDate(db.Model):
+    """集計用のカレンダー（1日1行、その日が属する週・月・四半期の開始日）"""
+    __tablename__ = 'calendar_dates'
+    
+    day = db.Column(db.Date, primary_key=True)
+    week_start = db.Column(db.Date, nullable=False, index=True)
+    month_start = db.Column(db.Date, nullable=False, index=True)
+    quarter_start = db.Column(db.Date, nullable=False, index=True)
+
+class NumberSequence(db.Model):
+    """採番用のシーケンス（請求書番号・契約番号の月ごとの最終番号）"""
+    __tablename__ = 'number_sequences'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class TableVersion(db.Model):
+    """テーブルごとの更新世代番号（書き込み時に加算し、ETagの算出に使用）"""
+    __tablename__ = 'table_versions'
+    
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+MRRの予測
+
+締め済みの月（当月より前）の月末MRRに対して2つのモデルを当てはめる。
+
+- トレンド: 月番号に対する線形回帰（24か月分以上あれば月ごとの季節項を追加）
+- コホート: 直近の月次継続率（拡大・縮小・解約を含む）と平均新規MRRで
+  既存MRRの減衰と新規獲得を積み上げる
+
+当てはめた結果は当月と参照テーブルの世代番号（table_versions）をキーに
+プロセス内で保持し、月が替わるか契約が更新されたときだけ再計算する。
+最小二乗法は正規方程式を純Pythonで解く（説明変数は最大13個）。
+"""
+import logging
+import threading
+import analytics
+import table_versions
+
+logger = logging.getLogger(__name__)
+
+# 当てはめに使う締め済みの月数
+HISTORY_MONTHS = 36
+# 季節項を入れるのに必要な月数（2周期分）
+SEASONAL_MIN_MONTHS = 24
+# コホート予測の継続率・新規MRRを平均する月数
+COHORT_LOOKBACK_MONTHS = 6
+DEFAULT_HORIZON = 6
+MAX_HORIZON = 24
+# MRRの推移の算出元のテーブル（世代番号が変わればモデルを作り直す）
+SOURCE_TABLES = ('contracts',)
+
+_models = {}
+_lock = threading.Lock()
+
+def design_row(t, month, seasonal):
+    """回帰の説明変数（切片・月番号・1月を基準にした月ダミー）"""
+    row = [1.0, float(t)]
+    if seasonal:
+        row.extend(1.0 if month == m else 0.0 for m in range(2, 13))
+    return row
+
+def solve_least_squares(rows, values):
+    """最小二乗解を求める（正規方程式 (XᵀX) b = Xᵀy をガウスの消去法で解く）"""
+    n = len(rows[0])
+    matrix = [
+        [sum(r[i] * r[j] for r in rows) for j in range(n)] + [sum(r[i] * v for r, v in zip(rows, values))]
+        for i in range(n)
+    ]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(matrix[r][col]))
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        if abs(matrix[col][col]) < 1e-12:
+            continue
+        for r in range(n):
+            if r != col:
+                factor = matrix[r][col] / matrix[col][col]
+                matrix[r] = [a - factor * b for a, b in zip(matrix[r], matrix[col])]
+    return [
+        matrix[i][n] / matrix[i][i] if abs(matrix[i][i]) >= 1e-12 else 0.0
+        for i in range(n)
+    ]
+
+def fit_trend(history):
+    """月末MRRにトレンド（＋季節）モデルを当てはめ、係数と決定係数を返す"""
+    seasonal = len(history) >= SEASONAL_MIN_MONTHS
+    rows = [design_row(t, m['month_start'].month, seasonal) for t, m in enumerate(history)]
+    values = [m['ending_mrr'] for m in history]
+    coef = solve_least_squares(rows, values)
+
+    fitted = [sum(c * x for c, x in zip(coef, row)) for row in rows]
+    mean = sum(values) / len(values)
+    total = sum((v - mean) ** 2 for v in values)
+    residual = sum((v - f) ** 2 for v, f in zip(values, fitted))
+    return {
+        'coefficients': coef,
+        'seasonal': seasonal,
+        'r_squared': round(1 - residual / total, 4) if total else None
+    }
+
+def fit_cohort(history):
+    """直近の月次継続率と平均新規MRR"""
+    recent = history[-COHORT_LOOKBACK_MONTHS:]
+    starting = sum(m['starting_mrr'] for m in recent)
+    retained = sum(m['ending_mrr'] - m['new_mrr'] for m in recent)
+    return {
+        'monthly_retention_rate': retained / starting if starting else 1.0,
+        'average_new_mrr': sum(m['new_mrr'] for m in recent) / len(recent)
+    }
+
+def fit(today=None):
+    """締め済みの月にモデルを当てはめる（データがなければNone）"""
+    movements = analytics.compute_mrr_movements(HISTORY_MONTHS + 1, today)[:-1]
+    starts = analytics.month_starts(HISTORY_MONTHS + 1, today)[:-1]
+    history = [dict(m, month_start=start) for m, start in zip(movements, starts)]
+    # MRRが発生する前の月は当てはめに使わない
+    while history and not history[0]['ending_mrr'] and not history[0]['new_mrr']:
+        history.pop(0)
+    if not history:
+        return None
+
+    return {
+        'fitted_through': history[-1]['month'],
+        'next_month': analytics.add_months(history[-1]['month_start'], 1),
+        'history': [{'month': m['month'], 'mrr': m['ending_mrr']} for m in history],
+        'last_mrr': history[-1]['ending_mrr'],
+        'trend': fit_trend(history),
+        'cohort': fit_cohort(history)
+    }
+
+def get_model(today=None):
+    """当月と参照テーブルの世代番号ごとにキャッシュしたモデルを取得"""
+    key = (analytics.month_starts(1, today)[0], tuple(table_versions.get_versions(SOURCE_TABLES)))
+    with _lock:
+        model = _models.get(key)
+    if model is not None:
+        return model
+
+    model = fit(today)
+    if model is None:
+        return None
+    logger.info(f"Fitted MRR forecast model through {model['fitted_through']}")
+    with _lock:
+        # 古い世代のモデルは不要
+        _models.clear()
+        _models[key] = model
+    return model
+
+def forecast(horizon=DEFAULT_HORIZON, today=None):
+    """当月以降horizon か月分のMRRを予測"""
+    model = get_model(today)
+    if model is None:
+        return {'history': [], 'forecast': [], 'model': None}
+
+    trend = model['trend']
+    cohort = model['cohort']
+    offset = len(model['history'])
+    cohort_mrr = model['last_mrr']
+    points = []
+    for step in range(horizon):
+        month = analytics.add_months(model['next_month'], step)
+        row = design_row(offset + step, month.month, trend['seasonal'])
+        cohort_mrr = cohort_mrr * cohort['monthly_retention_rate'] + cohort['average_new_mrr']
+        points.append({
+            'month': month.strftime('%Y-%m'),
+            'trend_mrr': max(round(sum(c * x for c, x in zip(trend['coefficients'], row))), 0),
+            'cohort_mrr': max(round(cohort_mrr), 0)
+        })
+
+    return {
+        'history': model['history'],
+        'forecast': points,
+        'model': {
+            'fitted_through': model['fitted_through'],
+            'seasonal': trend['seasonal'],
+            'r_squared': trend['r_squared'],
+            'monthly_retention_rate': round(cohort['monthly_retention_rate'] * 100, 2),
+            'average_new_mrr': round(cohort['average_new_mrr'])
+        }
+    }
@@ -0,0 +1,116 @@
+"""
+リクエスト単位のプロファイラ（オプトイン）
+
+PROFILE_SECRET を設定した環境でのみ有効。以下のヘッダーを付けた1リクエストだけ
+cProfile を有効にし、結果を保存してレスポンスに X-Profile-Id ヘッダーを付与する。
+
+    X-Profile-Token: <PROFILE_SECRET>
+
+保存した結果は /debug/profiles/<id> で参照する（同じヘッダーが必要）。
+シークレットはURLに含めない（アクセスログやRefererに残るため）。
+ストリーミングレスポンスは本文の生成前までが計測対象になる。
+
+環境変数:
+    PROFILE_SECRET: プロファイル実行・参照用のシークレット（未設定なら無効）
+    PROFILE_HISTORY: 保持するプロファイル数（既定20）
+"""
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SECRET = os.environ.get('PROFILE_SECRET', '')
+PROFILE_HISTORY = int(os.environ.get('PROFILE_HISTORY', 20))
+PROFILE_TOP_N = 40
+
+_profiles = OrderedDict()
+_lock = threading.Lock()
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+def _has_secret():
+    """リクエストヘッダーのシークレットが一致するか"""
+    token = request.headers.get(PROFILE_HEADER, '')
+    return bool(PROFILE_SECRET) and hmac.compare_digest(token, PROFILE_SECRET)
+
+def should_profile():
+    """このリクエストをプロファイルするか"""
+    if request.path.startswith('/debug/profiles'):
+        # 結果の参照自体は記録しない
+        return False
+    return _has_secret()
+
+def is_authorized():
+    """プロファイル結果の参照を許可するか"""
+    return _has_secret()
+
+def _summarize(profiler, sort_key):
+    """関数ごとの呼び出し回数・時間の上位をテキストで返す"""
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats(sort_key).print_stats(PROFILE_TOP_N)
+    return stream.getvalue()
+
+def _start_profile():
+    if not should_profile():
+        return
+    g.profiler = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profiler.enable()
+
+def _finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+
+    profile_id = uuid.uuid4().hex[:12]
+    profile = {
+        'id': profile_id,
+        'timestamp': datetime.now().isoformat(),
+        'method': request.method,
+        'path': request.full_path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - g.pop('profile_started')) * 1000, 1),
+        'cumulative': _summarize(profiler, 'cumulative'),
+        'tottime': _summarize(profiler, 'tottime')
+    }
+    with _lock:
+        _profiles[profile_id] = profile
+        while len(_profiles) > PROFILE_HISTORY:
+            _profiles.popitem(last=False)
+
+    logger.info(f"Profiled {request.method} {request.path} ({profile['duration_ms']}ms): {profile_id}")
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+def init_app(app):
+    """リクエスト処理にプロファイラを組み込む"""
+    if not PROFILE_SECRET:
+        return
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+
+def get_profile(profile_id):
+    with _lock:
+        return _profiles.get(profile_id)
+
+def list_profiles():
+    """保存済みプロファイルの一覧（新しい順、本文なし）"""
+    with _lock:
+        profiles = list(_profiles.values())
+    return [
+        {k: v for k, v in profile.items() if k not in ('cumulative', 'tottime')}
+        for profile in reversed(profiles)
+    ]
@@ -0,0 +1,200 @@
+"""
+読み取り系エンドポイント用のレスポンスキャッシュ
+
+キャッシュキーは「パス + ソート済みクエリ引数 + 参照テーブルの世代番号」で構成する。
+書き込み処理は invalidate() で該当テーブルの世代番号を進めるだけで、
+古い世代のエントリは参照されなくなり、TTL / LRU で自然に追い出される。
+
+環境変数:
+    CACHE_BACKEND: memory（既定） / redis / none
+    CACHE_TTL: キャッシュの有効期間（秒、既定30）
+    CACHE_MAX_ENTRIES: memoryバックエンドの最大エントリ数（既定1024）
+    CACHE_REDIS_URL: redisバックエンドの接続先（既定 redis://localhost:6379/0）
+
+memoryバックエンドの世代番号はプロセス内のみで共有されるため、
+複数プロセス構成で即時に無効化したい場合はredisバックエンドを使用する。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import Response, g, request
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class MemoryBackend:
+    """TTL付きのプロセス内LRUキャッシュ"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generations(self, tags):
+        with self._lock:
+            return [self._generations[tag] for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisBackend:
+    """Redis互換サーバーを使用するキャッシュ（プロセス間で共有）"""
+
+    PREFIX = 'saas:cache:'
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(self.PREFIX + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.PREFIX + key, value, ex=max(1, int(ttl)))
+
+    def generations(self, tags):
+        values = self.client.mget([f"{self.PREFIX}gen:{tag}" for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(f"{self.PREFIX}gen:{tag}")
+        pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.PREFIX + '*'):
+            self.client.delete(key)
+
+def create_backend():
+    """環境変数に応じてキャッシュバックエンドを作成（無効の場合はNone）"""
+    backend = os.environ.get('CACHE_BACKEND', 'memory').lower()
+    if backend == 'none':
+        return None
+    if backend == 'redis':
+        try:
+            return RedisBackend(os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+        except Exception as e:
+            logger.error(f"Redis cache backend unavailable, falling back to memory: {e}")
+    return MemoryBackend(int(os.environ.get('CACHE_MAX_ENTRIES', 1024)))
+
+backend = create_backend()
+DEFAULT_TTL = int(os.environ.get('CACHE_TTL', 30))
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+def _count(endpoint, result):
+    with _stats_lock:
+        _stats[endpoint][result] += 1
+
+def get_stats():
+    """エンドポイントごとのヒット／ミス数を取得"""
+    with _stats_lock:
+        endpoints = {name: dict(counts) for name, counts in _stats.items()}
+    return {
+        'backend': type(backend).__name__ if backend else 'disabled',
+        'ttl': DEFAULT_TTL,
+        'hits': sum(c['hits'] for c in endpoints.values()),
+        'misses': sum(c['misses'] for c in endpoints.values()),
+        'endpoints': endpoints
+    }
+
+def invalidate(*tables):
+    """テーブルの世代番号を進め、それらを参照するキャッシュを無効化"""
+    if backend is None or not tables:
+        return
+    try:
+        backend.bump(tables)
+    except Exception as e:
+        logger.error(f"Cache invalidation failed for {tables}: {e}")
+
+def _cache_key(tables):
+    args = urlencode(sorted(request.args.items(multi=True)))
+    generations = ','.join(str(gen) for gen in backend.generations(tables))
+    # conditional_get でDBの世代番号を取得済みであればキーに含める
+    # （他プロセスでの書き込みもETagと同じタイミングで反映される）
+    versions = ','.join(str(v) for v in g.get('table_versions', ()))
+    return f"{request.path}?{args}#{generations}#{versions}"
+
+def _pack(response):
+    header = json.dumps({'status': response.status_code, 'mimetype': response.mimetype})
+    return header.encode('utf-8') + b'\n' + response.get_data()
+
+def _unpack(value):
+    header, body = value.split(b'\n', 1)
+    header = json.loads(header)
+    return Response(body, status=header['status'], mimetype=header['mimetype'])
+
+def cached_response(*tables, ttl=None):
+    """GETレスポンスをキャッシュするデコレータ
+
+    tables: レスポンスが参照するテーブル名（invalidate() の対象と一致させる）
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if backend is None or request.method != 'GET':
+                return f(*args, **kwargs)
+
+            try:
+                key = _cache_key(tables)
+                value = backend.get(key)
+            except Exception as e:
+                logger.error(f"Cache lookup failed: {e}")
+                return f(*args, **kwargs)
+
+            if value is not None:
+                _count(request.endpoint, 'hits')
+                return _unpack(value)
+
+            _count(request.endpoint, 'misses')
+            response = f(*args, **kwargs)
+            # 正常終了した通常のレスポンスのみキャッシュ（ストリーミングは除外）
+            rv = response[0] if isinstance(response, tuple) else response
+            status = response[1] if isinstance(response, tuple) and len(response) > 1 else rv.status_code
+            if status == 200 and isinstance(rv, Response) and not rv.is_streamed:
+                try:
+                    rv.status_code = status
+                    backend.set(key, _pack(rv), ttl or DEFAULT_TTL)
+                except Exception as e:
+                    logger.error(f"Cache store failed: {e}")
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,235 @@
+"""
+期間ごとの売上推移（稼働MRR・顧客数・新規／解約数）
+
+calendar_dates（1日1行のカレンダー）を期間の開始日でまとめた期間一覧と
+customers を1回の結合・GROUP BYで集計する。期間末時点で契約中の顧客を
+「稼働」とし、期間内の contract_date / churn_date を新規・解約として数える。
+
+calendar_dates はマイグレーション（python main.py migrate の init_schema）で
+MIN_DATE から指定できる最終日までを作成しておき、APIでは参照のみ行う。
+
+終了済みの期間（期間末が本日より前）の集計値はレスポンスキャッシュの
+バックエンドに保持し、過去の日付に影響する書き込み（record_customer_dates）
+があった場合のみ作り直す。
+"""
+import json
+import logging
+import threading
+from datetime import date, timedelta
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.exc import IntegrityError
+from models import db, CalendarDate, Customer
+import response_cache
+import table_versions
+
+logger = logging.getLogger(__name__)
+
+# 期間の単位と calendar_dates のカラム
+GRANULARITIES = {
+    'day': 'day',
+    'week': 'week_start',
+    'month': 'month_start',
+    'quarter': 'quarter_start',
+}
+DEFAULT_GRANULARITY = 'month'
+DEFAULT_MONTHS = 12
+MAX_PERIODS = 400
+# 指定できる日付の範囲（カレンダーはマイグレーションでこの範囲を作成する）
+MIN_DATE = date(2000, 1, 1)
+MAX_YEARS_AHEAD = 5
+# 過去の期間に影響する書き込みで加算する世代番号の名前
+HISTORY_TABLE = 'customer_history'
+CLOSED_PERIOD_TTL = 24 * 60 * 60
+
+_calendar_range = None
+_calendar_lock = threading.Lock()
+
+def calendar_row(day):
+    month_start = day.replace(day=1)
+    return {
+        'day': day,
+        'week_start': day - timedelta(days=day.weekday()),
+        'month_start': month_start,
+        'quarter_start': month_start.replace(month=(day.month - 1) // 3 * 3 + 1)
+    }
+
+def insert_days(first, last):
+    """first〜last の日付をカレンダーに追加"""
+    rows = [calendar_row(first + timedelta(days=i)) for i in range((last - first).days + 1)]
+    if rows:
+        db.session.execute(CalendarDate.__table__.insert(), rows)
+
+def max_date(today=None):
+    """指定できる最終日（本年から MAX_YEARS_AHEAD 年後の年末）"""
+    today = today or date.today()
+    return date(today.year + MAX_YEARS_AHEAD, 12, 31)
+
+def seed_calendar(start=MIN_DATE, end=None):
+    """start〜end（既定は MIN_DATE〜max_date()）をカレンダーに作成（マイグレーション用）
+
+    既存の範囲と離れている場合は間の日付も追加する（範囲の途中に欠けを作らない）。
+    """
+    end = end or max_date()
+    low, high = db.session.query(func.min(CalendarDate.day), func.max(CalendarDate.day)).one()
+    try:
+        if low is None:
+            insert_days(start, end)
+        else:
+            # 既存の範囲の前後だけを追加
+            if start < low:
+                insert_days(start, low - timedelta(days=1))
+            if end > high:
+                insert_days(high + timedelta(days=1), end)
+        db.session.commit()
+    except IntegrityError:
+        # 他のプロセスが同時に追加した
+        db.session.rollback()
+        logger.info("Calendar was extended concurrently")
+        return seed_calendar(start, end)
+    logger.info(f"Calendar covers {min(start, low or start)} to {max(end, high or end)}")
+
+def check_calendar(start, end):
+    """start〜end がカレンダーに揃っていることを確認（書き込みは行わない）"""
+    global _calendar_range
+    with _calendar_lock:
+        if _calendar_range and _calendar_range[0] <= start and end <= _calendar_range[1]:
+            return
+
+    low, high = db.session.query(func.min(CalendarDate.day), func.max(CalendarDate.day)).one()
+    if low is None or start < low or end > high:
+        raise RuntimeError(
+            f"calendar_dates does not cover {start.isoformat()} to {end.isoformat()} "
+            "(run: python main.py migrate)"
+        )
+    with _calendar_lock:
+        _calendar_range = (low, high)
+
+def period_index(granularity, day):
+    """期間の通し番号（隣り合う期間で1ずつ増える）"""
+    if granularity == 'day':
+        return day.toordinal()
+    if granularity == 'week':
+        return (day.toordinal() - day.weekday()) // 7
+    if granularity == 'month':
+        return day.year * 12 + day.month - 1
+    return day.year * 4 + (day.month - 1) // 3
+
+def period_count(granularity, start, end):
+    """start〜end に含まれる期間の数（カレンダーを参照せずに算出）"""
+    return period_index(granularity, end) - period_index(granularity, start) + 1
+
+def validate_range(granularity, start, end, today=None):
+    """期間の指定を検証（不正な場合はValueError）"""
+    last = max_date(today)
+    if start < MIN_DATE or end > last:
+        raise ValueError(f"dates must be between {MIN_DATE.isoformat()} and {last.isoformat()}")
+    if start > end:
+        raise ValueError('from must not be after to')
+    if period_count(granularity, start, end) > MAX_PERIODS:
+        raise ValueError(f"too many periods (max {MAX_PERIODS})")
+
+def record_customer_dates(session, *dates):
+    """過去の日付に影響する顧客の書き込みで、終了済み期間のキャッシュを無効にする"""
+    today = date.today()
+    if any(day is not None and day < today for day in dates):
+        table_versions.bump(session, HISTORY_TABLE)
+
+def query_periods(granularity, start, end):
+    """期間（start〜endで切り取ったもの）ごとの集計を1回のクエリで取得"""
+    bucket = getattr(CalendarDate, GRANULARITIES[granularity])
+    periods = db.session.query(
+        func.min(CalendarDate.day).label('start'),
+        func.max(CalendarDate.day).label('end')
+    ).filter(CalendarDate.day.between(start, end)).group_by(bucket).subquery()
+
+    active = and_(
+        Customer.contract_date <= periods.c.end,
+        or_(Customer.churn_date.is_(None), Customer.churn_date > periods.c.end)
+    )
+    new = Customer.contract_date >= periods.c.start
+    churned = Customer.churn_date.between(periods.c.start, periods.c.end)
+
+    def total(condition, value):
+        return func.coalesce(func.sum(case((condition, value), else_=0)), 0)
+
+    rows = db.session.query(
+        periods.c.start,
+        periods.c.end,
+        total(active, Customer.mrr),
+        total(active, 1),
+        total(active, Customer.operation_fee),
+        total(new, 1),
+        total(new, Customer.mrr),
+        total(new, Customer.initial_fee),
+        total(churned, 1),
+        total(churned, Customer.mrr)
+    ).select_from(periods).outerjoin(
+        # 期間中に1日でも契約中だった顧客のみ結合する
+        Customer, and_(
+            Customer.contract_date <= periods.c.end,
+            or_(Customer.churn_date.is_(None), Customer.churn_date >= periods.c.start)
+        )
+    ).group_by(periods.c.start, periods.c.end).order_by(periods.c.start).all()
+
+    return [{
+        'start': str(row[0]),
+        'end': str(row[1]),
+        'active_mrr': int(row[2]),
+        'active_customers': int(row[3]),
+        'operation_fees': int(row[4]),
+        'new_customers': int(row[5]),
+        'new_mrr': int(row[6]),
+        'initial_fees': int(row[7]),
+        'churned_customers': int(row[8]),
+        'churned_mrr': int(row[9])
+    } for row in rows]
+
+def closed_key(granularity, period, history_version):
+    return f"revenue-series:{granularity}:{period['start']}:{period['end']}#{history_version}"
+
+def compute_series(granularity, start, end, today=None):
+    """start〜end の期間ごとの集計（終了済みの期間はキャッシュを利用）"""
+    today = today or date.today()
+    # カレンダーを参照する前に範囲と期間数を検証する
+    validate_range(granularity, start, end, today)
+    check_calendar(start, end)
+    bucket = getattr(CalendarDate, GRANULARITIES[granularity])
+    periods = [
+        {'start': str(row[0]), 'end': str(row[1]), 'closed': row[1] < today}
+        for row in db.session.query(func.min(CalendarDate.day), func.max(CalendarDate.day)).filter(
+            CalendarDate.day.between(start, end)
+        ).group_by(bucket).order_by(func.min(CalendarDate.day)).all()
+    ]
+
+    backend = response_cache.backend
+    history_version = table_versions.get_versions([HISTORY_TABLE])[0]
+    results = {}
+    if backend is not None:
+        for period in periods:
+            if not period['closed']:
+                continue
+            try:
+                value = backend.get(closed_key(granularity, period, history_version))
+            except Exception as e:
+                logger.error(f"Revenue series cache lookup failed: {e}")
+                value = None
+            if value is not None:
+                results[period['start']] = json.loads(value)
+
+    missing = [period for period in periods if period['start'] not in results]
+    if missing:
+        first = date.fromisoformat(missing[0]['start'])
+        last = date.fromisoformat(missing[-1]['end'])
+        for row in query_periods(granularity, first, last):
+            results[row['start']] = row
+            closed = date.fromisoformat(row['end']) < today
+            if backend is not None and closed:
+                try:
+                    backend.set(
+                        closed_key(granularity, row, history_version),
+                        json.dumps(row).encode('utf-8'), CLOSED_PERIOD_TTL
+                    )
+                except Exception as e:
+                    logger.error(f"Revenue series cache store failed: {e}")
+
+    return [dict(results[period['start']], closed=period['closed']) for period in periods]
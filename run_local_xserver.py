@@ -32,7 +32,8 @@ print("実行コマンド: ./ssh_tunnel.sh")
 print("\n" + "=" * 50)
 
 # メインアプリケーションを起動
-from main import app
+from main import create_app
+app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
@@ -1,42 +1,69 @@
 #!/usr/bin/env python3
 """
 XServer環境でアプリケーションを起動するスクリプト
+
+使い方:
+    python run_xserver.py                      # 開発サーバー（PORT）
+    python run_xserver.py --fcgi --socket PATH # 常駐FastCGIサーバー（プリフォーク、unixソケット）
 """
+import argparse
 import os
 import sys
 from pathlib import Path
 
 # プロジェクトのルートディレクトリを取得
 project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
 
 # .env.xserverファイルを読み込む
-env_file = project_root / '.env.xserver'
-if env_file.exists():
-    print(f"Loading environment from: {env_file}")
-    with open(env_file, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                key, value = line.split('=', 1)
-                os.environ[key] = value
-                if key == 'DB_PASSWORD':
-                    print(f"Set {key}=***")
-                else:
-                    print(f"Set {key}={value}")
-else:
-    print(f"Warning: {env_file} not found. Using default environment variables.")
+from xserver_env import load_env_file
+load_env_file(verbose=True)
 
 # メインアプリケーションを起動
-from main import app
+from main import create_app
+app = create_app()
+
+def run_fcgi(socket_path, workers):
+    """プリフォーク型のFastCGIサーバーをunixソケットで起動
+
+    各ワーカーはインポート済みのアプリを引き継ぎ、DB接続は
+    フォーク後の最初のリクエストで各ワーカーのプールに作成される。
+    """
+    from flup.server.fcgi_fork import WSGIServer
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    print(f"Starting FastCGI server on unix:{socket_path} (max workers: {workers})")
+    WSGIServer(
+        app,
+        bindAddress=socket_path,
+        umask=0o002,
+        minSpare=1,
+        maxSpare=workers,
+        maxChildren=workers,
+        maxRequests=1000  # メモリリーク対策として一定数処理したワーカーを入れ替える
+    ).run()
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 8080))
-    debug = os.environ.get('DEBUG', 'false').lower() == 'true'
-    
+    parser = argparse.ArgumentParser(description='XServer環境でアプリケーションを起動します')
+    parser.add_argument('--fcgi', action='store_true', help='FastCGIサーバーとして起動')
+    parser.add_argument('--socket', default=os.environ.get('FCGI_SOCKET', str(project_root / 'app.sock')),
+                        help='FastCGIのunixソケットパス')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('FCGI_WORKERS', 4)),
+                        help='FastCGIの最大ワーカー数')
+    args = parser.parse_args()
+
     print(f"\nStarting Flask app for XServer environment")
     print(f"Environment: {os.environ.get('ENVIRONMENT', 'production')}")
     print(f"Database Host: {os.environ.get('DB_HOST', 'not set')}")
-    print(f"Port: {port}, Debug: {debug}")
-    print("-" * 50)
-    
-    app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
+
+    if args.fcgi:
+        print("-" * 50)
+        run_fcgi(args.socket, args.workers)
+    else:
+        port = int(os.environ.get('PORT', 8080))
+        debug = os.environ.get('DEBUG', 'false').lower() == 'true'
+        print(f"Port: {port}, Debug: {debug}")
+        print("-" * 50)
+        app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
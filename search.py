@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+顧客名・会社名の全文検索（2文字n-gramの索引）
+
+名称を正規化（NFKC・小文字化・カタカナをひらがなに統一・空白と記号を除去）
+して2文字ずつの語に分解し、search_terms に「語 → レコード」の対応を保持する。
+末尾の1文字は「文字 + _」の語として登録し、1文字の検索語は前方一致で引く。
+顧客・会社の登録や削除時に同じトランザクション内で該当レコードの語を
+入れ替えるため、MySQL / SQLite のどちらでも同じ方法で検索できる。
+
+検索語のすべての語を含むレコードを対象に、一致した語の重み（名称3、
+正式名称2、法人番号1）の合計で並べ、名称の完全一致・前方一致・部分一致を
+上位に補正する。
+
+再構築:
+    python search.py
+"""
+import logging
+import unicodedata
+from flask import Blueprint, jsonify, request
+from sqlalchemy import func
+from models import db, Company, Customer, SearchTerm
+from response_cache import cached_response
+from table_versions import conditional_get
+import response_cache
+
+logger = logging.getLogger(__name__)
+
+search_bp = Blueprint('search', __name__)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# 補正前にスコア順で取得する候補数
+CANDIDATE_LIMIT = 200
+REBUILD_BATCH_SIZE = 1000
+TERM_SUFFIX = '_'
+
+# 検索対象のフィールドと重み
+CUSTOMER_FIELDS = {'name': 3}
+COMPANY_FIELDS = {'name': 3, 'legal_name': 2, 'registration_number': 1}
+# 顧客の検索結果で件数を集計する項目（同名のクエリ引数で絞り込みも可能）
+FACET_COLUMNS = ('plan', 'region', 'industry', 'channel', 'assignee')
+
+# 名称の一致の仕方による補正
+EXACT_MATCH_BONUS = 100
+PREFIX_MATCH_BONUS = 50
+SUBSTRING_MATCH_BONUS = 20
+
+def normalize(text):
+    """検索用に正規化（全角半角・大文字小文字・カタカナひらがなを統一し、空白と記号を除去）"""
+    chars = []
+    for char in unicodedata.normalize('NFKC', str(text or '')).lower():
+        category = unicodedata.category(char)
+        if category[0] in ('Z', 'P', 'C'):
+            continue
+        if 'ァ' <= char <= 'ヶ':
+            char = chr(ord(char) - 0x60)
+        chars.append(char)
+    return ''.join(chars)
+
+def bigrams(text):
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+def document_terms(fields):
+    """(テキスト, 重み) の並びから、語ごとの重み（同じ語は最大の重み）を算出"""
+    terms = {}
+    for text, weight in fields:
+        normalized = normalize(text)
+        if not normalized:
+            continue
+        for term in bigrams(normalized) + [normalized[-1] + TERM_SUFFIX]:
+            terms[term] = max(terms.get(term, 0), weight)
+    return terms
+
+def entity_fields(record, fields):
+    """レコード（属性または辞書）から (テキスト, 重み) の並びを取り出す"""
+    get = record.get if isinstance(record, dict) else lambda name: getattr(record, name, None)
+    return [(get(name), weight) for name, weight in fields.items()]
+
+def index_entities(session, entity_type, records, fields):
+    """レコードの語を入れ替える（コミットは呼び出し元で行う）
+
+    records: id と fields の各フィールドを持つレコード（ORMオブジェクトまたは辞書）
+    """
+    records = list(records)
+    if not records:
+        return
+    get_id = lambda record: record['id'] if isinstance(record, dict) else record.id
+    ids = [get_id(record) for record in records]
+    table = SearchTerm.__table__
+    session.execute(table.delete().where(
+        table.c.entity_type == entity_type, table.c.entity_id.in_(ids)
+    ))
+    rows = [
+        {'term': term, 'entity_type': entity_type, 'entity_id': get_id(record), 'weight': weight}
+        for record in records
+        for term, weight in document_terms(entity_fields(record, fields)).items()
+    ]
+    if rows:
+        session.execute(table.insert(), rows)
+
+def index_customers(session, customers):
+    index_entities(session, 'customer', customers, CUSTOMER_FIELDS)
+
+def index_companies(session, companies):
+    index_entities(session, 'company', companies, COMPANY_FIELDS)
+
+def remove_entity(session, entity_type, entity_id):
+    """レコードの語を削除"""
+    table = SearchTerm.__table__
+    session.execute(table.delete().where(
+        table.c.entity_type == entity_type, table.c.entity_id == entity_id
+    ))
+
+def match_query(entity_type, query):
+    """検索語のすべての語を含むレコードの (entity_id, score) のサブクエリ"""
+    terms = sorted(set(bigrams(query)))
+    matches = db.session.query(
+        SearchTerm.entity_id.label('entity_id'),
+        func.sum(SearchTerm.weight).label('score')
+    ).filter(SearchTerm.entity_type == entity_type)
+    if terms:
+        matches = matches.filter(SearchTerm.term.in_(terms)).group_by(SearchTerm.entity_id).having(
+            func.count(SearchTerm.term) == len(terms)
+        )
+    else:
+        # 1文字の検索語は、その文字で始まる語の前方一致
+        matches = matches.filter(SearchTerm.term.like(f"{query}%")).group_by(SearchTerm.entity_id)
+    return matches.subquery()
+
+def rank(rows, query, limit):
+    """名称の一致の仕方でスコアを補正し、上位limit件を返す"""
+    ranked = []
+    for row in rows:
+        name = normalize(row.name)
+        score = int(row.score)
+        if name == query:
+            score += EXACT_MATCH_BONUS
+        elif name.startswith(query):
+            score += PREFIX_MATCH_BONUS
+        elif query in name:
+            score += SUBSTRING_MATCH_BONUS
+        ranked.append((score, row))
+    ranked.sort(key=lambda item: (-item[0], item[1].id))
+    return ranked[:limit]
+
+def search_customers(query, filters, limit):
+    matches = match_query('customer', query)
+    base = db.session.query(Customer).join(matches, Customer.id == matches.c.entity_id)
+    for column, value in filters.items():
+        base = base.filter(getattr(Customer, column) == value)
+
+    candidates = base.with_entities(
+        Customer.id, Customer.name, Customer.plan, Customer.region, Customer.status,
+        Customer.mrr, matches.c.score
+    ).order_by(matches.c.score.desc(), Customer.id).limit(CANDIDATE_LIMIT).all()
+    hits = [{
+        'id': row.id,
+        'name': row.name,
+        'plan': row.plan,
+        'region': row.region,
+        'status': row.status,
+        'mrr': row.mrr,
+        'score': score
+    } for score, row in rank(candidates, query, limit)]
+
+    facets = {}
+    for column in FACET_COLUMNS:
+        attr = getattr(Customer, column)
+        counts = base.with_entities(attr, func.count(Customer.id)).group_by(attr).order_by(
+            func.count(Customer.id).desc()
+        ).all()
+        facets[column] = [{'value': value, 'count': count} for value, count in counts]
+
+    total = base.with_entities(func.count(Customer.id)).scalar()
+    return hits, total, facets
+
+def search_companies(query, limit):
+    matches = match_query('company', query)
+    base = db.session.query(Company).join(matches, Company.id == matches.c.entity_id)
+    candidates = base.with_entities(
+        Company.id, Company.name, Company.legal_name, Company.registration_number,
+        Company.industry, Company.status, matches.c.score
+    ).order_by(matches.c.score.desc(), Company.id).limit(CANDIDATE_LIMIT).all()
+    hits = [{
+        'id': row.id,
+        'name': row.name,
+        'legal_name': row.legal_name,
+        'registration_number': row.registration_number,
+        'industry': row.industry,
+        'status': row.status.value if row.status else None,
+        'score': score
+    } for score, row in rank(candidates, query, limit)]
+    total = base.with_entities(func.count(Company.id)).scalar()
+    return hits, total
+
+@search_bp.route('/search', methods=['GET'])
+@conditional_get('customers', 'companies')
+@cached_response('customers', 'companies')
+def search():
+    """顧客・会社を名称で検索し、顧客の絞り込み項目ごとの件数も返す
+
+    クエリパラメータ:
+        q: 検索語（必須）
+        type: customers / companies（省略時は両方）
+        limit: それぞれの最大件数（既定20、最大100）
+        plan / region / industry / channel / assignee: 顧客の絞り込み条件
+    """
+    try:
+        query = normalize(request.args.get('q', ''))
+        if not query:
+            return jsonify({'error': 'q is required'}), 400
+        target = request.args.get('type')
+        if target not in (None, 'customers', 'companies'):
+            return jsonify({'error': 'type must be customers or companies'}), 400
+        limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+        if limit is None or limit <= 0:
+            return jsonify({'error': 'limit must be positive'}), 400
+        limit = min(limit, MAX_LIMIT)
+        filters = {column: request.args[column] for column in FACET_COLUMNS if request.args.get(column)}
+
+        result = {'query': request.args.get('q'), 'total': {}}
+        if target in (None, 'customers'):
+            hits, total, facets = search_customers(query, filters, limit)
+            result.update(customers=hits, facets=facets)
+            result['total']['customers'] = total
+        if target in (None, 'companies'):
+            hits, total = search_companies(query, limit)
+            result['companies'] = hits
+            result['total']['companies'] = total
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Search failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def rebuild():
+    """customers / companies から索引を再構築"""
+    try:
+        db.session.query(SearchTerm).delete(synchronize_session=False)
+        counts = {}
+        for entity_type, model, fields in (
+            ('customer', Customer, CUSTOMER_FIELDS),
+            ('company', Company, COMPANY_FIELDS)
+        ):
+            columns = [model.id] + [getattr(model, name) for name in fields]
+            after_id = 0
+            counts[entity_type] = 0
+            while True:
+                rows = db.session.query(*columns).filter(model.id > after_id).order_by(model.id).limit(
+                    REBUILD_BATCH_SIZE
+                ).all()
+                if not rows:
+                    break
+                index_entities(db.session, entity_type, [row._asdict() for row in rows], fields)
+                counts[entity_type] += len(rows)
+                after_id = rows[-1].id
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Rebuilt search_terms: {counts}")
+    return counts
+
+if __name__ == '__main__':
+    from main import create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        counts = rebuild()
+    response_cache.invalidate('customers', 'companies')
+    print(f"✅ 検索索引を再構築しました（顧客: {counts['customer']}件、会社: {counts['company']}件）")
@@ -0,0 +1,83 @@
+"""
+請求書番号・契約番号の採番
+
+number_sequences に「接頭辞-年月」ごとの最終番号を保持し、UPDATE で
+必要な件数分を一度に加算して連続した番号のブロックを確保する。
+確保は呼び出し元とは別の短いトランザクションでコミットするため、
+複数のワーカー・プロセスが同時に採番しても番号が重複せず、
+行ロックも請求処理の間保持されない（ロールバックされた分の番号は欠番になる）。
+
+月の最初の採番時は、既存の番号（旧方式のランダムな数字の末尾を含む）の
+最大値から続ける。
+"""
+import logging
+from datetime import date
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from models import db, Contract, Invoice, NumberSequence
+
+logger = logging.getLogger(__name__)
+
+# 種類ごとの (接頭辞, 連番の最小桁数, 番号のカラム)
+SEQUENCES = {
+    'invoice': ('INV', 6, Invoice.invoice_number),
+    'contract': ('CTR', 4, Contract.contract_number),
+}
+
+def sequence_name(kind, day):
+    prefix = SEQUENCES[kind][0]
+    return f"{prefix}-{day.strftime('%Y%m')}"
+
+def format_number(kind, day, value):
+    width = SEQUENCES[kind][1]
+    return f"{sequence_name(kind, day)}-{value:0{width}d}"
+
+def existing_max(conn, kind, name):
+    """既存の番号のうち、末尾が数字のものの最大値（なければ0）"""
+    column = SEQUENCES[kind][2]
+    # 数字は英字より前に並ぶため、降順で最初に見つかった数字の末尾が最大
+    # （旧方式の番号は桁数が固定）
+    numbers = conn.execute(
+        select(column).where(column.like(f"{name}-%")).order_by(column.desc())
+    ).scalars()
+    for number in numbers:
+        suffix = number[len(name) + 1:]
+        if suffix.isdigit():
+            return int(suffix)
+    return 0
+
+def reserve(kind, count, day=None):
+    """count件分の連番を確保し、(最初の値, 最後の値) を返す"""
+    if count <= 0:
+        raise ValueError('count must be positive')
+    name = sequence_name(kind, day or date.today())
+    table = NumberSequence.__table__
+
+    for _ in range(2):
+        try:
+            with db.engine.begin() as conn:
+                updated = conn.execute(
+                    table.update().where(table.c.name == name).values(last_value=table.c.last_value + count)
+                )
+                if updated.rowcount == 0:
+                    # その月の最初の採番
+                    start = existing_max(conn, kind, name)
+                    conn.execute(table.insert().values(name=name, last_value=start + count))
+                    last = start + count
+                else:
+                    last = conn.execute(select(table.c.last_value).where(table.c.name == name)).scalar_one()
+            return last - count + 1, last
+        except IntegrityError:
+            # 他のプロセスが同時に同じ月の行を作成した場合はUPDATEからやり直す
+            logger.info(f"Sequence {name} was created concurrently, retrying")
+    raise RuntimeError(f"Failed to reserve numbers from sequence {name}")
+
+def allocate_numbers(kind, count, day=None):
+    """count件分の番号を1回の確保で採番"""
+    day = day or date.today()
+    first, last = reserve(kind, count, day)
+    return [format_number(kind, day, value) for value in range(first, last + 1)]
+
+def next_number(kind, day=None):
+    """番号を1件採番"""
+    return allocate_numbers(kind, 1, day)[0]
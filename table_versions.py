@@ -0,0 +1,94 @@
+"""
+テーブル更新世代番号とETagによる条件付きGET
+
+書き込み処理はトランザクション内で bump() を呼び、対象テーブルを登録する。
+世代番号の加算は同じトランザクションのコミット直前（残りの変更をflushした後）に
+UPSERTでまとめて行うため、データの変更と世代番号の加算は必ず一緒にコミット
+（またはロールバック）される。table_versions の行ロックはコミットまでの短い間だけ
+保持されるので、並列の書き込み（請求ワーカーなど）が業務処理の間ずっと
+同じ行のロックを待つことはない。
+
+一覧エンドポイントは世代番号のみ（主キー検索1回）から強いETagを算出し、
+If-None-Match が一致すれば行を取得せずに304を返す。
+"""
+import hashlib
+import logging
+from functools import wraps
+from urllib.parse import urlencode
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db, TableVersion
+from upsert import upsert_increment
+
+logger = logging.getLogger(__name__)
+
+# session.info に保持する、加算を予約したテーブル
+PENDING_KEY = 'table_versions.pending'
+
+def bump(session, *tables):
+    """テーブルの世代番号の加算を予約（session のコミット直前に同じトランザクションで加算される）"""
+    session.info.setdefault(PENDING_KEY, set()).update(tables)
+
+@event.listens_for(Session, 'before_commit')
+def _on_before_commit(session):
+    tables = session.info.pop(PENDING_KEY, None)
+    if not tables:
+        return
+    # 行ロックの保持をコミットまでの間に限るため、先に残りの変更を書き込む
+    session.flush()
+    # 行ロックを常に同じ順で取得する
+    for table in sorted(tables):
+        upsert_increment(session, TableVersion.__table__, {'table_name': table}, {'version': 1})
+
+@event.listens_for(Session, 'after_transaction_end')
+def _on_transaction_end(session, transaction):
+    # コミットされずに終了した場合は予約を破棄
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+def get_versions(tables):
+    """テーブルの世代番号を取得（未登録のテーブルは0）"""
+    rows = db.session.query(TableVersion.table_name, TableVersion.version).filter(
+        TableVersion.table_name.in_(tables)
+    ).all()
+    versions = dict(rows)
+    return [int(versions.get(table, 0)) for table in tables]
+
+def compute_etag(versions):
+    """パス・クエリ引数・世代番号からETagを算出"""
+    args = urlencode(sorted(request.args.items(multi=True)))
+    source = f"{request.path}?{args}#{','.join(str(v) for v in versions)}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+def conditional_get(*tables):
+    """ETagを付与し、If-None-Match が一致すれば304を返すデコレータ
+
+    tables: レスポンスが参照するテーブル名（bump() の対象と一致させる）
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                versions = get_versions(tables)
+            except Exception as e:
+                logger.error(f"Table version lookup failed: {e}")
+                db.session.rollback()
+                return f(*args, **kwargs)
+
+            # レスポンスキャッシュのキーにも同じ世代番号を含める
+            g.table_versions = versions
+            etag = compute_etag(versions)
+            if etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = f(*args, **kwargs)
+            rv = response[0] if isinstance(response, tuple) else response
+            status = response[1] if isinstance(response, tuple) and len(response) > 1 else rv.status_code
+            if status == 200 and isinstance(rv, Response):
+                rv.set_etag(etag)
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,43 @@
+"""
+テスト共通の設定
+
+一時ディレクトリのSQLiteデータベースを使用する（main の import 前に設定する）。
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+DB_DIR = tempfile.mkdtemp(prefix='saas-test-')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(DB_DIR, 'test.db')}"
+# 接続の取得待ちで長時間止まらないようにする
+os.environ['DB_POOL_TIMEOUT'] = '3'
+os.environ.pop('ENVIRONMENT', None)
+os.environ.pop('GAE_ENV', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import create_app, Base  # noqa: E402
+from models import db  # noqa: E402
+import response_cache  # noqa: E402
+import revenue_series  # noqa: E402
+
+main_app = create_app()
+
+@pytest.fixture
+def app():
+    """空のスキーマを作成したアプリ"""
+    with main_app.app_context():
+        db.drop_all()
+        Base.metadata.drop_all(bind=db.engine)
+        db.create_all()
+        Base.metadata.create_all(bind=db.engine)
+        # 前のテストのレスポンスキャッシュを持ち越さない
+        response_cache.backend = response_cache.create_backend()
+        revenue_series._calendar_range = None
+        yield main_app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,86 @@
+"""MRR分析（analytics）のテスト"""
+from datetime import date, datetime
+from sqlalchemy import event
+from models import db, Contract, ContractHistory, Customer, ContractStatus
+import analytics
+
+TODAY = date(2026, 10, 18)
+
+def add_contract(customer, start_date, mrr, status=ContractStatus.ACTIVE, created=True):
+    contract = Contract(
+        customer_id=customer.id, contract_number=f"CTR-TEST-{start_date}-{customer.id}", plan='Basic',
+        start_date=start_date, end_date=date(2027, 12, 31), mrr=mrr, status=status
+    )
+    db.session.add(contract)
+    db.session.flush()
+    if created:
+        db.session.add(ContractHistory(
+            contract_id=contract.id, action='created', new_values={'plan': 'Basic', 'mrr': mrr},
+            created_at=datetime.combine(start_date, datetime.min.time())
+        ))
+    return contract
+
+def modify(contract, day, **changes):
+    old_values = {'mrr': contract.mrr, 'status': contract.status.value}
+    for key, value in changes.items():
+        setattr(contract, key, ContractStatus(value) if key == 'status' else value)
+    db.session.add(ContractHistory(
+        contract_id=contract.id, action='modified', old_values=old_values,
+        new_values={'mrr': contract.mrr, 'status': contract.status.value},
+        created_at=datetime.combine(day, datetime.min.time())
+    ))
+
+def create_history():
+    a, b, c, d = (Customer(name=name) for name in 'ABCD')
+    db.session.add_all([a, b, c, d])
+    db.session.flush()
+    a1 = add_contract(a, date(2026, 5, 10), 1000)
+    modify(a1, date(2026, 8, 5), mrr=1500)
+    add_contract(a, date(2026, 9, 20), 300)
+    b1 = add_contract(b, date(2026, 7, 15), 2000)
+    modify(b1, date(2026, 9, 3), status='cancelled')
+    # 開始日が本日より後の契約は含めない
+    add_contract(c, date(2026, 10, 25), 700)
+    # 作成時の履歴がない契約は最初の変更前の値から始まる
+    d1 = add_contract(d, date(2026, 6, 1), 800, created=False)
+    modify(d1, date(2026, 10, 2), mrr=500)
+    db.session.commit()
+
+def test_mrr_movements_come_from_contracts(app):
+    create_history()
+
+    movements = analytics.compute_mrr_movements(4, TODAY)
+
+    assert [
+        (m['month'], m['starting_mrr'], m['new_mrr'], m['expansion_mrr'], m['contraction_mrr'],
+         m['churned_mrr'], m['ending_mrr'], m['starting_customers'], m['new_customers'], m['churned_customers'])
+        for m in movements
+    ] == [
+        ('2026-07', 1800, 2000, 0, 0, 0, 3800, 2, 1, 0),
+        ('2026-08', 3800, 0, 500, 0, 0, 4300, 3, 0, 0),
+        ('2026-09', 4300, 0, 300, 0, 2000, 2600, 3, 0, 1),
+        ('2026-10', 2600, 0, 0, 300, 0, 2300, 2, 0, 0),
+    ]
+
+def test_ltv_uses_the_same_movements(app):
+    create_history()
+
+    ltv = analytics.compute_ltv(4, TODAY)
+
+    assert ltv['active_customers'] == 2
+    assert ltv['arpa'] == 1150
+    assert ltv['monthly_churn_rate'] == 10.0
+
+def test_mrr_movements_are_aggregated_in_sql(app):
+    create_history()
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        analytics.compute_mrr_movements(4, TODAY)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    # 期間開始時点の集計1回 + 月ごとの集計1回（契約・履歴の行は読み込まない）
+    assert len(statements) == 2
@@ -0,0 +1,45 @@
+"""日次請求サマリー（billing_summary）のテスト"""
+from datetime import date
+from models import db, BillingDailySummary, Customer, Invoice, Payment
+from models import InvoiceStatus, PaymentMethod, PaymentStatus
+import billing_summary
+
+def add_invoice(customer_id, number, status, issue_date=date(2026, 9, 1), due_date=date(2026, 9, 30)):
+    invoice = Invoice(
+        invoice_number=number, customer_id=customer_id, issue_date=issue_date, due_date=due_date,
+        amount=1000, tax_amount=100, total_amount=1100, status=status
+    )
+    db.session.add(invoice)
+    billing_summary.record_invoice_created(invoice.issue_date, invoice.total_amount, invoice.status)
+    return invoice
+
+def summary_totals():
+    return {
+        column: float(db.session.query(db.func.coalesce(db.func.sum(getattr(BillingDailySummary, column)), 0)).scalar())
+        for column in billing_summary.SUMMARY_COLUMNS
+    }
+
+def test_delete_customer_removes_its_invoices_and_payments(client):
+    kept, removed = Customer(name='残す顧客'), Customer(name='削除する顧客')
+    db.session.add_all([kept, removed])
+    db.session.flush()
+    add_invoice(kept.id, 'INV-TEST-1', InvoiceStatus.SENT)
+    add_invoice(removed.id, 'INV-TEST-2', InvoiceStatus.SENT)
+    paid = add_invoice(removed.id, 'INV-TEST-3', InvoiceStatus.PAID, issue_date=date(2026, 8, 1))
+    db.session.flush()
+    db.session.add(Payment(
+        customer_id=removed.id, invoice_id=paid.id, payment_date=date(2026, 8, 20), amount=1100,
+        payment_method=PaymentMethod.BANK_TRANSFER, status=PaymentStatus.COMPLETED
+    ))
+    billing_summary.record_payment(date(2026, 8, 20), 1100, PaymentStatus.COMPLETED)
+    db.session.commit()
+    removed_id = removed.id
+
+    response = client.delete(f"/customers/{removed_id}")
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert summary_totals() == {
+        'invoiced_amount': 1100, 'invoice_count': 1, 'unpaid_amount': 1100, 'unpaid_count': 1,
+        'collected_amount': 0, 'payment_count': 0
+    }
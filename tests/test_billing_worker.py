@@ -0,0 +1,60 @@
+"""定期請求ワーカー（billing_worker）のテスト"""
+from datetime import date, timedelta
+from sqlalchemy.dialects import mysql
+from models import db, Contract, Customer, Invoice, InvoiceItem, RecurringBilling, ContractStatus
+import billing_engine
+import billing_worker
+
+TODAY = date(2026, 10, 1)
+
+def create_billings(count):
+    """請求対象の定期請求をcount件作成"""
+    for i in range(count):
+        customer = Customer(name=f"顧客{i}", plan='Standard', mrr=10000 + i)
+        db.session.add(customer)
+        db.session.flush()
+        contract = Contract(
+            customer_id=customer.id, contract_number=f"CTR-TEST-{i:04d}", plan='Standard',
+            start_date=TODAY - timedelta(days=60), end_date=TODAY + timedelta(days=300),
+            mrr=customer.mrr, status=ContractStatus.ACTIVE
+        )
+        db.session.add(contract)
+        db.session.flush()
+        db.session.add(RecurringBilling(
+            customer_id=customer.id, contract_id=contract.id, next_billing_date=TODAY
+        ))
+    db.session.commit()
+
+def test_run_partition_bills_all_due(app):
+    create_billings(5)
+
+    summary = billing_worker.run_partition((1, 5), TODAY, chunk_size=2)
+
+    assert summary['processed'] == 5
+    assert summary['failed'] == 0
+    numbers = [number for (number,) in db.session.query(Invoice.invoice_number).order_by(Invoice.id)]
+    assert numbers == [f"INV-202610-{i:06d}" for i in range(1, 6)]
+    assert db.session.query(InvoiceItem).count() == 5
+    assert {b.next_billing_date for b in db.session.query(RecurringBilling)} == {TODAY + timedelta(days=30)}
+
+def test_run_parallel_bills_each_once(app):
+    create_billings(6)
+
+    summary = billing_worker.run_parallel(workers=2, chunk_size=2, partitions=3, today=TODAY)
+
+    assert summary['processed'] == 6
+    assert summary['failed'] == 0
+    assert summary['failed_partitions'] == []
+    numbers = [number for (number,) in db.session.query(Invoice.invoice_number)]
+    assert len(numbers) == len(set(numbers)) == 6
+
+    # 次回請求日を更新済みのため、再実行しても請求されない
+    summary = billing_worker.run_parallel(workers=2, chunk_size=2, partitions=3, today=TODAY)
+    assert summary['processed'] == 0
+    assert db.session.query(Invoice).count() == 6
+
+def test_due_billings_are_locked_in_every_path(app):
+    # API（/api/billing/process-recurring）・ワーカーのどちらも同じ fetch_due_chunk で取得する
+    query = billing_engine.lock_due(billing_engine.due_billings_query(TODAY))
+
+    assert 'FOR UPDATE SKIP LOCKED' in str(query.statement.compile(dialect=mysql.dialect()))
@@ -0,0 +1,48 @@
+"""顧客の一括登録（/customers/bulk）のテスト"""
+import io
+import json
+import pytest
+from models import db, SearchTerm
+import main
+
+@pytest.fixture(autouse=True)
+def small_reads(monkeypatch):
+    # 読み込み単位の境目でレコードや数値が分かれるようにする
+    monkeypatch.setattr(main, 'BULK_JSON_READ_SIZE', 7)
+
+def test_json_array_is_streamed_and_indexed(client):
+    records = [{'name': f"顧客{i}", 'plan': 'Basic', 'mrr': 123456 + i} for i in range(5)]
+    body = ' [\n' + ',\n'.join(json.dumps(r, ensure_ascii=False) for r in records) + '\n] '
+
+    response = client.post('/customers/bulk', data=body.encode('utf-8'), content_type='application/json')
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['inserted'] == 5
+    customers = client.get('/customers').get_json()
+    assert sorted(c['mrr'] for c in customers) == [123456 + i for i in range(5)]
+    indexed = {entity_id for (entity_id,) in db.session.query(SearchTerm.entity_id).filter_by(entity_type='customer')}
+    assert indexed == {c['id'] for c in customers}
+
+def test_empty_array(client):
+    response = client.post('/customers/bulk', data='[ ]', content_type='application/json')
+
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 0
+
+@pytest.mark.parametrize('body', [
+    '{"name": "顧客"}',
+    '[{"name": "顧客"} {"name": "顧客2"}]',
+    '[{"name": "顧客"}] []',
+    '[{"name": "顧客"',
+])
+def test_invalid_json_array(client, body):
+    response = client.post('/customers/bulk', data=body.encode('utf-8'), content_type='application/json')
+
+    assert response.status_code == 400
+
+def test_iter_json_array_rejects_oversized_record(monkeypatch):
+    monkeypatch.setattr(main, 'BULK_MAX_RECORD_CHARS', 20)
+    stream = io.StringIO('[{"name": "' + 'x' * 100 + '"}]')
+
+    with pytest.raises(ValueError, match='too large'):
+        list(main.iter_json_array(stream))
@@ -0,0 +1,44 @@
+"""顧客ヘルススコアの一括再計算（health_score_job）のテスト"""
+from datetime import date, datetime
+from models import db, Customer
+import health_score_job
+
+TODAY = date(2026, 10, 1)
+
+def test_nps_is_scaled_from_ten_point_scale():
+    # NPS以外は満点、NPSのみ0〜10で変える
+    full = dict(usage=100, idle_days=0, tickets=0, overdue=0, failed=0)
+
+    assert health_score_job.score_formula(nps=10, **full) == 100
+    assert health_score_job.score_formula(nps=5, **full) == 90
+    assert health_score_job.score_formula(nps=0, **full) == 80
+    # 範囲外の値は0〜10に丸めてから換算する
+    assert health_score_job.score_formula(nps=50, **full) == 100
+    assert health_score_job.score_formula(nps=-3, **full) == 80
+
+def test_run_updates_changed_scores(app):
+    db.session.add_all([
+        Customer(name='好調', usage_rate=100, nps_score=10, support_tickets=0,
+                 last_login=datetime(2026, 9, 30), health_score=0),
+        Customer(name='解約済み', usage_rate=100, nps_score=10, churn_date=date(2026, 9, 1), health_score=0),
+    ])
+    db.session.commit()
+
+    summary = health_score_job.run(chunk_size=1, today=TODAY)
+
+    assert summary['scored'] == 1
+    assert summary['updated'] == 1
+    scores = dict(db.session.query(Customer.name, Customer.health_score))
+    assert scores == {'好調': 100, '解約済み': 0}
+
+def test_default_nps_is_on_ten_point_scale(app):
+    db.session.add(Customer(name='既定値', usage_rate=100, support_tickets=0,
+                            last_login=datetime(2026, 9, 30), health_score=0))
+    db.session.commit()
+
+    health_score_job.run(today=TODAY)
+
+    customer = db.session.query(Customer).one()
+    assert customer.nps_score == 7
+    # NPS 7 → 70点 × 0.20、他のシグナルは満点
+    assert customer.health_score == 94
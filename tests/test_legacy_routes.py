@@ -0,0 +1,31 @@
+"""旧Xserver版（index_xserver.tsx）が呼び出す /api/* の互換ルートのテスト"""
+
+def test_api_customer_routes(client):
+    response = client.post('/api/save', json={'name': '互換顧客', 'plan': 'Basic', 'mrr': 5000})
+    assert response.status_code == 200, response.get_json()
+
+    customers = client.get('/api/customers').get_json()
+    assert [c['name'] for c in customers] == ['互換顧客']
+    assert client.get('/customers').get_json() == customers
+
+    response = client.delete(f"/api/customers/{customers[0]['id']}")
+    assert response.status_code == 200
+    assert client.get('/api/customers').get_json() == []
+
+def test_api_health_is_routed(client):
+    assert client.get('/api/health').status_code in (200, 503)
+
+def test_api_debug_config_requires_token(client):
+    assert client.get('/api/debug/config').status_code == 404
+
+def test_session_factory_is_per_app(app, tmp_path):
+    from main import create_app
+    from models import db
+
+    other = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'other.db'}"})
+    with other.app_context():
+        other_engine = db.engine
+    # 別のアプリを作成しても、既存のアプリの旧方式ルートは元のエンジンを使う
+    assert app.extensions['legacy_session'].kw['bind'] is db.engine
+    assert other.extensions['legacy_session'].kw['bind'] is other_engine
+    assert other_engine is not db.engine
@@ -0,0 +1,34 @@
+"""MRR予測（mrr_forecast）のテスト"""
+from datetime import date
+from models import db
+import mrr_forecast
+import table_versions
+
+TODAY = date(2026, 10, 18)
+
+def test_solve_least_squares_fits_line():
+    rows = [mrr_forecast.design_row(t, 1, False) for t in range(6)]
+    values = [100 + 20 * t for t in range(6)]
+
+    intercept, slope = mrr_forecast.solve_least_squares(rows, values)
+
+    assert round(intercept, 6) == 100
+    assert round(slope, 6) == 20
+
+def test_model_is_refitted_when_source_tables_change(app, monkeypatch):
+    fits = []
+    monkeypatch.setattr(mrr_forecast, '_models', {})
+    monkeypatch.setattr(mrr_forecast, 'fit', lambda today=None: fits.append(today) or {'fitted_through': str(len(fits))})
+
+    first = mrr_forecast.get_model(TODAY)
+    assert mrr_forecast.get_model(TODAY) is first
+    assert len(fits) == 1
+
+    table_versions.bump(db.session, 'contracts')
+    db.session.commit()
+    assert mrr_forecast.get_model(TODAY) is not first
+    assert len(fits) == 2
+
+    # 月が替わった場合も作り直す
+    mrr_forecast.get_model(date(2026, 11, 1))
+    assert len(fits) == 3
@@ -0,0 +1,66 @@
+"""一覧エンドポイントのクエリ数のテスト（N+1 になっていないこと）"""
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import event
+from models import db, Contract, Customer, Invoice, Payment
+from models import ContractStatus, InvoiceStatus, PaymentMethod
+import response_cache
+
+# 世代番号の取得1回 + 一覧の取得1回
+EXPECTED_STATEMENTS = 2
+
+@contextmanager
+def count_statements():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def create_rows(count):
+    """顧客ごとに契約・請求書・支払いを1件ずつ作成"""
+    for i in range(count):
+        customer = Customer(name=f"顧客{i}", plan='Basic', mrr=1000)
+        db.session.add(customer)
+        db.session.flush()
+        contract = Contract(
+            customer_id=customer.id, contract_number=f"CTR-TEST-{i:04d}", plan='Basic',
+            start_date=date(2026, 1, 1), end_date=date(2026, 12, 31), mrr=1000,
+            status=ContractStatus.ACTIVE
+        )
+        db.session.add(contract)
+        db.session.flush()
+        invoice = Invoice(
+            invoice_number=f"INV-TEST-{i:06d}", customer_id=customer.id, contract_id=contract.id,
+            issue_date=date(2026, 1, 1), due_date=date(2026, 1, 31), amount=1000,
+            tax_amount=100, total_amount=1100, status=InvoiceStatus.PAID
+        )
+        db.session.add(invoice)
+        db.session.flush()
+        db.session.add(Payment(
+            customer_id=customer.id, invoice_id=invoice.id, payment_date=date(2026, 1, 20),
+            amount=1100, payment_method=PaymentMethod.BANK_TRANSFER
+        ))
+    db.session.commit()
+
+@pytest.mark.parametrize('path, key', [
+    ('/api/contracts', 'contracts'),
+    ('/api/invoices', 'invoices'),
+    ('/api/payments', 'payments'),
+])
+@pytest.mark.parametrize('rows', [1, 25])
+def test_list_statement_count_is_constant(client, path, key, rows):
+    create_rows(rows)
+    # レスポンスキャッシュを使わずにDBから取得させる
+    response_cache.backend = None
+
+    with count_statements() as statements:
+        response = client.get(path)
+
+    assert response.status_code == 200
+    assert len(response.get_json()[key]) == rows
+    assert len(statements) == EXPECTED_STATEMENTS, statements
@@ -0,0 +1,29 @@
+"""リクエストプロファイラ（request_profiler）の認証のテスト"""
+import pytest
+import request_profiler
+
+SECRET = 'profile-secret'
+
+@pytest.fixture(autouse=True)
+def profile_secret(monkeypatch):
+    monkeypatch.setattr(request_profiler, 'PROFILE_SECRET', SECRET)
+
+@pytest.mark.parametrize('headers, query, expected', [
+    ({'X-Profile-Token': SECRET}, '', True),
+    ({'X-Profile-Token': 'wrong'}, '', False),
+    ({}, '?__profile=1&__profile_token=' + SECRET, False),
+    ({}, '?token=' + SECRET, False),
+    ({'X-Profile': SECRET}, '', False),
+])
+def test_secret_is_accepted_only_in_header(app, headers, query, expected):
+    with app.test_request_context('/customers' + query, headers=headers):
+        assert request_profiler.should_profile() is expected
+    with app.test_request_context('/debug/profiles' + query, headers=headers):
+        assert request_profiler.is_authorized() is expected
+        assert request_profiler.should_profile() is False
+
+def test_disabled_without_secret(app, monkeypatch):
+    monkeypatch.setattr(request_profiler, 'PROFILE_SECRET', '')
+    with app.test_request_context('/customers', headers={'X-Profile-Token': ''}):
+        assert request_profiler.should_profile() is False
+        assert request_profiler.is_authorized() is False
@@ -0,0 +1,51 @@
+"""期間ごとの売上推移（revenue_series）のテスト"""
+from datetime import date
+import pytest
+from models import db, CalendarDate, Customer
+import revenue_series
+
+def calendar_size():
+    return db.session.query(CalendarDate).count()
+
+@pytest.mark.parametrize('query', [
+    'from=1900-01-01&to=1900-12-31',
+    'from=2026-01-01&to=9999-12-31',
+    'granularity=day&from=2016-01-01&to=2026-01-01',
+    'from=2026-02-01&to=2026-01-01',
+])
+def test_rejects_invalid_range_without_touching_calendar(client, query):
+    response = client.get(f"/api/analytics/revenue-series?{query}")
+
+    assert response.status_code == 400
+    assert calendar_size() == 0
+
+def test_get_reads_the_seeded_calendar_only(client):
+    revenue_series.seed_calendar(date(2026, 1, 1), date(2026, 12, 31))
+    db.session.add(Customer(name='顧客', mrr=1000, contract_date=date(2026, 2, 10)))
+    db.session.commit()
+
+    response = client.get('/api/analytics/revenue-series?from=2026-01-01&to=2026-06-30')
+
+    assert response.status_code == 200
+    periods = response.get_json()['periods']
+    assert [p['start'] for p in periods] == [f"2026-0{m}-01" for m in range(1, 7)]
+    assert [p['active_mrr'] for p in periods] == [0, 1000, 1000, 1000, 1000, 1000]
+    assert calendar_size() == 365
+
+def test_get_outside_seeded_calendar_does_not_extend_it(client):
+    revenue_series.seed_calendar(date(2026, 1, 1), date(2026, 12, 31))
+
+    response = client.get('/api/analytics/revenue-series?from=2025-01-01&to=2025-06-30')
+
+    assert response.status_code == 500
+    assert 'migrate' in response.get_json()['error']
+    assert calendar_size() == 365
+
+@pytest.mark.parametrize('granularity', list(revenue_series.GRANULARITIES))
+def test_period_count_matches_calendar(app, granularity):
+    start, end = date(2024, 12, 30), date(2025, 11, 5)
+    revenue_series.seed_calendar(start, end)
+    bucket = getattr(CalendarDate, revenue_series.GRANULARITIES[granularity])
+    periods = db.session.query(bucket).filter(CalendarDate.day.between(start, end)).distinct().count()
+
+    assert revenue_series.period_count(granularity, start, end) == periods
@@ -0,0 +1,54 @@
+"""テーブル更新世代番号（table_versions）のテスト"""
+from sqlalchemy import event
+from models import db, Customer
+import table_versions
+
+def get_version(table):
+    return table_versions.get_versions([table])[0]
+
+def test_bump_is_applied_after_commit(app):
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.session.add(Customer(name='顧客'))
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        db.session.flush()
+        table_versions.bump(db.session, 'customers', 'contracts')
+        table_versions.bump(db.session, 'customers')
+        # 書き込みのトランザクション中は table_versions に触れない
+        assert not [s for s in statements if 'table_versions' in s]
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert get_version('customers') == 1
+    assert get_version('contracts') == 1
+
+def test_bump_is_discarded_on_rollback(app):
+    db.session.add(Customer(name='顧客'))
+    db.session.flush()
+    table_versions.bump(db.session, 'customers')
+    db.session.rollback()
+
+    db.session.add(Customer(name='顧客'))
+    db.session.commit()
+
+    assert get_version('customers') == 0
+
+def test_failed_bump_rolls_back_the_data(app, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('bump failed')
+    monkeypatch.setattr(table_versions, 'upsert_increment', fail)
+
+    db.session.add(Customer(name='顧客'))
+    table_versions.bump(db.session, 'customers')
+    try:
+        db.session.commit()
+    except RuntimeError:
+        db.session.rollback()
+    else:
+        raise AssertionError('commit should fail')
+
+    assert db.session.query(Customer).count() == 0
@@ -0,0 +1,43 @@
+"""
+カウンター行の加算用UPSERTヘルパー
+
+MySQL では INSERT ... ON DUPLICATE KEY UPDATE、SQLite では
+INSERT ... ON CONFLICT DO UPDATE を使い、1文で「行がなければ作成、
+あれば加算」を行う。その他のDBではUPDATE後に0件ならINSERTする。
+"""
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+def upsert_increment(session, table, keys, deltas):
+    """keysで特定される行のカラムにdeltasを加算（行がなければdeltasの値で作成）
+
+    session: 実行するセッション（呼び出し元のトランザクション内で実行される）
+    table: 対象のTableオブジェクト
+    keys: 主キー（またはユニークキー）のカラム名と値の辞書
+    deltas: 加算するカラム名と値の辞書
+    """
+    values = {**keys, **deltas}
+    dialect = session.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        stmt = mysql_insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            {column: table.c[column] + stmt.inserted[column] for column in deltas}
+        )
+        session.execute(stmt)
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + stmt.excluded[column] for column in deltas}
+        )
+        session.execute(stmt)
+    else:
+        condition = [table.c[column] == value for column, value in keys.items()]
+        updated = session.execute(
+            table.update().where(*condition).values(
+                {column: table.c[column] + value for column, value in deltas.items()}
+            )
+        )
+        if updated.rowcount == 0:
+            session.execute(table.insert().values(**values))
@@ -0,0 +1,26 @@
+"""
+XServer環境用の .env.xserver 読み込み
+"""
+import os
+from pathlib import Path
+
+ENV_FILE = Path(__file__).parent / '.env.xserver'
+
+def load_env_file(env_file=ENV_FILE, verbose=False):
+    """.env.xserver の KEY=VALUE を環境変数に設定（ファイルがなければFalse）"""
+    if not env_file.exists():
+        if verbose:
+            print(f"Warning: {env_file} not found. Using default environment variables.")
+        return False
+
+    if verbose:
+        print(f"Loading environment from: {env_file}")
+    with open(env_file, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                key, value = line.split('=', 1)
+                os.environ[key] = value
+                if verbose:
+                    print(f"Set {key}=***" if key == 'DB_PASSWORD' else f"Set {key}={value}")
+    return True
@@ -5,6 +5,8 @@
 APP_DIR="/home/yoshifumik/gta-test1.com/public_html/saas"
 LOG_DIR="/home/yoshifumik/logs"
 PID_FILE="$APP_DIR/app.pid"
+SOCKET="$APP_DIR/app.sock"
+WORKERS=${FCGI_WORKERS:-4}
 
 # ログディレクトリ作成
 mkdir -p $LOG_DIR
@@ -26,9 +28,10 @@ cd $APP_DIR
 echo "Python version:"
 python3 --version
 
-# アプリケーション起動（バックグラウンド）
-echo "Starting SaaS application..."
-nohup python3 run_xserver.py > $LOG_DIR/app.log 2>&1 &
+# アプリケーション起動（バックグラウンド、常駐FastCGIサーバー）
+# Apacheからは htaccess_cgi の mod_proxy_fcgi のルールで $SOCKET に転送する（パスを合わせること）
+echo "Starting SaaS application (FastCGI: $SOCKET, workers: $WORKERS)..."
+nohup python3 run_xserver.py --fcgi --socket $SOCKET --workers $WORKERS > $LOG_DIR/app.log 2>&1 &
 
 # PIDを保存
 echo $! > $PID_FILE